@@ -0,0 +1,154 @@
+"""
+Benchmark of the row-wise vs column-wise paths in src/excel_processor.py.
+
+Builds a synthetic multi-year bank export (header preamble, mixed
+credits/debits, free-text 'עבור' with receipt numbers, repeated rows as in
+overlapping downloads) and times header detection, receipt extraction,
+composite _id generation and dedup against a set of stored IDs. The
+row-wise reference versions are the ones the processor used before, and
+both paths are checked to produce identical records.
+
+Usage:
+    python benchmarks/bench_excel_processor.py
+    python benchmarks/bench_excel_processor.py --years 10 --per-day 60
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import excel_processor as ep
+
+HEADER = ["תאריך", "הפעולה", "פרטים", "אסמכתא", "חובה", "זכות", "יתרה בש''ח", "תאריך ערך", "לטובת", "עבור"]
+KEEP = ["תאריך", "הפעולה", "אסמכתא", "זכות", "לטובת"]
+
+
+def make_export(years, per_day, seed=0):
+    """Returns a raw (header=None) statement frame spanning the given years."""
+    rng = random.Random(seed)
+    preamble = [["בנק הפועלים"] + [None] * 9, ["חשבון 12-345-678901"] + [None] * 9, [None] * 10]
+    rows = []
+    start = datetime(2026 - int(years), 1, 1)
+    for day in range(int(365 * years)):
+        date = start + timedelta(days=day)
+        for _ in range(per_day):
+            credit = rng.choice([None, 0, 350.0, 400.0, 1200.5])
+            avur = rng.choice([
+                f"ועד בית דירה {rng.randint(1, 90)} קבלה {rng.randint(1000, 9999)}",
+                "ועד", "משכורת", "ארנונה", None
+            ])
+            rows.append([
+                date, "העברה", "פרטים", rng.randint(10000, 99999),
+                None if credit else 50.0, credit, 1000.0, date,
+                rng.choice(["כהן", "לוי", " מזרחי ", None]), avur
+            ])
+    return pd.DataFrame(preamble + [HEADER] + rows)
+
+
+def prepare(raw):
+    """Applies the header and filters to 'ועד' rows, as extract_records does."""
+    header_pos = 3
+    df = raw.iloc[header_pos + 1:].reset_index(drop=True)
+    df.columns = ep.header_names(raw.iloc[header_pos])
+    df = df.infer_objects()
+    return df[df["עבור"].astype(str).str.contains("ועד", na=False)]
+
+
+def find_header_row_rowwise(df_preview):
+    for idx, row in df_preview.iterrows():
+        row_str = row.astype(str).values
+        if any("תאריך" in s for s in row_str) and any("זכות" in s for s in row_str):
+            return idx
+    return -1
+
+
+def records_rowwise(df_filtered, stored_ids):
+    df_filtered = df_filtered.copy()
+    df_filtered['קבלה'] = df_filtered["עבור"].apply(ep.extract_receipt)
+    final_df = df_filtered[KEEP + ['קבלה']].copy()
+    final_df['תאריך'] = final_df['תאריך'].astype(str)
+
+    records = []
+    seen = set(stored_ids)
+    for record in final_df.to_dict(orient='records'):
+        clean_record = {k: (v if pd.notna(v) else "") for k, v in record.items()}
+        clean_record['_id'] = ep.generate_unique_id(clean_record)
+        if clean_record['_id'] not in seen:
+            records.append(clean_record)
+            seen.add(clean_record['_id'])
+    return records
+
+
+def records_columnwise(df_filtered, stored_ids):
+    final_df = df_filtered[KEEP].copy()
+    final_df['קבלה'] = ep.extract_receipts(df_filtered["עבור"])
+    final_df['תאריך'] = final_df['תאריך'].astype(str)
+    final_df = final_df.astype(object).where(final_df.notna(), "")
+    final_df['_id'] = ep.generate_unique_ids(final_df)
+
+    fresh_df = final_df.drop_duplicates('_id')
+    fresh_df = fresh_df[~fresh_df['_id'].isin(stored_ids)]
+    return fresh_df.to_dict(orient='records')
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark excel_processor row-wise vs column-wise paths")
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--per-day', type=int, default=30)
+    parser.add_argument('--stored', type=float, default=0.95,
+                        help="Share of the export already stored, as on a rerun of an overlapping download")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    raw = make_export(args.years, args.per_day)
+    df_filtered = prepare(raw)
+    # Pretend the oldest part of the export was stored by an earlier run
+    stored = records_columnwise(df_filtered.iloc[:int(len(df_filtered) * args.stored)], set())
+    stored_ids = {r['_id'] for r in stored}
+    print(f"{len(raw)} rows, {len(df_filtered)} 'ועד' rows, {len(stored_ids)} already stored")
+
+    preview = raw.head(ep.HEADER_SEARCH_ROWS)
+    # Worst case: no header in the searched rows (e.g. a long account summary)
+    missing = preview.drop(index=3).reset_index(drop=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_hdr_old, hdr_old = best_of(lambda: find_header_row_rowwise(preview), args.repeat)
+        t_hdr_new, hdr_new = best_of(lambda: ep.find_header_row(preview), args.repeat)
+        t_miss_old, miss_old = best_of(lambda: find_header_row_rowwise(missing), args.repeat)
+        t_miss_new, miss_new = best_of(lambda: ep.find_header_row(missing), args.repeat)
+    t_old, old = best_of(lambda: records_rowwise(df_filtered, stored_ids), args.repeat)
+    t_new, new = best_of(lambda: records_columnwise(df_filtered, stored_ids), args.repeat)
+
+    assert hdr_old == hdr_new, (hdr_old, hdr_new)
+    assert miss_old == miss_new == -1, (miss_old, miss_new)
+    assert old == new, "row-wise and column-wise records differ"
+
+    print(f"{'step':<28} {'row-wise ms':>12} {'column-wise ms':>15} {'speedup':>8}")
+    for name, before, after in [
+        ("header detection (row 3)", t_hdr_old, t_hdr_new),
+        ("header detection (missing)", t_miss_old, t_miss_new),
+        ("receipts + _id + dedup", t_old, t_new),
+    ]:
+        print(f"{name:<28} {before * 1000:>12.1f} {after * 1000:>15.1f} {before / after:>7.1f}x")
+    print(f"{len(new)} new records, identical in both paths")
+
+
+if __name__ == "__main__":
+    main()
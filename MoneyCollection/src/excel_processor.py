@@ -1,189 +1,783 @@
+import numpy as np
 import pandas as pd
+import argparse
+import contextlib
+import hashlib
 import json
 import os
 import glob
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 import re
+import time
 
-# Paths
+try:
+    import pyarrow.feather as feather
+except ImportError:  # Optional: without pyarrow every run parses the workbook
+    feather = None
+
+# Default paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'data', 'downloads')
 DATA_DIR = os.path.join(BASE_DIR, 'data')
-PROCESSED_FILE = os.path.join(DATA_DIR, 'excel_output.json')
 
-def main():
-    print("Starting Python Excel Processor...")
+# Bump when parse_statement's output changes, so stale entries are not read
+STATEMENT_CACHE_VERSION = 1
+STATEMENT_CACHE_MAX_AGE_DAYS = 30
+STATEMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
-    # 1. Find latest Excel file
-    files = glob.glob(os.path.join(DOWNLOADS_DIR, "*.xls*"))
-    if not files:
-        print("No Excel files found in downloads directory.")
+# Fold the append log into excel_output.json once it holds this many records
+COMPACT_THRESHOLD = 500
+
+# Rows searched for the header ("תאריך" and "זכות") at the top of the sheet
+HEADER_SEARCH_ROWS = 20
+
+ALLOWED_KEYS = {"_id", "id", "migrated", "תאריך", "הפעולה", "אסמכתא", "זכות", "לטובת", "קבלה"}
+
+
+@dataclass(frozen=True)
+class ProcessorConfig:
+    """Where statements are read from and where the processor keeps its state."""
+    data_dir: str = DATA_DIR
+    downloads_dir: str = DOWNLOADS_DIR
+
+    @classmethod
+    def for_data_dir(cls, data_dir):
+        """Config with every path (downloads included) under data_dir."""
+        return cls(data_dir=data_dir, downloads_dir=os.path.join(data_dir, 'downloads'))
+
+    @property
+    def processed_file(self):
+        return os.path.join(self.data_dir, 'excel_output.json')
+
+    @property
+    def processed_log_file(self):
+        # Records added since the last compaction, one JSON object per line
+        return os.path.join(self.data_dir, 'excel_output.jsonl')
+
+    @property
+    def dedup_index_file(self):
+        return os.path.join(self.data_dir, 'dedup_index.sqlite3')
+
+    @property
+    def statement_cache_dir(self):
+        # Parsed statements as Feather files, keyed by workbook content hash
+        return os.path.join(self.data_dir, 'statement_cache')
+
+
+def extract_receipt(val):
+    """Extracts the receipt number (first digit run) from a free-text field."""
+    val_str = str(val)
+    match = re.search(r'\d+', val_str)
+    return match.group() if match else ""
+
+
+def generate_unique_id(record):
+    """Generates a robust unique ID based on multiple fields."""
+    ref = str(record.get('אסמכתא') or '').strip()
+    date = str(record.get('תאריך') or '').strip()
+    credit = str(record.get('זכות') or '').strip()
+    beneficiary = str(record.get('לטובת') or '').strip()
+
+    # Handle 'nan' string from pandas or None
+    parts = [ref, date, credit, beneficiary]
+    clean_parts = []
+    for p in parts:
+        if p.lower() == 'nan' or p == 'None':
+            clean_parts.append('')
+        else:
+            clean_parts.append(p)
+
+    # Create composite key: ref_date_credit_beneficiary
+    # Using MD5 or just a joined string. Joined string is readable.
+    return "_".join(clean_parts)
+
+
+def _contains_any(cells, text):
+    """Per-row flag: does any cell of the string array contain text."""
+    return (np.char.find(cells, text) >= 0).any(axis=1)
+
+
+def find_header_row(df_preview):
+    """Returns the index of the first row containing both "תאריך" and "זכות", or -1."""
+    # Check if row contains "תאריך" and "זכות" (Credit) to be sure
+    cells = df_preview.astype(str).to_numpy().astype(str)
+    matches = _contains_any(cells, "תאריך") & _contains_any(cells, "זכות")
+    if not matches.any():
+        return -1
+    idx = df_preview.index[matches.argmax()]
+    print(f"Found header at row index: {idx}")
+    print(f"Row content: {df_preview.loc[idx].values}")
+    return idx
+
+
+def extract_receipts(series):
+    """Column-wise extract_receipt: first digit run of each value, or ""."""
+    return series.astype(str).str.extract(r'(\d+)', expand=False).fillna("")
+
+
+# Every casing of 'nan' (p.lower() == 'nan') plus 'None', for a hashed isin
+_NAN_STRINGS = {a + b + c for a in 'nN' for b in 'aA' for c in 'nN'} | {'None'}
+
+
+def _id_part(series):
+    """Column-wise equivalent of the per-field cleanup in generate_unique_id."""
+    # `record.get(...) or ''` drops every falsy value: NaN/None, "" and 0
+    empty = series.isna() | series.eq(0) | series.eq("")
+    parts = series.astype(str).str.strip().where(~empty, "")
+    # Handle 'nan' string from pandas or None
+    return parts.where(~parts.isin(_NAN_STRINGS), "")
+
+
+def generate_unique_ids(df):
+    """Vectorized generate_unique_id over a DataFrame of records."""
+    parts = []
+    for col in ('אסמכתא', 'תאריך', 'זכות', 'לטובת'):
+        if col in df.columns:
+            parts.append(_id_part(df[col]))
+        else:
+            parts.append(pd.Series("", index=df.index))
+    ref, date, credit, beneficiary = parts
+    return ref + "_" + date + "_" + credit + "_" + beneficiary
+
+
+def header_names(row):
+    """Builds column names from a header row the way pd.read_excel(header=...) does."""
+    names = []
+    seen = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if pd.isna(value) else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def parse_statement(path):
+    """
+    Parses the workbook once and applies the detected header row.
+
+    The sheet is read a single time with header=None; the header is found
+    in its first rows and the data below it is re-typed, instead of
+    reading the file again with header=<row>.
+    Returns None when no header row is found.
+    """
+    raw = pd.read_excel(path, header=None)
+
+    header_row_idx = find_header_row(raw.head(HEADER_SEARCH_ROWS))
+    if header_row_idx == -1:
+        print("Could not find header row with 'תאריך' and 'זכות'.")
+        return None
+
+    header_pos = raw.index.get_loc(header_row_idx)
+    df = raw.iloc[header_pos + 1:].reset_index(drop=True)
+    df.columns = header_names(raw.iloc[header_pos])
+    # Recover numeric/date dtypes that a header-aware read would have inferred
+    return df.infer_objects()
+
+
+def file_hash(path):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def statement_cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}.v{STATEMENT_CACHE_VERSION}.feather")
+
+
+def read_cached_statement(cache_dir, digest):
+    """Returns the cached parsed statement for a workbook hash, or None."""
+    path = statement_cache_path(cache_dir, digest)
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        # Uncompressed Feather is memory-mapped instead of read into a buffer
+        df = feather.read_table(path, memory_map=True).to_pandas()
+    except Exception as e:
+        print(f"Ignoring unreadable statement cache entry: {e}")
+        return None
+    # Touch so eviction drops the least recently used entries first
+    os.utime(path)
+    # Arrow turns NaN in text columns into None; restore what read_excel gives
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def write_cached_statement(cache_dir, digest, df):
+    """Caches a parsed statement; skipped when the columns do not convert to Arrow."""
+    if feather is None:
         return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = statement_cache_path(cache_dir, digest)
+    tmp_path = f"{path}.tmp"
+    try:
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # e.g. a column mixing numbers and text; parse the workbook next time
+        print(f"Not caching parsed statement: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_statement_cache(cache_dir)
+
+
+def evict_statement_cache(cache_dir):
+    """Drops entries unused for STATEMENT_CACHE_MAX_AGE_DAYS, then the oldest over the size cap."""
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, "*.feather")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:  # Evicted by a parallel worker
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    cutoff = time.time() - STATEMENT_CACHE_MAX_AGE_DAYS * 24 * 3600
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= STATEMENT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def load_statement(path, digest=None, cache_dir=None):
+    """
+    Returns the parsed, header-normalized statement, from cache when possible.
+
+    Scheduled runs keep re-processing the same download; its parsed form
+    is kept as a Feather file keyed by content hash, so only a new or
+    changed workbook goes through pd.read_excel. Needs pyarrow; without
+    it (or without a cache_dir) every call parses the workbook.
+    """
+    if feather is None or cache_dir is None:
+        return parse_statement(path)
 
-    # Sort by modification time
-    latest_file = max(files, key=os.path.getmtime)
-    print(f"Processing file: {latest_file}")
+    digest = digest or file_hash(path)
+    df = read_cached_statement(cache_dir, digest)
+    if df is not None:
+        print("Loaded parsed statement from cache.")
+        return df
 
+    df = parse_statement(path)
+    if df is not None:
+        write_cached_statement(cache_dir, digest, df)
+    return df
+
+
+def clean_history(current_data):
+    """
+    Migrates and cleans stored records in place.
+
+    Backfills 'קבלה', drops unknown keys and regenerates '_id'.
+    Returns the number of changes made.
+    """
+    migrated_count = 0
+
+    for item in current_data:
+        # Backfill 'קבלה' if missing and 'עבור' exists
+        if 'קבלה' not in item and 'עבור' in item:
+             item['קבלה'] = extract_receipt(item['עבור'])
+             migrated_count += 1
+
+        # Remove unwanted keys
+        keys_to_remove = [k for k in item.keys() if k not in ALLOWED_KEYS]
+        if keys_to_remove:
+            for k in keys_to_remove:
+                del item[k]
+            migrated_count += 1
+
+        # Generate ID based on item content (now cleaned/updated)
+        new_id = generate_unique_id(item)
+
+        # Update ID if different or missing
+        if item.get('_id') != new_id:
+            item['_id'] = new_id
+            migrated_count += 1
+
+    return migrated_count
+
+
+def load_history(config):
+    """Loads excel_output.json, migrating the legacy ID-list format."""
+    current_data = []
+    if os.path.exists(config.processed_file):
+        with open(config.processed_file, 'r', encoding='utf-8') as f:
+            try:
+                current_data = json.load(f)
+                # Handle legacy ID list format
+                if current_data and isinstance(current_data[0], str):
+                     print("Migrating processed.json from IDs to Objects...")
+                     current_data = [{"id": uid, "migrated": True} for uid in current_data]
+            except json.JSONDecodeError:
+                current_data = []
+    return current_data
+
+
+def write_json_atomic(path, data):
+    """Writes JSON to a temp file, fsyncs it and renames it over path."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path))
+
+
+def fsync_dir(path):
+    """Persists a rename by fsyncing the containing directory (no-op on Windows)."""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
     try:
-        # 2. Load Excel
-        # Read first 20 rows to find the one with "תאריך"
-        print("Reading Excel to find header row...")
-        df_preview = pd.read_excel(latest_file, header=None, nrows=20)
-        
-        header_row_idx = -1
-        for idx, row in df_preview.iterrows():
-            # Check if row contains "תאריך" and "זכות" (Credit) to be sure
-            row_str = row.astype(str).values
-            if any("תאריך" in s for s in row_str) and any("זכות" in s for s in row_str):
-                header_row_idx = idx
-                print(f"Found header at row index: {header_row_idx}")
-                print(f"Row content: {row.values}")
-                break
-        
-        if header_row_idx == -1:
-            print("Could not find header row with 'תאריך' and 'זכות'.")
-            return
-            
-        # Reload with correct header
-        df = pd.read_excel(latest_file, header=header_row_idx)
-
-        # 3. Filter and Select Columns
-        # Expecting: 'תאריך', 'הפעולה', 'פרטים', 'אסמכתא', 'חובה', 'זכות', 'יתרה בש''ח', 'תאריך ערך', 'לטובת', 'עבור'
-        
-        # Normalize columns: strip whitespace
-        df.columns = df.columns.str.strip()
-        print("Columns found:", df.columns.tolist())
-
-        # Find "עבור" column
-        avur_col = next((c for c in df.columns if "עבור" in c), None)
-        if not avur_col:
-             avur_col = next((c for c in df.columns if "לטובת" in c), None) # Fallback
-        
-        if not avur_col:
-            print("Warning: Could not find column 'עבור' or 'לטובת'.")
-            return
-
-        print(f"Filtering by column: {avur_col}")
-
-        # Filter rows where 'avur_col' contains "ועד"
-        df_filtered = df[df[avur_col].astype(str).str.contains("ועד", na=False)]
-        
-        if df_filtered.empty:
-            print("No transactions found with 'ועד' in 'עבור' column.")
-            return
-
-        print(f"Found {len(df_filtered)} matching transactions.")
-        
-        # Extract Receipt Number from 'עבור' (or fallback column)
-        def extract_receipt(val):
-            val_str = str(val)
-            match = re.search(r'\d+', val_str)
-            return match.group() if match else ""
-
-        df_filtered['קבלה'] = df_filtered[avur_col].apply(extract_receipt)
-
-        # Select specific columns
-        # תאריך, הפעולה, אסמכתא, זכות, לטובת, קבלה
-        cols_to_keep = ["תאריך", "הפעולה", "אסמכתא", "זכות", "לטובת", "קבלה"]
-        target_cols = [c for c in cols_to_keep if c in df_filtered.columns]
-        
-        final_df = df_filtered[target_cols].copy()
-        
-        # Convert Data to Dictionary Records
-        final_df['תאריך'] = final_df['תאריך'].astype(str) # Simplify dates
-        
-        new_records = final_df.to_dict(orient='records')
-        
-        # 4. Update processed.json
-        current_data = []
-        if os.path.exists(PROCESSED_FILE):
-            with open(PROCESSED_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    current_data = json.load(f)
-                    # Handle legacy ID list format
-                    if current_data and isinstance(current_data[0], str):
-                         print("Migrating processed.json from IDs to Objects...")
-                         current_data = [{"id": uid, "migrated": True} for uid in current_data]
-                except json.JSONDecodeError:
-                    current_data = []
-
-        def generate_unique_id(record):
-            """Generates a robust unique ID based on multiple fields."""
-            ref = str(record.get('אסמכתא') or '').strip()
-            date = str(record.get('תאריך') or '').strip()
-            credit = str(record.get('זכות') or '').strip()
-            beneficiary = str(record.get('לטובת') or '').strip()
-            
-            # Handle 'nan' string from pandas or None
-            parts = [ref, date, credit, beneficiary]
-            clean_parts = []
-            for p in parts:
-                if p.lower() == 'nan' or p == 'None':
-                    clean_parts.append('')
-                else:
-                    clean_parts.append(p)
-            
-            # Create composite key: ref_date_credit_beneficiary
-            # Using MD5 or just a joined string. Joined string is readable.
-            return "_".join(clean_parts)
-
-        # Validate and clean existing data
-        migrated_count = 0
-        existing_refs = set()
-        
-        allowed_keys = {"_id", "id", "migrated", "תאריך", "הפעולה", "אסמכתא", "זכות", "לטובת", "קבלה"}
-
-        for item in current_data:
-            # Backfill 'קבלה' if missing and 'עבור' exists
-            if 'קבלה' not in item and 'עבור' in item:
-                 item['קבלה'] = extract_receipt(item['עבור'])
-                 migrated_count += 1
-            
-            # Remove unwanted keys
-            keys_to_remove = [k for k in item.keys() if k not in allowed_keys]
-            if keys_to_remove:
-                for k in keys_to_remove:
-                    del item[k]
-                migrated_count += 1
-            
-            # Generate ID based on item content (now cleaned/updated)
-            new_id = generate_unique_id(item)
-            
-            # Update ID if different or missing
-            if item.get('_id') != new_id:
-                item['_id'] = new_id
-                migrated_count += 1
-            
-            existing_refs.add(new_id)
-
-        if migrated_count > 0:
-            print(f"Migrated/Cleaned {migrated_count} existing records.")
-
-        added_count = 0
-        for record in new_records:
-            # Clean record first to ensure valid values for ID generation logic match final storage
-            clean_record = {k: (v if pd.notna(v) else "") for k, v in record.items()}
-            
-            rec_id = generate_unique_id(clean_record)
-            
-            if rec_id not in existing_refs:
-                # Add
-                clean_record['_id'] = rec_id
-                current_data.append(clean_record)
-                existing_refs.add(rec_id)
-                added_count += 1
-
-        # Save
-        if added_count > 0 or migrated_count > 0:
-            with open(PROCESSED_FILE, 'w', encoding='utf-8') as f:
-                json.dump(current_data, f, ensure_ascii=False, indent=2)
-            if added_count > 0:
-                print(f"Added {added_count} new transactions to processed.json.")
-            if migrated_count > 0:
-                print(f"Saved migration updates.")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_log(config):
+    """Reads records appended since the last compaction, skipping a torn last line."""
+    records = []
+    if not os.path.exists(config.processed_log_file):
+        return records
+    with open(config.processed_log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print("Skipping unreadable line in excel_output.jsonl")
+    return records
+
+
+def read_all_records(config):
+    """Returns the compacted history plus the append log, de-duplicated by '_id'."""
+    records = load_history(config)
+    seen = {item.get('_id') for item in records if item.get('_id')}
+    for record in read_log(config):
+        # A crash between compaction and log truncation can leave both copies
+        if record.get('_id') not in seen:
+            records.append(record)
+            seen.add(record.get('_id'))
+    return records
+
+
+def append_records(config, records):
+    """Appends records to the JSONL log and fsyncs it; O(new records)."""
+    with open(config.processed_log_file, 'a+b') as f:
+        # Terminate a torn last line left by a crash before appending
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def count_log_records(config):
+    """Counts records in the append log (bounded by COMPACT_THRESHOLD)."""
+    if not os.path.exists(config.processed_log_file):
+        return 0
+    with open(config.processed_log_file, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def compact(config, records=None):
+    """
+    Folds the append log into excel_output.json.
+
+    The snapshot is replaced atomically before the log is emptied; if the
+    process dies in between, readers de-duplicate the overlap by '_id'.
+    """
+    if records is None:
+        records = read_all_records(config)
+    write_json_atomic(config.processed_file, records)
+    if os.path.exists(config.processed_log_file):
+        tmp_path = f"{config.processed_log_file}.tmp"
+        open(tmp_path, 'wb').close()
+        os.replace(tmp_path, config.processed_log_file)
+        fsync_dir(config.data_dir)
+    print(f"Compacted {len(records)} records into excel_output.json.")
+
+
+class DedupIndex:
+    """
+    Persistent index of composite transaction IDs already stored.
+
+    Kept in SQLite next to excel_output.json so each run only checks its new
+    rows instead of reloading and re-hashing the whole history. The index
+    records the size and mtime of the history files it matches; if they
+    changed behind its back (manual edit, crash mid-run) it is rebuilt.
+
+    It also holds the manifest of statement files (by content hash) whose
+    records are already stored, so --all does not parse them again.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingested_files (hash TEXT PRIMARY KEY, name TEXT, ingested_at TEXT)"
+        )
+
+    @staticmethod
+    def _files_signature(paths):
+        signatures = []
+        for path in paths:
+            if not os.path.exists(path):
+                signatures.append("missing")
+            else:
+                stat = os.stat(path)
+                signatures.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        return "|".join(signatures)
+
+    def is_in_sync(self, *history_paths):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'history_signature'").fetchone()
+        return row is not None and row[0] == self._files_signature(history_paths)
+
+    def mark_in_sync(self, *history_paths):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('history_signature', ?)",
+            (self._files_signature(history_paths),)
+        )
+        self.conn.commit()
+
+    def rebuild(self, ids):
+        self.conn.execute("DELETE FROM ids")
+        # The history no longer matches what was ingested, so allow re-reading
+        self.conn.execute("DELETE FROM ingested_files")
+        self.add(ids)
+
+    def add(self, ids):
+        self.conn.executemany("INSERT OR IGNORE INTO ids (id) VALUES (?)", ((i,) for i in ids))
+        self.conn.commit()
+
+    def existing(self, ids):
+        """Returns the subset of ids already in the index."""
+        found = set()
+        ids = list(ids)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(
+                row[0] for row in
+                self.conn.execute(f"SELECT id FROM ids WHERE id IN ({placeholders})", chunk)
+            )
+        return found
+
+    def is_ingested(self, file_hash):
+        row = self.conn.execute("SELECT 1 FROM ingested_files WHERE hash = ?", (file_hash,)).fetchone()
+        return row is not None
+
+    def mark_ingested(self, file_hash, name):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ingested_files (hash, name, ingested_at) VALUES (?, ?, ?)",
+            (file_hash, name, datetime.now().isoformat(timespec='seconds'))
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def extract_records(path, digest=None, cache_dir=None):
+    """
+    Parses one statement and returns its 'ועד' transactions as a DataFrame.
+
+    Values are cleaned (NaN -> "") and each row carries its composite '_id'.
+    Returns None when the workbook could not be parsed (no header row or no
+    'עבור' column), and an empty DataFrame when it has no 'ועד' rows.
+    Runs in worker processes in --all mode, so it touches no shared state.
+    """
+    # Load Excel (single pass, header row detected in the same read)
+    print(f"Reading {os.path.basename(path)} to find header row...")
+    df = load_statement(path, digest, cache_dir)
+    if df is None:
+        return None
+
+    # Filter and Select Columns
+    # Expecting: 'תאריך', 'הפעולה', 'פרטים', 'אסמכתא', 'חובה', 'זכות', 'יתרה בש''ח', 'תאריך ערך', 'לטובת', 'עבור'
+
+    # Normalize columns: strip whitespace
+    df.columns = df.columns.str.strip()
+    print("Columns found:", df.columns.tolist())
+
+    # Find "עבור" column
+    avur_col = next((c for c in df.columns if "עבור" in c), None)
+    if not avur_col:
+         avur_col = next((c for c in df.columns if "לטובת" in c), None) # Fallback
+
+    if not avur_col:
+        print("Warning: Could not find column 'עבור' or 'לטובת'.")
+        return None
+
+    print(f"Filtering by column: {avur_col}")
+
+    # Filter rows where 'avur_col' contains "ועד"
+    df_filtered = df[df[avur_col].astype(str).str.contains("ועד", na=False)]
+
+    if df_filtered.empty:
+        print("No transactions found with 'ועד' in 'עבור' column.")
+        return pd.DataFrame()
+
+    print(f"Found {len(df_filtered)} matching transactions.")
+
+    # Select specific columns
+    # תאריך, הפעולה, אסמכתא, זכות, לטובת, קבלה
+    cols_to_keep = ["תאריך", "הפעולה", "אסמכתא", "זכות", "לטובת"]
+    target_cols = [c for c in cols_to_keep if c in df_filtered.columns]
+
+    final_df = df_filtered[target_cols].copy()
+
+    # Extract Receipt Number from 'עבור' (or fallback column)
+    final_df['קבלה'] = extract_receipts(df_filtered[avur_col])
+
+    final_df['תאריך'] = final_df['תאריך'].astype(str) # Simplify dates
+
+    # Clean values first to ensure valid values for ID generation logic match final storage
+    final_df = final_df.astype(object).where(final_df.notna(), "")
+    final_df['_id'] = generate_unique_ids(final_df)
+    return final_df
+
+
+def sync_index(config, index):
+    """Rebuilds the dedup index (and runs migrations) if the history changed."""
+    if index.is_in_sync(config.processed_file, config.processed_log_file):
+        return
+
+    # One-time (or after external edits) full-history migration and ID pass
+    print("Dedup index out of date, rebuilding from processed.json...")
+    current_data = read_all_records(config)
+    migrated_count = clean_history(current_data)
+    index.rebuild(item['_id'] for item in current_data)
+    if migrated_count > 0:
+        print(f"Migrated/Cleaned {migrated_count} existing records.")
+        compact(config, current_data)
+        print(f"Saved migration updates.")
+
+
+def store_records(config, index, records_df):
+    """Appends rows whose '_id' is not stored yet. Returns the appended records."""
+    fresh_df = records_df.drop_duplicates('_id')
+    known_ids = index.existing(fresh_df['_id'])
+    fresh_df = fresh_df[~fresh_df['_id'].isin(known_ids)]
+
+    # Save: append only the new records, compacting now and then
+    fresh_records = fresh_df.to_dict(orient='records')
+    if fresh_records:
+        append_records(config, fresh_records)
+        index.add(r['_id'] for r in fresh_records)
+        if count_log_records(config) >= COMPACT_THRESHOLD:
+            compact(config)
+    return fresh_records
+
+
+def process_pending(config, files, index, workers=None):
+    """
+    Processes every statement not yet in the ingestion manifest.
+
+    Workbooks are parsed in parallel in a process pool; their records are
+    then stored oldest file first through the usual '_id' dedup, so an
+    overlap between consecutive exports is only stored once.
+    Returns the newly stored records.
+    """
+    files = sorted(files, key=os.path.getmtime)
+    hashes = {path: file_hash(path) for path in files}
+    pending = [path for path in files if not index.is_ingested(hashes[path])]
+    skipped = len(files) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} already ingested file(s).")
+    if not pending:
+        print("No pending Excel files.")
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    print(f"Processing {len(pending)} file(s) with {workers} worker(s)...")
+
+    added = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (path, executor.submit(extract_records, path, hashes[path], config.statement_cache_dir))
+            for path in pending
+        ]
+        for path, future in futures:
+            name = os.path.basename(path)
+            try:
+                records_df = future.result()
+            except Exception as e:
+                # Left out of the manifest so the next run retries it
+                print(f"Error processing {name}: {e}")
+                continue
+            if records_df is None:
+                # Left out of the manifest so a fixed parser can read it later
+                print(f"{name}: could not be parsed, not marking as ingested.")
+                continue
+            matched = len(records_df)
+            fresh_records = store_records(config, index, records_df) if matched else []
+            index.mark_ingested(hashes[path], name)
+            added.extend(fresh_records)
+            print(f"{name}: {matched} matching, {len(fresh_records)} new.")
+
+    print(f"Added {len(added)} new transactions to processed.json.")
+    return added
+
+
+def process_file(config, path, index):
+    """Processes one statement file. Returns the newly stored records."""
+    print(f"Processing file: {path}")
+
+    digest = file_hash(path)
+    records_df = extract_records(path, digest, config.statement_cache_dir)
+    if records_df is None:
+        print("Could not parse the file, not marking it as ingested.")
+        return []
+    fresh_records = []
+    if len(records_df):
+        fresh_records = store_records(config, index, records_df)
+        if fresh_records:
+            print(f"Added {len(fresh_records)} new transactions to processed.json.")
         else:
             print("No new unique transactions to add.")
+    index.mark_ingested(digest, os.path.basename(path))
+    return fresh_records
+
+
+@contextlib.contextmanager
+def open_index(config):
+    """Opens the dedup index, synced with the stored history, and marks it in sync on success."""
+    os.makedirs(config.data_dir, exist_ok=True)
+    index = DedupIndex(config.dedup_index_file)
+    try:
+        sync_index(config, index)
+        yield index
+        index.mark_in_sync(config.processed_file, config.processed_log_file)
+    finally:
+        index.close()
+
+
+def process_statement(path, config=None):
+    """
+    Extracts the 'ועד' transactions of one bank statement and stores the new ones.
+
+    Library entry point: safe to call repeatedly from a long-lived process,
+    already stored transactions are skipped by '_id'.
+    Returns the newly stored records (dicts as written to excel_output).
+    """
+    config = config or ProcessorConfig()
+    with open_index(config) as index:
+        return process_file(config, path, index)
+
 
+def process_downloads(config=None, all_files=False, workers=None):
+    """
+    Processes the latest statement in downloads_dir, or with all_files every
+    one not ingested yet. Returns the newly stored records.
+    """
+    config = config or ProcessorConfig()
+    files = glob.glob(os.path.join(config.downloads_dir, "*.xls*"))
+    if not files:
+        print("No Excel files found in downloads directory.")
+        return []
+
+    with open_index(config) as index:
+        if all_files:
+            return process_pending(config, files, index, workers)
+        # Sort by modification time
+        return process_file(config, max(files, key=os.path.getmtime), index)
+
+
+def run_worker(config, stdin=None, stdout=None):
+    """
+    Serves jobs as JSON lines until stdin closes, keeping pandas loaded.
+
+    Each line is {"id": ..., "path": "<statement>"} to process one file, or
+    {"id": ..., "all": true|false, "workers": n} to process data/downloads
+    like the command line does. Each job is answered with one line:
+    {"id", "ok": true, "added": n, "records": [...]} or {"id", "ok": false, "error"}.
+    Progress output goes to stderr so stdout carries only replies; from the
+    command line, reserve_stdout() also keeps --all pool workers off it.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        if not line.strip():
+            continue
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get('id')
+            with contextlib.redirect_stdout(sys.stderr):
+                if job.get('path'):
+                    records = process_statement(job['path'], config)
+                else:
+                    records = process_downloads(config, bool(job.get('all')), job.get('workers'))
+            reply = {"id": job_id, "ok": True, "added": len(records), "records": records}
+        except Exception as e:
+            reply = {"id": job_id, "ok": False, "error": str(e)}
+        stdout.write(json.dumps(reply, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+
+def reserve_stdout():
+    """
+    Points fd 1 at stderr and returns a text stream on the original stdout.
+
+    Pool workers inherit file descriptors (spawned ones open sys.stdout on
+    fd 1 again), so redirecting sys.stdout alone would let their progress
+    prints into the reply stream.
+    """
+    sys.stdout.flush()
+    replies = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    return replies
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract 'ועד' transactions from downloaded bank statements")
+    parser.add_argument('--all', action='store_true',
+                        help="Process every not yet ingested file in data/downloads, not just the latest")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for --all (default: CPU count)")
+    parser.add_argument('--data-dir', default=None,
+                        help="State directory (default: MoneyCollection/data); downloads are read from <data-dir>/downloads")
+    parser.add_argument('--worker', action='store_true',
+                        help="Stay running and serve JSON-line jobs from stdin (see run_worker)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = ProcessorConfig.for_data_dir(args.data_dir) if args.data_dir else ProcessorConfig()
+
+    if args.worker:
+        run_worker(config, stdout=reserve_stdout())
+        return
+
+    print("Starting Python Excel Processor...")
+    try:
+        process_downloads(config, args.all, args.workers)
     except Exception as e:
         print(f"Error processing Excel: {e}")
 
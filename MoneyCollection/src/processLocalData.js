@@ -8,17 +8,48 @@ const { generateReceipt } = require('./receiptGenerator');
 const { isProcessed, markProcessed } = require('./stateManager');
 
 const DATA_FILE = path.join(__dirname, '../data/excel_output.json');
+// New transactions appended by excel_processor.py since its last compaction
+const DATA_LOG_FILE = path.join(__dirname, '../data/excel_output.jsonl');
+
+/**
+ * Loads the compacted snapshot plus the append-only log, de-duplicated by _id.
+ * A torn last line (crash mid-append) is skipped.
+ */
+function loadTransactions() {
+    const records = fs.existsSync(DATA_FILE)
+        ? JSON.parse(fs.readFileSync(DATA_FILE, 'utf8'))
+        : [];
+    const seen = new Set(records.map(r => r._id).filter(Boolean));
+
+    if (fs.existsSync(DATA_LOG_FILE)) {
+        const lines = fs.readFileSync(DATA_LOG_FILE, 'utf8').split('\n');
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            let record;
+            try {
+                record = JSON.parse(line);
+            } catch (e) {
+                console.warn('Skipping unreadable line in excel_output.jsonl');
+                continue;
+            }
+            if (seen.has(record._id)) continue;
+            seen.add(record._id);
+            records.push(record);
+        }
+    }
+    return records;
+}
 
 async function main() {
     console.log('Starting Local Data Processor...');
 
-    if (!fs.existsSync(DATA_FILE)) {
+    if (!fs.existsSync(DATA_FILE) && !fs.existsSync(DATA_LOG_FILE)) {
         console.error(`Data file not found: ${DATA_FILE}`);
         return;
     }
 
     // 1. Load Data
-    const rawData = JSON.parse(fs.readFileSync(DATA_FILE, 'utf8'));
+    const rawData = loadTransactions();
     console.log(`Loaded ${rawData.length} transactions from ${DATA_FILE}`);
 
     // 2. Load Config
@@ -0,0 +1,27 @@
+import os
+
+import pandas as pd
+import pytest
+
+from excel_processor import ProcessorConfig
+
+
+def write_statement(path, rows):
+    """Writes rows (lists of cell values) as a headerless workbook."""
+    pd.DataFrame(rows).to_excel(path, header=False, index=False)
+
+
+STATEMENT_ROWS = [
+    ["דוח תנועות בחשבון"],
+    ["תאריך", "הפעולה", "אסמכתא", "זכות", "עבור"],
+    ["2026-01-01", "העברה", "123", "500", "ועד בית דירה 5"],
+    ["2026-01-02", "העברה", "124", "300", "ועד בית דירה 7"],
+    ["2026-01-03", "העברה", "125", "80", "חשמל"],
+]
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ProcessorConfig.for_data_dir(str(tmp_path))
+    os.makedirs(config.downloads_dir)
+    return config
@@ -0,0 +1,47 @@
+import json
+import os
+
+from conftest import STATEMENT_ROWS, write_statement
+from excel_processor import DedupIndex, open_index, process_statement, read_all_records
+
+
+def test_reprocessing_a_statement_adds_nothing(config):
+    path = os.path.join(config.downloads_dir, "a.xlsx")
+    write_statement(path, STATEMENT_ROWS)
+
+    assert len(process_statement(path, config)) == 2
+    assert process_statement(path, config) == []
+
+
+def test_index_is_rebuilt_after_an_external_edit(config):
+    path = os.path.join(config.downloads_dir, "a.xlsx")
+    write_statement(path, STATEMENT_ROWS)
+    process_statement(path, config)
+
+    # Someone removes a record by hand
+    records = read_all_records(config)
+    with open(config.processed_file, "w", encoding="utf-8") as f:
+        json.dump(records[:1], f, ensure_ascii=False)
+    if os.path.exists(config.processed_log_file):
+        os.remove(config.processed_log_file)
+
+    assert len(process_statement(path, config)) == 1
+
+
+def test_existing_returns_only_known_ids(config):
+    os.makedirs(config.data_dir, exist_ok=True)
+    index = DedupIndex(config.dedup_index_file)
+    try:
+        index.add(["a", "b"])
+        assert set(index.existing(["a", "c"])) == {"a"}
+    finally:
+        index.close()
+
+
+def test_index_is_in_sync_after_a_run(config):
+    path = os.path.join(config.downloads_dir, "a.xlsx")
+    write_statement(path, STATEMENT_ROWS)
+    process_statement(path, config)
+
+    with open_index(config) as index:
+        assert index.is_in_sync(config.processed_file, config.processed_log_file)
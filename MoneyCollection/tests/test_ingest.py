@@ -0,0 +1,47 @@
+import os
+
+from conftest import STATEMENT_ROWS, write_statement
+from excel_processor import (
+    file_hash, open_index, process_downloads, process_pending, process_statement, read_all_records,
+)
+
+
+def test_pending_files_are_stored_once(config):
+    first = os.path.join(config.downloads_dir, "a.xlsx")
+    second = os.path.join(config.downloads_dir, "b.xlsx")
+    write_statement(first, STATEMENT_ROWS)
+    # The next export overlaps the previous one
+    write_statement(second, STATEMENT_ROWS + [["2026-01-04", "העברה", "126", "500", "ועד בית דירה 9"]])
+
+    added = process_downloads(config, all_files=True, workers=2)
+
+    assert len(added) == 3
+    assert len(read_all_records(config)) == 3
+    assert process_downloads(config, all_files=True, workers=2) == []
+
+
+def test_unparsable_file_is_not_marked_ingested(config):
+    path = os.path.join(config.downloads_dir, "broken.xlsx")
+    write_statement(path, [["no header here"], ["1", "2"]])
+
+    with open_index(config) as index:
+        assert process_pending(config, [path], index, workers=1) == []
+        assert not index.is_ingested(file_hash(path))
+
+
+def test_statement_without_matches_is_marked_ingested(config):
+    path = os.path.join(config.downloads_dir, "other.xlsx")
+    write_statement(path, [STATEMENT_ROWS[1], ["2026-01-03", "העברה", "125", "80", "חשמל"]])
+
+    with open_index(config) as index:
+        assert process_pending(config, [path], index, workers=1) == []
+        assert index.is_ingested(file_hash(path))
+
+
+def test_single_unparsable_file_is_not_marked_ingested(config):
+    path = os.path.join(config.downloads_dir, "broken.xlsx")
+    write_statement(path, [["no header here"], ["1", "2"]])
+
+    assert process_statement(path, config) == []
+    with open_index(config) as index:
+        assert not index.is_ingested(file_hash(path))
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from conftest import STATEMENT_ROWS, write_statement
+from excel_processor import (
+    extract_receipt, extract_receipts, find_header_row, generate_unique_id, generate_unique_ids, parse_statement,
+)
+
+
+def test_header_row_is_found_below_a_title(tmp_path):
+    path = tmp_path / "statement.xlsx"
+    write_statement(path, STATEMENT_ROWS)
+
+    df = parse_statement(path)
+
+    assert list(df.columns) == ["תאריך", "הפעולה", "אסמכתא", "זכות", "עבור"]
+    assert len(df) == 3
+
+
+def test_missing_header_is_reported():
+    assert find_header_row(pd.DataFrame([["a", "b"], ["c", "d"]])) == -1
+
+
+def test_vectorized_receipts_match_the_scalar_version():
+    values = pd.Series(["ועד בית דירה 5", "ועד 12 קבלה 7", "ועד", np.nan, 42])
+
+    assert extract_receipts(values).tolist() == [extract_receipt(v) for v in values]
+
+
+def test_vectorized_ids_match_the_scalar_version():
+    df = pd.DataFrame({
+        "אסמכתא": ["123", np.nan, 0, " 7 "],
+        "תאריך": ["2026-01-01", "2026-01-02", "nan", "None"],
+        "זכות": [500.0, "", 300, np.nan],
+        "לטובת": ["ועד", None, "NaN", "ועד בית"],
+    })
+
+    expected = [generate_unique_id(record) for record in df.to_dict(orient="records")]
+    assert generate_unique_ids(df).tolist() == expected
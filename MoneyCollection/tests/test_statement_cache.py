@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from conftest import STATEMENT_ROWS, write_statement
+import excel_processor
+from excel_processor import file_hash, load_statement, statement_cache_path
+
+pytest.importorskip("pyarrow")
+
+
+def test_parsed_statement_is_read_back_from_cache(tmp_path, monkeypatch):
+    path = tmp_path / "a.xlsx"
+    cache_dir = str(tmp_path / "cache")
+    write_statement(path, STATEMENT_ROWS)
+    digest = file_hash(path)
+
+    parsed = load_statement(path, digest, cache_dir)
+    assert os.path.exists(statement_cache_path(cache_dir, digest))
+
+    def no_parse(path):
+        raise AssertionError("workbook parsed again")
+
+    monkeypatch.setattr(excel_processor, "parse_statement", no_parse)
+    cached = load_statement(path, digest, cache_dir)
+
+    assert cached.astype(str).equals(parsed.astype(str))
+
+
+def test_changed_workbook_is_parsed_again(tmp_path):
+    path = tmp_path / "a.xlsx"
+    cache_dir = str(tmp_path / "cache")
+    write_statement(path, STATEMENT_ROWS)
+    load_statement(path, file_hash(path), cache_dir)
+
+    write_statement(path, STATEMENT_ROWS[:3])
+
+    assert len(load_statement(path, file_hash(path), cache_dir)) == 1
+
+
+def test_unparsable_workbook_is_not_cached(tmp_path):
+    path = tmp_path / "a.xlsx"
+    cache_dir = str(tmp_path / "cache")
+    write_statement(path, [["no header"]])
+
+    assert load_statement(path, file_hash(path), cache_dir) is None
+    assert not os.path.exists(cache_dir) or os.listdir(cache_dir) == []
@@ -0,0 +1,47 @@
+import json
+import os
+
+from excel_processor import append_records, compact, count_log_records, read_all_records
+
+
+def record(n):
+    return {"_id": f"{n}_2026-01-01_100_", "אסמכתא": str(n), "זכות": "100"}
+
+
+def test_appended_records_are_read_back(config):
+    append_records(config, [record(1), record(2)])
+    append_records(config, [record(3)])
+
+    assert [r["_id"] for r in read_all_records(config)] == [record(n)["_id"] for n in (1, 2, 3)]
+    assert count_log_records(config) == 3
+
+
+def test_compaction_moves_the_log_into_the_snapshot(config):
+    append_records(config, [record(1), record(2)])
+
+    compact(config)
+
+    assert count_log_records(config) == 0
+    with open(config.processed_file, encoding="utf-8") as f:
+        assert len(json.load(f)) == 2
+    assert len(read_all_records(config)) == 2
+
+
+def test_overlap_left_by_an_interrupted_compaction_is_deduplicated(config):
+    append_records(config, [record(1), record(2)])
+    compact(config)
+    # A crash after the snapshot was written but before the log was emptied
+    append_records(config, [record(1), record(2), record(3)])
+
+    assert len(read_all_records(config)) == 3
+
+
+def test_torn_last_line_is_skipped(config):
+    append_records(config, [record(1)])
+    with open(config.processed_log_file, "ab") as f:
+        f.write(b'{"_id": "torn')
+
+    append_records(config, [record(2)])
+
+    assert [r["_id"] for r in read_all_records(config)] == [record(1)["_id"], record(2)["_id"]]
+    assert os.path.getsize(config.processed_log_file) > 0
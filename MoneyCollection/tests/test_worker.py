@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import STATEMENT_ROWS, write_statement
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Pool workers are spawned, as on macOS and Windows, so they open stdout anew
+WORKER = f"""
+import multiprocessing, sys
+sys.path.insert(0, {SRC_DIR!r})
+multiprocessing.set_start_method('spawn', force=True)
+import excel_processor
+excel_processor.main(sys.argv[1:])
+"""
+
+
+def test_worker_stdout_carries_only_replies(config):
+    for name in ("a.xlsx", "b.xlsx"):
+        write_statement(os.path.join(config.downloads_dir, name), STATEMENT_ROWS)
+
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER, "--worker", "--data-dir", config.data_dir],
+        input='{"id": 1, "all": true, "workers": 2}\n',
+        capture_output=True, text=True, encoding="utf-8", timeout=120, check=True,
+    )
+
+    lines = result.stdout.splitlines()
+    assert len(lines) == 1
+    reply = json.loads(lines[0])
+    assert reply["ok"] and reply["added"] == 2
+    assert "Reading" in result.stderr
@@ -30,7 +30,11 @@ module.exports = {
         sheetId: process.env.GOOGLE_SHEET_ID
     },
     ai: {
-        serviceUrl: process.env.AI_SERVICE_URL || 'http://python-ai-agent:8000'
+        serviceUrl: process.env.AI_SERVICE_URL || 'http://python-ai-agent:8000',
+        // With both set, messages are classified in the background and the
+        // AI service POSTs the result to callbackUrl (see /webhooks/ai-result)
+        callbackUrl: process.env.AI_CALLBACK_URL,
+        callbackToken: process.env.AI_CALLBACK_TOKEN
     },
     server: {
         port: process.env.PORT || 3000,
@@ -0,0 +1,69 @@
+/**
+ * Handler for classification results POSTed back by the Python AI service.
+ */
+
+const { createTicket, notifyError } = require('./incoming.handler');
+
+// Job IDs already handled; the AI service retries deliveries it could not
+// confirm, which must not open a second ticket
+const MAX_HANDLED_JOBS = 1000;
+const handledJobs = new Set();
+
+/**
+ * Remember a job ID, forgetting the oldest beyond MAX_HANDLED_JOBS
+ * @param {string} jobId - Job ID from the callback
+ * @returns {boolean} - False if the job was already handled
+ */
+const markHandled = (jobId) => {
+    if (handledJobs.has(jobId)) {
+        return false;
+    }
+    handledJobs.add(jobId);
+    if (handledJobs.size > MAX_HANDLED_JOBS) {
+        handledJobs.delete(handledJobs.values().next().value);
+    }
+    return true;
+};
+
+/**
+ * Handle a finished background analyze job
+ * POST /webhooks/ai-result?phone=...&building=...[&media=...]
+ */
+const handleAiResult = async (req, res) => {
+    const { phone, building, media } = req.query;
+    const job = req.body || {};
+
+    if (!phone || !building || !job.job_id) {
+        return res.status(400).json({ error: 'Missing phone, building or job_id' });
+    }
+
+    // Answer first, so ticket creation does not hold the AI service's worker
+    res.status(200).json({ received: true });
+
+    if (!markHandled(job.job_id)) {
+        console.log(`AI job ${job.job_id} already handled, ignoring repeated callback`);
+        return;
+    }
+
+    try {
+        if (job.status !== 'done' || !job.result) {
+            throw new Error(`AI job ${job.job_id} ${job.status}: ${job.error}`);
+        }
+
+        console.log(`AI job ${job.job_id} done: type=${job.result.ticket_type}, location=${job.result.location}`);
+        await createTicket({
+            userPhone: phone,
+            buildingId: building,
+            description: job.result.original_text,
+            mediaUrl: media || '',
+            classification: job.result
+        });
+    } catch (error) {
+        console.error('AI Result Handler Error:', error);
+        await notifyError(phone).catch(() => {});
+    }
+};
+
+module.exports = {
+    handleAiResult
+};
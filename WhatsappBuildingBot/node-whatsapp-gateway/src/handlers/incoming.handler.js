@@ -10,6 +10,63 @@ const twilioService = require('../services/twilio.service');
 const { getProfessionalForTicketType } = require('../config/buildings.config');
 const { STATUS } = require('../config/constants');
 
+const ERROR_MESSAGE = 'סליחה, אירעה שגיאה בעיבוד פנייתך. אנא נסה שנית או צור קשר עם הוועד.';
+
+/**
+ * Open a ticket for a classified message and notify the people involved
+ * @param {Object} params - Message and its classification
+ * @param {string} params.userPhone - Resident phone number
+ * @param {string} params.buildingId - Building identifier
+ * @param {string} params.description - Message text as the resident sent it
+ * @param {string} params.mediaUrl - First attachment URL, if any
+ * @param {Object} params.classification - AI classification response
+ */
+const createTicket = async ({ userPhone, buildingId, description, mediaUrl, classification }) => {
+    // Another report of an incident that is already open: acknowledge
+    // it without a new Sheets row or professional notification
+    if (classification.duplicate) {
+        console.log(`Duplicate of incident ${classification.incident_id}, skipping new ticket`);
+        await notificationsService.notifyResidentReceived(userPhone, classification);
+        return;
+    }
+
+    // 1. Get assigned professional
+    const professional = getProfessionalForTicketType(buildingId, classification.ticket_type);
+
+    // 2. Prepare complaint data for Sheets
+    const complaintData = {
+        timestamp: new Date().toLocaleString('he-IL', { timeZone: 'Asia/Jerusalem' }),
+        residentName: 'דייר', // TODO: Look up from whitelist
+        phone: userPhone,
+        buildingId,
+        ticketType: classification.ticket_type,
+        location: classification.location,
+        description,
+        summary: classification.normalized_summary,
+        professional: professional.name,
+        status: STATUS.OPEN,
+        image: mediaUrl || '',
+        confidence: classification.confidence
+    };
+
+    // 3. Save to Google Sheets
+    await sheetsService.addComplaint(complaintData);
+
+    // 4. Notify resident
+    await notificationsService.notifyResidentReceived(userPhone, classification);
+
+    // 5. Notify professional
+    await notificationsService.notifyProfessionalNewTask(professional, complaintData);
+};
+
+/**
+ * Tell a resident their message could not be processed
+ * @param {string} to - Resident phone number, with or without 'whatsapp:'
+ */
+const notifyError = async (to) => {
+    await twilioService.sendMessage(to, ERROR_MESSAGE);
+};
+
 /**
  * Handle incoming WhatsApp message from resident
  */
@@ -17,65 +74,53 @@ const handleIncomingMessage = async (req, res) => {
     const { From, Body, NumMedia, MediaUrl0 } = req.body;
     const userPhone = From.replace('whatsapp:', '');
     const buildingId = req.buildingId || process.env.DEFAULT_BUILDING_ID || 'alonim-8';
+    const mediaUrl = NumMedia > 0 ? MediaUrl0 : '';
 
     console.log(`Received message from ${userPhone} for building ${buildingId}: ${Body}`);
 
+    const message = {
+        buildingId,
+        resident: {
+            name: 'דייר', // TODO: Look up from whitelist
+            phone: userPhone
+        },
+        messageText: Body || 'תמונה מצורפת',
+        mediaUrls: mediaUrl ? [mediaUrl] : []
+    };
+
     try {
-        // 1. Call AI service for classification
-        const classification = await aiService.analyzeMessage({
-            buildingId,
-            resident: {
-                name: 'דייר', // TODO: Look up from whitelist
-                phone: userPhone
-            },
-            messageText: Body || 'תמונה מצורפת',
-            mediaUrls: NumMedia > 0 ? [MediaUrl0] : []
-        });
-
-        // 2. Get assigned professional
-        const professional = getProfessionalForTicketType(buildingId, classification.ticket_type);
-
-        // 3. Prepare complaint data for Sheets
-        const complaintData = {
-            timestamp: new Date().toLocaleString('he-IL', { timeZone: 'Asia/Jerusalem' }),
-            residentName: 'דייר', // TODO: Look up from whitelist
-            phone: userPhone,
-            buildingId,
-            ticketType: classification.ticket_type,
-            location: classification.location,
-            description: Body,
-            summary: classification.normalized_summary,
-            professional: professional.name,
-            status: STATUS.OPEN,
-            image: NumMedia > 0 ? MediaUrl0 : '',
-            confidence: classification.confidence
-        };
-
-        // 4. Save to Google Sheets
-        await sheetsService.addComplaint(complaintData);
-
-        // 5. Notify resident
-        await notificationsService.notifyResidentReceived(userPhone, classification);
+        // Queue the message and answer Twilio right away; the ticket is
+        // opened when the AI service calls back (see ai-result.handler)
+        if (aiService.callbacksEnabled()) {
+            try {
+                const callbackUrl = aiService.buildCallbackUrl({ phone: userPhone, buildingId, mediaUrl });
+                const jobId = await aiService.submitMessage(message, callbackUrl);
+                console.log(`Queued AI job ${jobId} for ${userPhone}`);
+                res.status(200).send('<Response></Response>');
+                return;
+            } catch (error) {
+                console.error('AI job submit failed, classifying synchronously:', error);
+            }
+        }
 
-        // 6. Notify professional
-        await notificationsService.notifyProfessionalNewTask(professional, complaintData);
+        const classification = await aiService.analyzeMessage(message);
+        await createTicket({ userPhone, buildingId, description: Body, mediaUrl, classification });
 
-        // 7. Send empty response to Twilio
+        // Send empty response to Twilio
         res.status(200).send('<Response></Response>');
 
     } catch (error) {
         console.error('Message Handler Error:', error);
 
         // Notify user of error
-        await twilioService.sendMessage(
-            From,
-            'סליחה, אירעה שגיאה בעיבוד פנייתך. אנא נסה שנית או צור קשר עם הוועד.'
-        );
+        await notifyError(From);
 
         res.status(200).send('<Response></Response>');
     }
 };
 
 module.exports = {
-    handleIncomingMessage
+    handleIncomingMessage,
+    createTicket,
+    notifyError
 };
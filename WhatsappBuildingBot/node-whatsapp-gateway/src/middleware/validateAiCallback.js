@@ -0,0 +1,23 @@
+/**
+ * Middleware to validate result callbacks from the Python AI service.
+ */
+
+const crypto = require('crypto');
+const config = require('../config/environment');
+
+/**
+ * Check that the callback carries the AI_CALLBACK_TOKEN it was queued with
+ */
+const validateAiCallback = (req, res, next) => {
+    const expected = Buffer.from(config.ai.callbackToken || '');
+    const received = Buffer.from(String(req.query.token || ''));
+
+    if (!expected.length || expected.length !== received.length || !crypto.timingSafeEqual(expected, received)) {
+        console.warn('Invalid AI callback token');
+        return res.status(403).send('Forbidden: Invalid token');
+    }
+
+    next();
+};
+
+module.exports = validateAiCallback;
@@ -3,8 +3,10 @@ const router = express.Router();
 
 const incomingHandler = require('../handlers/incoming.handler');
 const statusUpdateHandler = require('../handlers/status-update.handler');
+const aiResultHandler = require('../handlers/ai-result.handler');
 const { getProfessionalByPhone } = require('../services/notifications.service');
 const validateTwilioSignature = require('../middleware/validateTwilioSignature');
+const validateAiCallback = require('../middleware/validateAiCallback');
 // const authResident = require('../middleware/authResident.middleware');
 
 /**
@@ -42,4 +44,10 @@ router.post('/twilio/status', (req, res) => {
     res.status(200).send('<Response></Response>');
 });
 
+/**
+ * Classification result from the Python AI service
+ * POST /webhooks/ai-result
+ */
+router.post('/ai-result', validateAiCallback, aiResultHandler.handleAiResult);
+
 module.exports = router;
@@ -7,6 +7,25 @@ const config = require('../config/environment');
 // AI Service URL from environment
 const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://python-ai-agent:8000';
 
+// How long to wait for a classification before using the fallback.
+// Sent to the AI service so it cancels the LLM call at the same point.
+const AI_SERVICE_TIMEOUT_MS = parseInt(process.env.AI_SERVICE_TIMEOUT_MS || '10000', 10);
+
+/**
+ * Build the /analyze request body
+ * @param {Object} params - Analysis parameters, as for analyzeMessage
+ * @returns {Object} - Request body
+ */
+const buildRequestBody = ({ buildingId, resident, messageText, mediaUrls = [] }) => ({
+    building_id: buildingId,
+    resident: {
+        name: resident.name,
+        phone: resident.phone
+    },
+    message_text: messageText,
+    media_urls: mediaUrls
+});
+
 /**
  * Send a message to the AI service for analysis
  * @param {Object} params - Analysis parameters
@@ -17,15 +36,7 @@ const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://python-ai-agent:800
  * @returns {Promise<Object>} - AI classification response
  */
 const analyzeMessage = async ({ buildingId, resident, messageText, mediaUrls = [] }) => {
-    const requestBody = {
-        building_id: buildingId,
-        resident: {
-            name: resident.name,
-            phone: resident.phone
-        },
-        message_text: messageText,
-        media_urls: mediaUrls
-    };
+    const requestBody = buildRequestBody({ buildingId, resident, messageText, mediaUrls });
 
     try {
         console.log(`Calling AI service at ${AI_SERVICE_URL}/analyze`);
@@ -33,9 +44,11 @@ const analyzeMessage = async ({ buildingId, resident, messageText, mediaUrls = [
         const response = await fetch(`${AI_SERVICE_URL}/analyze`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Request-Timeout-Ms': String(AI_SERVICE_TIMEOUT_MS)
             },
-            body: JSON.stringify(requestBody)
+            body: JSON.stringify(requestBody),
+            signal: AbortSignal.timeout(AI_SERVICE_TIMEOUT_MS)
         });
 
         if (!response.ok) {
@@ -66,6 +79,56 @@ const analyzeMessage = async ({ buildingId, resident, messageText, mediaUrls = [
     }
 };
 
+/**
+ * Check whether results can be delivered to this gateway by callback
+ * @returns {boolean} - True if AI_CALLBACK_URL and AI_CALLBACK_TOKEN are set
+ */
+const callbacksEnabled = () => Boolean(config.ai.callbackUrl && config.ai.callbackToken);
+
+/**
+ * Build the callback URL for one message. The sender travels in the URL,
+ * so a result still reaches the resident after a gateway restart.
+ * @param {Object} params - Message context
+ * @param {string} params.phone - Resident phone number
+ * @param {string} params.buildingId - Building identifier
+ * @param {string} params.mediaUrl - First attachment URL, if any
+ * @returns {string} - Callback URL
+ */
+const buildCallbackUrl = ({ phone, buildingId, mediaUrl }) => {
+    const url = new URL(config.ai.callbackUrl);
+    url.searchParams.set('token', config.ai.callbackToken);
+    url.searchParams.set('phone', phone);
+    url.searchParams.set('building', buildingId);
+    if (mediaUrl) {
+        url.searchParams.set('media', mediaUrl);
+    }
+    return url.toString();
+};
+
+/**
+ * Queue a message for background analysis; the result is POSTed to callbackUrl
+ * @param {Object} params - Analysis parameters, as for analyzeMessage
+ * @param {string} callbackUrl - URL from buildCallbackUrl
+ * @returns {Promise<string>} - Job ID
+ * @throws {Error} - If the AI service did not accept the job
+ */
+const submitMessage = async (params, callbackUrl) => {
+    const response = await fetch(`${AI_SERVICE_URL}/analyze`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...buildRequestBody(params), callback_url: callbackUrl }),
+        signal: AbortSignal.timeout(AI_SERVICE_TIMEOUT_MS)
+    });
+
+    if (response.status !== 202) {
+        const errorText = await response.text();
+        throw new Error(`AI service returned ${response.status}: ${errorText}`);
+    }
+
+    const { job_id: jobId } = await response.json();
+    return jobId;
+};
+
 /**
  * Check if the AI service is healthy
  * @returns {Promise<boolean>} - True if healthy
@@ -85,6 +148,9 @@ const checkHealth = async () => {
 
 module.exports = {
     analyzeMessage,
+    submitMessage,
+    callbacksEnabled,
+    buildCallbackUrl,
     checkHealth,
     AI_SERVICE_URL
 };
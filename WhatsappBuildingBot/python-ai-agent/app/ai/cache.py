@@ -0,0 +1,307 @@
+"""
+Result cache for ticket classifications.
+
+Residents often report the same problem in almost the same words, so
+classifications are cached by normalized message text and building.
+Two backends are available: an in-process LRU dictionary, and a local
+SQLite file whose entries survive restarts. Async callers use aget() and
+aset(), which run the SQLite backend's queries in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from app.config import Settings
+from app.schemas import AnalyzeResponse, CacheStats
+
+
+logger = logging.getLogger(__name__)
+
+# Hebrew points (niqqud) and cantillation marks
+_NIQQUD_RE = re.compile(r"[֑-ׇ]")
+# Geresh, gershayim and quote marks inside words ("ג'וקים", "מע\"מ")
+_QUOTE_RE = re.compile(r"['\"`׳״‘’“”]")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_REPEATED_CHAR_RE = re.compile(r"(.)\1{2,}")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(message_text: str) -> str:
+    """
+    Normalize a message so trivially different reports share a cache key.
+
+    Removes niqqud, punctuation and emoji, collapses stretched letters
+    ("דחוףףף" -> "דחוף") and whitespace, and lowercases Latin text.
+
+    Args:
+        message_text: Raw message text
+
+    Returns:
+        Normalized message text
+    """
+    text = unicodedata.normalize("NFKC", message_text).lower()
+    text = _NIQQUD_RE.sub("", text)
+    text = _QUOTE_RE.sub("", text)
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _REPEATED_CHAR_RE.sub(r"\1", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(
+    message_text: str,
+    building_id: str | None = None,
+    media_hashes: list[str] | None = None
+) -> str:
+    """
+    Build the cache key for a message in a building.
+
+    Args:
+        message_text: Raw message text
+        building_id: Optional building identifier
+        media_hashes: Content hashes of attached images, if any
+
+    Returns:
+        Hex digest of the building, normalized text and attachments
+    """
+    raw = f"{building_id or ''}\x1f{normalize_message(message_text)}"
+    if media_hashes:
+        raw += "\x1f" + ",".join(media_hashes)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache(ABC):
+    """
+    Base class for classification caches with TTL and LRU eviction.
+    """
+
+    backend: str = "base"
+
+    # Whether lookups do file I/O, which must stay off the event loop
+    blocking: bool = False
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        """
+        Initialize the cache limits and hit/miss counters.
+
+        Args:
+            max_entries: Maximum number of entries kept before LRU eviction
+            ttl_seconds: Seconds an entry stays valid after it is stored
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> AnalyzeResponse | None:
+        """
+        Look up a cached classification and record a hit or a miss.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            The cached AnalyzeResponse, or None when absent or expired
+        """
+        response = self._get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def set(self, key: str, response: AnalyzeResponse) -> None:
+        """
+        Store a classification, evicting least recently used entries.
+
+        Args:
+            key: Cache key from make_cache_key
+            response: Classification to cache
+        """
+        self._set(key, response)
+
+    async def aget(self, key: str) -> AnalyzeResponse | None:
+        """Like get(), for async code; blocking backends run in a worker thread."""
+        if self.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, response: AnalyzeResponse) -> None:
+        """Like set(), for async code; blocking backends run in a worker thread."""
+        if self.blocking:
+            await asyncio.to_thread(self.set, key, response)
+        else:
+            self.set(key, response)
+
+    def stats(self) -> CacheStats:
+        """Get the current cache statistics."""
+        return CacheStats(
+            backend=self.backend,
+            size=len(self),
+            hits=self.hits,
+            misses=self.misses
+        )
+
+    @abstractmethod
+    def _get(self, key: str) -> AnalyzeResponse | None:
+        """Backend lookup, without touching the counters."""
+
+    @abstractmethod
+    def _set(self, key: str, response: AnalyzeResponse) -> None:
+        """Backend store."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries currently stored."""
+
+
+class MemoryCache(ClassificationCache):
+    """
+    In-process LRU cache, lost on restart.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        super().__init__(max_entries, ttl_seconds)
+        self._entries: OrderedDict[str, tuple[float, AnalyzeResponse]] = OrderedDict()
+
+    def _get(self, key: str) -> AnalyzeResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, response = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def _set(self, key: str, response: AnalyzeResponse) -> None:
+        self._entries[key] = (time.time(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ClassificationCache):
+    """
+    Cache persisted in a local SQLite file, so entries survive restarts.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        """
+        Open (or create) the SQLite cache file.
+
+        Args:
+            path: Path of the SQLite database file
+            max_entries: Maximum number of entries kept before LRU eviction
+            ttl_seconds: Seconds an entry stays valid after it is stored
+        """
+        super().__init__(max_entries, ttl_seconds)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS classification_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_classification_cache_accessed "
+            "ON classification_cache (accessed_at)"
+        )
+
+    def _get(self, key: str) -> AnalyzeResponse | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM classification_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM classification_cache WHERE key = ?", (key,))
+                return None
+
+            self._conn.execute(
+                "UPDATE classification_cache SET accessed_at = ? WHERE key = ?",
+                (now, key)
+            )
+
+        try:
+            return AnalyzeResponse.model_validate_json(value)
+        except ValueError:
+            logger.warning("Dropping unreadable classification cache entry")
+            with self._lock:
+                self._conn.execute("DELETE FROM classification_cache WHERE key = ?", (key,))
+            return None
+
+    def _set(self, key: str, response: AnalyzeResponse) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classification_cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response.model_dump_json(), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM classification_cache WHERE key IN ("
+                "SELECT key FROM classification_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+
+
+def create_cache(settings: Settings) -> ClassificationCache | None:
+    """
+    Create the classification cache configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        The configured cache, or None when caching is disabled
+    """
+    backend = settings.cache_backend.lower()
+    if backend == "none":
+        return None
+    if backend == "memory" and settings.workers > 1:
+        # A per-process cache would miss whatever the other workers classified
+        logger.info("Multiple workers configured, using the shared sqlite cache")
+        backend = "sqlite"
+    if backend == "memory":
+        return MemoryCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteCache(
+            settings.cache_sqlite_path,
+            settings.cache_max_entries,
+            settings.cache_ttl_seconds
+        )
+
+    logger.warning("Unknown cache backend: %s, caching disabled", settings.cache_backend)
+    return None
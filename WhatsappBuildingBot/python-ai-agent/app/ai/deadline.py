@@ -0,0 +1,73 @@
+"""
+Request deadlines for LLM calls.
+
+A deadline is a time.monotonic() timestamp by which the caller needs an
+answer, taken from the client's timeout (or the server default) when the
+request arrives. Each LLM call gets only the time that is left, so a slow
+Gemini call is cancelled once the gateway has given up on it instead of
+holding a concurrency slot.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline passes before the LLM answers."""
+
+
+def deadline_after(timeout_seconds: float) -> float:
+    """
+    Get the deadline for a timeout starting now.
+
+    Args:
+        timeout_seconds: Seconds the caller is willing to wait
+
+    Returns:
+        Deadline as a time.monotonic() timestamp
+    """
+    return time.monotonic() + timeout_seconds
+
+
+def remaining(deadline: float) -> float:
+    """
+    Seconds left until a deadline.
+
+    Raises:
+        DeadlineExceededError: If the deadline has already passed
+    """
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceededError("Request deadline passed")
+    return left
+
+
+async def within(deadline: float, awaitable: Awaitable[T]) -> T:
+    """
+    Await something, cancelling it when the deadline passes.
+
+    Args:
+        deadline: Deadline from deadline_after
+        awaitable: The call to bound
+
+    Returns:
+        Its result
+
+    Raises:
+        DeadlineExceededError: If the deadline passed first
+    """
+    try:
+        timeout = remaining(deadline)
+    except DeadlineExceededError:
+        # Close an unstarted coroutine so it does not warn about never being awaited
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError(f"Request deadline passed after {timeout:.2f}s") from None
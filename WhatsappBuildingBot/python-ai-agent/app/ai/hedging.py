@@ -0,0 +1,145 @@
+"""
+Hedged LLM calls for tail-latency control.
+
+A few very slow Gemini calls make up the p99. When a call has not answered
+by the recently observed p95, a second identical call is sent and
+whichever answers first is kept; the other is cancelled. Hedges are paid
+for from a budget that earns a fraction of a hedge per call, so they can
+add at most that fraction to quota usage, however slow Gemini gets.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from app.config import Settings
+from app.metrics import HEDGED_CALLS
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latencies kept for the percentile estimate
+LATENCY_WINDOW = 200
+
+# Unused budget is capped, so a quiet period cannot fund a burst of hedges
+MAX_HEDGE_CREDITS = 5.0
+
+
+class HedgePolicy:
+    """
+    Tracks recent call latency and the hedge budget.
+    """
+
+    def __init__(self, percentile: float, budget_ratio: float, min_samples: int):
+        """
+        Initialize the policy.
+
+        Args:
+            percentile: Latency percentile after which a hedge is sent, e.g. 0.95
+            budget_ratio: Hedges allowed per call, e.g. 0.05 for at most 5% more calls
+            min_samples: Calls observed before hedging starts
+        """
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._credits = 0.0
+
+    def hedge_delay(self) -> float | None:
+        """
+        Get how long to wait before hedging a call.
+
+        Returns:
+            Seconds, or None while too few calls have been observed
+        """
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)]
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a call as seen by the caller."""
+        self._latencies.append(seconds)
+
+    def earn(self) -> None:
+        """Add one call's share of hedge budget."""
+        self._credits = min(MAX_HEDGE_CREDITS, self._credits + self.budget_ratio)
+
+    def try_spend(self) -> bool:
+        """Take budget for one hedge if there is enough."""
+        if self._credits < 1:
+            return False
+        self._credits -= 1
+        return True
+
+
+async def hedged(call: Callable[[], Awaitable[T]], policy: HedgePolicy) -> T:
+    """
+    Run a call, sending a backup copy if it is slower than the policy allows.
+
+    Cancelling the caller cancels every copy still running.
+
+    Args:
+        call: Factory for the call, invoked once per copy
+        policy: Latency and budget tracker
+
+    Returns:
+        The result of the first copy to succeed
+
+    Raises:
+        Exception: The first copy's error when no copy succeeds
+    """
+    start = time.monotonic()
+    policy.earn()
+    delay = policy.hedge_delay()
+    tasks = [asyncio.ensure_future(call())]
+
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                if policy.try_spend():
+                    logger.info("LLM call slower than %.2fs, sending a hedge", delay)
+                    HEDGED_CALLS.labels(outcome="sent").inc()
+                    tasks.append(asyncio.ensure_future(call()))
+                else:
+                    HEDGED_CALLS.labels(outcome="no_budget").inc()
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        HEDGED_CALLS.labels(outcome="won").inc()
+                    policy.observe(time.monotonic() - start)
+                    return task.result()
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def create_hedge_policy(settings: Settings) -> HedgePolicy | None:
+    """
+    Create the hedge policy configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        HedgePolicy, or None when hedging is disabled
+    """
+    if not settings.llm_hedging_enabled:
+        return None
+    return HedgePolicy(
+        percentile=settings.llm_hedge_percentile,
+        budget_ratio=settings.llm_hedge_budget_ratio,
+        min_samples=settings.llm_hedge_min_samples
+    )
@@ -0,0 +1,344 @@
+"""
+Per-building index of open incidents, for merging duplicate reports.
+
+One broken elevator brings a dozen messages from a dozen residents, each
+worded a little differently. Each building keeps the incidents reported
+in the last few hours, with MinHash signatures of character 3-grams of
+their reports. A new message whose text is close to an open incident is
+answered with that incident's classification without calling the LLM. A
+classified message with the same ticket type and location as an open
+incident, and similar text, is attached to it. Either way the response
+carries the incident ID and duplicate=true, so the gateway can skip the
+new Sheets row and professional notification.
+
+Reports naming different numbers (floor 7 vs 8, apartment 21 vs 28) are
+never merged, and neither are classifications with "אחר" as ticket type
+or location, which say nothing about the problem being the same.
+"""
+
+import hashlib
+import operator
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.ai.cache import normalize_message
+from app.config import Settings, get_settings
+from app.metrics import INCIDENT_REPORTS
+from app.schemas import AnalyzeResponse, IncidentStats, ModelMetadata
+
+
+MODEL_NAME = "incident"
+
+SHINGLE_SIZE = 3
+NUM_HASHES = 64
+
+# Texts with fewer 3-grams than this ("דחוף!", "תמונה") are too generic to
+# match on text alone
+MIN_SHINGLES = 5
+
+# Report signatures kept per incident for matching
+MAX_SIGNATURES = 8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _hash_params() -> list[tuple[int, int]]:
+    """Fixed (a, b) pairs of the hash family h(x) = (a * x + b) mod p."""
+    params = []
+    for i in range(NUM_HASHES):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_HASH_PARAMS = _hash_params()
+
+
+def shingles(message_text: str) -> set[str]:
+    """
+    Get the character 3-grams of a normalized message.
+
+    Args:
+        message_text: Raw message text
+
+    Returns:
+        Set of 3-grams; a text shorter than that is a single shingle
+    """
+    text = normalize_message(message_text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(grams: set[str]) -> tuple[int, ...]:
+    """
+    Compute the MinHash signature of a set of shingles.
+
+    Args:
+        grams: Shingles from shingles()
+
+    Returns:
+        NUM_HASHES minimum hash values; the share of equal positions
+        between two signatures estimates the Jaccard similarity
+    """
+    values = [
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        for gram in grams
+    ]
+    return tuple(
+        min((a * value + b) % _MERSENNE_PRIME for value in values)
+        for a, b in _HASH_PARAMS
+    )
+
+
+def similarity(first: tuple[int, ...], second: tuple[int, ...]) -> float:
+    """Estimate the Jaccard similarity of two MinHash signatures."""
+    return sum(map(operator.eq, first, second)) / NUM_HASHES
+
+
+def numbers(message_text: str) -> frozenset[str]:
+    """Get the numbers in a message, e.g. floors and apartments."""
+    return frozenset(number.lstrip("0") or "0" for number in _NUMBER_RE.findall(message_text))
+
+
+@dataclass
+class Incident:
+    """An open incident: the first report's classification and later reports."""
+    incident_id: str
+    response: AnalyzeResponse
+    opened_at: float
+    last_seen: float
+    reports: int = 1
+    signatures: list[tuple[int, ...]] = field(default_factory=list)
+    numbers: frozenset[str] = frozenset()
+
+    def same_place(self, message_numbers: frozenset[str]) -> bool:
+        """Whether a message names no numbers that contradict the incident's."""
+        return not message_numbers or not self.numbers or message_numbers == self.numbers
+
+    def best_similarity(self, signature: tuple[int, ...]) -> float:
+        """Highest estimated similarity to any report kept for the incident."""
+        return max((similarity(signature, kept) for kept in self.signatures), default=0.0)
+
+    def add_report(self, signature: tuple[int, ...] | None, now: float) -> None:
+        """Count one more report of the incident."""
+        self.reports += 1
+        self.last_seen = now
+        if signature is not None and len(self.signatures) < MAX_SIGNATURES:
+            self.signatures.append(signature)
+
+
+class IncidentIndex:
+    """
+    Open incidents per building, each closed a time window after its last report.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int,
+        text_similarity: float,
+        related_similarity: float,
+        max_per_building: int
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            window_seconds: Seconds after its last report that an incident
+                stays open
+            text_similarity: Estimated Jaccard similarity at which a message
+                is a duplicate on text alone, skipping the LLM
+            related_similarity: Similarity a classified message needs to an
+                incident with the same ticket type and location
+            max_per_building: Open incidents kept per building; the least
+                recently reported are closed first
+        """
+        self.window_seconds = window_seconds
+        self.text_similarity = text_similarity
+        self.related_similarity = related_similarity
+        self.max_per_building = max_per_building
+        self.duplicates = 0
+        self.skipped_llm = 0
+        self._buildings: dict[str, OrderedDict[str, Incident]] = {}
+
+    def match(self, building_id: str, message_text: str) -> AnalyzeResponse | None:
+        """
+        Answer a message from an open incident whose reports read the same.
+
+        Args:
+            building_id: Building the message came from
+            message_text: Raw message text
+
+        Returns:
+            The incident's classification marked as a duplicate, or None
+        """
+        signature = self._signature(message_text)
+        if signature is None:
+            return None
+
+        start_time = time.time()
+        message_numbers = numbers(message_text)
+        best, best_similarity = None, self.text_similarity
+        for incident in self._open_incidents(building_id, start_time).values():
+            if not incident.same_place(message_numbers):
+                continue
+            score = incident.best_similarity(signature)
+            if score >= best_similarity:
+                best, best_similarity = incident, score
+        if best is None:
+            return None
+
+        self._attach(building_id, best, signature, start_time)
+        self.skipped_llm += 1
+        INCIDENT_REPORTS.labels(outcome="skipped_llm").inc()
+        return best.response.model_copy(update={
+            "original_text": message_text,
+            "incident_id": best.incident_id,
+            "duplicate": True,
+            "model_metadata": ModelMetadata(
+                model=MODEL_NAME,
+                latency_ms=int((time.time() - start_time) * 1000)
+            )
+        })
+
+    def assign(self, building_id: str, message_text: str, response: AnalyzeResponse) -> AnalyzeResponse:
+        """
+        Attach a classified message to a matching open incident, or open one.
+
+        Fallback classifications (zero confidence) and classifications with
+        "אחר" as ticket type or location are returned unchanged.
+
+        Args:
+            building_id: Building the message came from
+            message_text: Raw message text
+            response: Classification from the fast path or the LLM
+
+        Returns:
+            The response with incident_id set, and duplicate=true if an
+            open incident matched
+        """
+        if response.confidence <= 0 or "אחר" in (response.ticket_type, response.location):
+            return response
+
+        now = time.time()
+        signature = self._signature(message_text)
+        message_numbers = numbers(message_text)
+        incidents = self._open_incidents(building_id, now)
+
+        best, best_similarity = None, self.related_similarity
+        if signature is not None:
+            for incident in incidents.values():
+                if not self._related(incident.response, response) or not incident.same_place(message_numbers):
+                    continue
+                score = incident.best_similarity(signature)
+                if score >= best_similarity:
+                    best, best_similarity = incident, score
+
+        if best is not None:
+            self._attach(building_id, best, signature, now)
+            INCIDENT_REPORTS.labels(outcome="attached").inc()
+            return response.model_copy(update={"incident_id": best.incident_id, "duplicate": True})
+
+        incident = Incident(
+            incident_id=uuid.uuid4().hex[:12],
+            response=response,
+            opened_at=now,
+            last_seen=now,
+            signatures=[signature] if signature is not None else [],
+            numbers=message_numbers
+        )
+        incidents = self._buildings.setdefault(building_id, incidents)
+        incidents[incident.incident_id] = incident
+        while len(incidents) > self.max_per_building:
+            incidents.popitem(last=False)
+        INCIDENT_REPORTS.labels(outcome="opened").inc()
+        return response.model_copy(update={"incident_id": incident.incident_id})
+
+    def stats(self) -> IncidentStats:
+        """Get index statistics."""
+        now = time.time()
+        return IncidentStats(
+            buildings=len(self._buildings),
+            open_incidents=sum(len(self._open_incidents(b, now)) for b in list(self._buildings)),
+            duplicates=self.duplicates,
+            skipped_llm=self.skipped_llm
+        )
+
+    @staticmethod
+    def _related(incident: AnalyzeResponse, response: AnalyzeResponse) -> bool:
+        """Whether two classifications name the same problem and place."""
+        return incident.ticket_type == response.ticket_type and incident.location == response.location
+
+    @staticmethod
+    def _signature(message_text: str) -> tuple[int, ...] | None:
+        """MinHash of a message, or None if it is too short to compare."""
+        grams = shingles(message_text)
+        if len(grams) < MIN_SHINGLES:
+            return None
+        return minhash(grams)
+
+    def _open_incidents(self, building_id: str, now: float) -> OrderedDict[str, Incident]:
+        """
+        A building's incidents, after closing those past the window.
+
+        A building left without incidents is dropped from the index, so
+        building IDs from past requests do not accumulate.
+        """
+        incidents = self._buildings.get(building_id)
+        if incidents is None:
+            return OrderedDict()
+        # Ordered by last report, so expired incidents are at the front
+        while incidents and now - next(iter(incidents.values())).last_seen > self.window_seconds:
+            incidents.popitem(last=False)
+        if not incidents:
+            del self._buildings[building_id]
+        return incidents
+
+    def _attach(
+        self,
+        building_id: str,
+        incident: Incident,
+        signature: tuple[int, ...] | None,
+        now: float
+    ) -> None:
+        """Add a report to an incident and mark it most recently reported."""
+        incident.add_report(signature, now)
+        self._buildings[building_id].move_to_end(incident.incident_id)
+        self.duplicates += 1
+
+
+def create_incident_index(settings: Settings) -> IncidentIndex:
+    """
+    Create the incident index configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Configured IncidentIndex
+    """
+    return IncidentIndex(
+        window_seconds=settings.incident_window_seconds,
+        text_similarity=settings.incident_text_similarity,
+        related_similarity=settings.incident_related_similarity,
+        max_per_building=settings.incident_max_per_building
+    )
+
+
+# Singleton instance
+_incident_index: IncidentIndex | None = None
+
+
+def get_incident_index() -> IncidentIndex:
+    """Get or create the incident index singleton."""
+    global _incident_index
+    if _incident_index is None:
+        _incident_index = create_incident_index(get_settings())
+    return _incident_index
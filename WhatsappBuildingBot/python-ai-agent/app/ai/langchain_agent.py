@@ -1,44 +1,168 @@
 """
 LangChain agent for Hebrew building ticket classification using Google Gemini.
+
+langchain_google_genai takes most of the service's import time, so it is
+only imported when the first Gemini client is created (or ahead of time
+by load_llm_modules during a background warm-up).
 """
 
+import asyncio
 import json
+import re
 import time
 import logging
-from typing import Any
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, AsyncIterator
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from app.config import get_settings, TICKET_TYPES, LOCATIONS
-from app.ai.prompt_templates import get_classification_prompt, SYSTEM_PROMPT
+from app.ai.cache import create_cache, make_cache_key
+from app.ai.deadline import DeadlineExceededError, deadline_after, within
+from app.ai.hedging import create_hedge_policy, hedged
+from app.ai.media import MediaItem
+from app.ai.model_router import ModelRouter, ModelTier, create_router
+from app.ai.provider_pool import create_provider_pool
+from app.ai.output_schema import (
+    BATCH_CLASSIFICATION_SCHEMA,
+    CLASSIFICATION_SCHEMA,
+    generation_config,
+    repair_json
+)
+from app.ai.rate_limiter import LLMOverloadedError, create_limiter
+from app.ai.prompt_templates import (
+    BATCH_CLASSIFICATION_TEMPLATE,
+    CLASSIFICATION_TEMPLATE,
+    get_batch_classification_prompt,
+    get_classification_prompt,
+    get_media_note,
+)
+from app.metrics import ESCALATIONS, FALLBACKS, PARSE_RESULTS, STAGE_LATENCY
 from app.schemas import AnalyzeResponse, ModelMetadata
 
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
 
 logger = logging.getLogger(__name__)
 
+# Characters of an unparseable LLM response included in the warning
+LOGGED_RESPONSE_CHARS = 200
+
+# Confidence of a well-formed response that does not state one
+DEFAULT_CONFIDENCE = 0.5
+
+# Refresh the provider context cache this many seconds before it expires
+CONTEXT_CACHE_REFRESH_MARGIN = 60
+
+# Fields emitted early while streaming, with their allowed values
+STREAMED_FIELDS = {"ticket_type": TICKET_TYPES, "location": LOCATIONS}
+_STREAMED_FIELD_PATTERNS = {
+    field: re.compile(rf'"{field}"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    for field in STREAMED_FIELDS
+}
+
+
+def response_events(response: AnalyzeResponse) -> list[dict[str, Any]]:
+    """
+    Get the streaming events for an already complete classification.
+    
+    Args:
+        response: A finished classification
+        
+    Returns:
+        One "field" event per streamed field, then the "result" event
+    """
+    events = [
+        {"event": "field", "field": field, "value": getattr(response, field)}
+        for field in STREAMED_FIELDS
+    ]
+    events.append({"event": "result", "data": response.model_dump()})
+    return events
+
 
 class TicketClassifier:
     """
     LangChain-based ticket classifier using Google Gemini.
     """
     
-    def __init__(self):
-        """Initialize the classifier with Gemini model."""
+    def __init__(self, llm: Any | None = None, router: ModelRouter | None = None):
+        """
+        Initialize the classifier with Gemini model.
+        
+        Args:
+            llm: Optional chat model to use instead of Gemini, e.g. a local
+                stand-in for benchmarks (anything with ainvoke/astream);
+                it becomes the only tier
+            router: Optional model tiers to use instead of the configured ones
+        """
         settings = get_settings()
-        self.model_name = "gemini-1.5-flash"
         
-        self.llm = ChatGoogleGenerativeAI(
-            model=self.model_name,
+        # Model clients created below share its connections
+        self.pool = create_provider_pool(settings)
+        self.prewarm_request = settings.llm_prewarm_request
+        
+        if router is None and llm is not None:
+            router = ModelRouter(
+                [ModelTier(name="gemini-1.5-flash", llm=llm)],
+                settings.llm_escalation_confidence
+            )
+        self.router = router or create_router(settings, lambda name: self._create_llm(model_name=name))
+        self.model_name = self.router.primary.name
+        self.llm = self.router.primary.llm
+        
+        self.cache = create_cache(settings)
+        self.limiter = create_limiter(settings)
+        self.overload_behavior = settings.llm_overload_behavior
+        self.structured_output = settings.llm_structured_output
+        self.llm_timeout = settings.llm_timeout_seconds
+        self.hedge = create_hedge_policy(settings)
+        
+        # Provider-side caching of the static prompt prefix, created lazily
+        self.context_cache_enabled = settings.prompt_context_cache_enabled
+        self.context_cache_ttl = settings.prompt_context_cache_ttl_seconds
+        self._context_llm: "ChatGoogleGenerativeAI | None" = None
+        self._context_cache_expires_at = 0.0
+        self._context_cache_lock = asyncio.Lock()
+    
+    def _create_llm(
+        self,
+        cached_content: str | None = None,
+        model_name: str | None = None
+    ) -> "ChatGoogleGenerativeAI":
+        """
+        Create a Gemini chat model client.
+        
+        Args:
+            cached_content: Optional provider context cache name to attach
+            model_name: Model to use, defaults to the first routing tier
+            
+        Returns:
+            Configured ChatGoogleGenerativeAI instance
+        """
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
+        settings = get_settings()
+        llm = ChatGoogleGenerativeAI(
+            model=model_name or self.model_name,
             google_api_key=settings.gemini_api_key,
             temperature=0.1,  # Low temperature for consistent classification
-            convert_system_message_to_human=True
+            convert_system_message_to_human=True,
+            cached_content=cached_content
         )
+        self.pool.attach(llm)
+        return llm
+    
+    async def prewarm(self) -> None:
+        """Open the Gemini connections ahead of the first classification."""
+        await self.pool.prewarm(self.model_name if self.prewarm_request else None)
     
     async def classify(
         self, 
         message_text: str, 
-        building_id: str | None = None
+        building_id: str | None = None,
+        deadline: float | None = None,
+        media: list[MediaItem] | None = None
     ) -> AnalyzeResponse:
         """
         Classify a Hebrew message into a structured ticket.
@@ -46,72 +170,622 @@ class TicketClassifier:
         Args:
             message_text: The raw Hebrew message from the resident
             building_id: Optional building identifier
+            deadline: time.monotonic() by which the caller needs the answer,
+                defaults to the configured LLM timeout from now
+            media: Prepared images sent with the message
             
         Returns:
             AnalyzeResponse with classification results
         """
         start_time = time.time()
         
+        cached = await self._cache_get(self._cache_key(message_text, building_id, media), message_text, start_time)
+        if cached is not None:
+            return cached
+        
+        return await self._classify_uncached(message_text, building_id, start_time, deadline, media)
+    
+    async def _classify_uncached(
+        self,
+        message_text: str,
+        building_id: str | None = None,
+        start_time: float | None = None,
+        deadline: float | None = None,
+        media: list[MediaItem] | None = None
+    ) -> AnalyzeResponse:
+        """
+        Classify a message with the LLM, bypassing the cache lookup.
+        
+        Args:
+            message_text: The raw Hebrew message from the resident
+            building_id: Optional building identifier
+            start_time: When classification started, defaults to now
+            deadline: time.monotonic() by which the caller needs the answer
+            media: Prepared images sent with the message
+            
+        Returns:
+            AnalyzeResponse with classification results
+        """
+        start_time = start_time or time.time()
+        deadline = deadline or deadline_after(self.llm_timeout)
+        
         try:
             # Build messages
-            prompt = get_classification_prompt(message_text, building_id)
-            messages = [
-                SystemMessage(content=SYSTEM_PROMPT),
-                HumanMessage(content=prompt)
-            ]
+            with STAGE_LATENCY.labels(stage="prompt_build").time():
+                llm, messages = await self._classification_request(message_text, building_id, media)
             
-            # Invoke the model
-            response = await self.llm.ainvoke(messages)
+            # Invoke the model, hedging a slow call when enabled
+            response = await self._invoke(messages, llm, deadline=deadline, hedge=True)
             
             # Parse JSON response
             result = self._parse_response(response.content, message_text)
             
+            # Ask stronger tiers when the answer is unsure
+            result, tier = await self._escalate(message_text, building_id, result, deadline=deadline, media=media)
+            
             # Calculate latency
             latency_ms = int((time.time() - start_time) * 1000)
             
-            return AnalyzeResponse(
-                ticket_type=result["ticket_type"],
-                location=result["location"],
-                normalized_summary=result["normalized_summary"],
-                original_text=message_text,
-                language="he",
-                confidence=result["confidence"],
-                model_metadata=ModelMetadata(
-                    model=self.model_name,
-                    latency_ms=latency_ms
-                )
-            )
+            response = self._build_response(result, message_text, latency_ms, tier)
+            await self._cache_set(self._cache_key(message_text, building_id, media), response)
+            return response
+            
+        except LLMOverloadedError:
+            if self.overload_behavior != "fallback":
+                raise
+            logger.warning("LLM queue full, returning fallback classification")
+            return self._fallback_response(message_text, int((time.time() - start_time) * 1000), "overload")
+            
+        except DeadlineExceededError as e:
+            logger.warning("Classification cancelled: %s", e)
+            return self._fallback_response(message_text, int((time.time() - start_time) * 1000), "deadline")
             
         except Exception as e:
-            logger.error(f"Classification error: {e}")
+            logger.error("Classification error: %s", e)
             latency_ms = int((time.time() - start_time) * 1000)
             
             # Return fallback response
-            return AnalyzeResponse(
-                ticket_type="אחר",
-                location="אחר",
-                normalized_summary=message_text[:50] + ("..." if len(message_text) > 50 else ""),
-                original_text=message_text,
-                language="he",
-                confidence=0.0,
-                model_metadata=ModelMetadata(
-                    model=self.model_name,
-                    latency_ms=latency_ms
+            return self._fallback_response(message_text, latency_ms, "llm_error")
+    
+    async def classify_stream(
+        self,
+        message_text: str,
+        building_id: str | None = None,
+        deadline: float | None = None,
+        media: list[MediaItem] | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Classify a message, yielding fields as soon as the model produces them.
+        
+        Yields {"event": "field", "field": ..., "value": ...} for ticket_type
+        and location as they complete in the partial JSON, then
+        {"event": "result", "data": ...} with the full AnalyzeResponse. When
+        the LLM queue is full and overload behavior is "reject", a single
+        {"event": "error", ...} event is yielded instead of the result.
+        
+        Args:
+            message_text: The raw Hebrew message from the resident
+            building_id: Optional building identifier
+            deadline: time.monotonic() by which the caller needs the answer
+            media: Prepared images sent with the message
+            
+        Yields:
+            Streaming event dictionaries
+        """
+        start_time = time.time()
+        deadline = deadline or deadline_after(self.llm_timeout)
+        
+        cached = await self._cache_get(self._cache_key(message_text, building_id, media), message_text, start_time)
+        if cached is not None:
+            for event in response_events(cached):
+                yield event
+            return
+        
+        emitted: dict[str, str] = {}
+        content = ""
+        
+        try:
+            with STAGE_LATENCY.labels(stage="prompt_build").time():
+                llm, messages = await self._classification_request(message_text, building_id, media)
+            
+            with STAGE_LATENCY.labels(stage="queue_wait").time():
+                await within(deadline, self.limiter.acquire())
+            
+            stream = None
+            try:
+                self.pool.start()
+                stream = llm.astream(messages, **self._output_kwargs(CLASSIFICATION_SCHEMA))
+                with STAGE_LATENCY.labels(stage="llm_call").time():
+                    while True:
+                        try:
+                            chunk = await within(deadline, anext(stream))
+                        except StopAsyncIteration:
+                            break
+                        content += chunk.content
+                        for field, value in self._scan_partial_fields(content, emitted):
+                            yield {"event": "field", "field": field, "value": value}
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                await self.limiter.record(e)
+                raise
+            else:
+                await self.limiter.record(None)
+            finally:
+                self.limiter.release()
+                if stream is not None:
+                    await stream.aclose()
+            
+            result = self._parse_response(content, message_text)
+            result, tier = await self._escalate(message_text, building_id, result, deadline=deadline, media=media)
+            latency_ms = int((time.time() - start_time) * 1000)
+            response = self._build_response(result, message_text, latency_ms, tier)
+            await self._cache_set(self._cache_key(message_text, building_id, media), response)
+            
+        except LLMOverloadedError as e:
+            if self.overload_behavior != "fallback":
+                # Headers are already sent, so report the overload in-band
+                yield {"event": "error", "detail": str(e), "retry_after": e.retry_after}
+                return
+            logger.warning("LLM queue full, returning fallback classification")
+            response = self._fallback_response(message_text, int((time.time() - start_time) * 1000), "overload")
+            
+        except DeadlineExceededError as e:
+            logger.warning("Streaming classification cancelled: %s", e)
+            response = self._fallback_response(message_text, int((time.time() - start_time) * 1000), "deadline")
+            
+        except Exception as e:
+            logger.error("Streaming classification error: %s", e)
+            response = self._fallback_response(message_text, int((time.time() - start_time) * 1000), "llm_error")
+        
+        # Fields the partial JSON never completed, or that an escalated tier
+        # changed, are sent before the result
+        for field in STREAMED_FIELDS:
+            if emitted.get(field) != getattr(response, field):
+                yield {"event": "field", "field": field, "value": getattr(response, field)}
+        yield {"event": "result", "data": response.model_dump()}
+    
+    @staticmethod
+    def _scan_partial_fields(content: str, emitted: dict[str, str]) -> list[tuple[str, str]]:
+        """
+        Find streamed fields that became complete in the partial JSON.
+        
+        Args:
+            content: Model output received so far
+            emitted: Fields already emitted, updated in place
+            
+        Returns:
+            Newly completed (field, validated value) pairs
+        """
+        found = []
+        for field, pattern in _STREAMED_FIELD_PATTERNS.items():
+            if field in emitted:
+                continue
+            match = pattern.search(content)
+            if match is None:
+                continue
+            try:
+                value = json.loads(f'"{match.group(1)}"')
+            except json.JSONDecodeError:
+                value = match.group(1)
+            if value not in STREAMED_FIELDS[field]:
+                value = "אחר"
+            emitted[field] = value
+            found.append((field, value))
+        return found
+    
+    async def classify_batch(
+        self,
+        items: list[tuple[str, str | None]],
+        deadline: float | None = None
+    ) -> list[AnalyzeResponse]:
+        """
+        Classify many messages, packing each chunk into a single LLM call.
+        
+        Args:
+            items: (message_text, building_id) pairs to classify
+            deadline: time.monotonic() by which the caller needs the answers
+            
+        Returns:
+            AnalyzeResponse list in the same order as items
+        """
+        start_time = time.time()
+        deadline = deadline or deadline_after(self.llm_timeout)
+        responses: list[AnalyzeResponse | None] = [
+            await self._cache_get(make_cache_key(message_text, building_id), message_text, start_time)
+            for message_text, building_id in items
+        ]
+        
+        # Only cache misses go to the model
+        pending = [i for i, response in enumerate(responses) if response is None]
+        chunk_size = max(1, get_settings().batch_chunk_size)
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        
+        chunk_results = await asyncio.gather(
+            *(self._classify_chunk([items[i] for i in chunk], deadline) for chunk in chunks)
+        )
+        for chunk, results in zip(chunks, chunk_results):
+            for i, response in zip(chunk, results):
+                responses[i] = response
+        
+        return responses
+    
+    async def _classify_chunk(
+        self,
+        chunk: list[tuple[str, str | None]],
+        deadline: float
+    ) -> list[AnalyzeResponse]:
+        """
+        Classify one chunk of messages with a single LLM call.
+        
+        Entries the model drops or returns malformed are re-classified
+        individually, so one bad entry does not fail the whole chunk.
+        
+        Args:
+            chunk: (message_text, building_id) pairs to classify
+            deadline: time.monotonic() by which the caller needs the answers
+            
+        Returns:
+            AnalyzeResponse list in the same order as chunk
+        """
+        if len(chunk) == 1:
+            return [await self._classify_uncached(*chunk[0], deadline=deadline)]
+        
+        start_time = time.time()
+        message_texts = [message_text for message_text, _ in chunk]
+        
+        try:
+            prompt = get_batch_classification_prompt(message_texts)
+            messages = [
+                SystemMessage(content=BATCH_CLASSIFICATION_TEMPLATE.system),
+                HumanMessage(content=prompt)
+            ]
+            response = await self._invoke(messages, schema=BATCH_CLASSIFICATION_SCHEMA, deadline=deadline)
+            results = self._parse_batch_response(response.content, message_texts)
+        except LLMOverloadedError:
+            if self.overload_behavior != "fallback":
+                raise
+            logger.warning("LLM queue full, returning fallback classifications")
+            latency_ms = int((time.time() - start_time) * 1000)
+            return [self._fallback_response(text, latency_ms, "overload") for text in message_texts]
+        except DeadlineExceededError as e:
+            logger.warning("Batch classification cancelled: %s", e)
+            latency_ms = int((time.time() - start_time) * 1000)
+            return [self._fallback_response(text, latency_ms, "deadline") for text in message_texts]
+        except Exception as e:
+            logger.error("Batch classification error: %s", e)
+            latency_ms = int((time.time() - start_time) * 1000)
+            return [self._fallback_response(text, latency_ms, "llm_error") for text in message_texts]
+        
+        # Unsure entries are escalated one by one to the stronger tiers
+        tiers = [0] * len(chunk)
+        unsure = [
+            i for i, result in enumerate(results)
+            if result is not None and self.router.should_escalate(result)
+        ]
+        if unsure:
+            escalated = await asyncio.gather(
+                *(self._escalate(*chunk[i], results[i], deadline=deadline) for i in unsure)
+            )
+            for i, (result, tier) in zip(unsure, escalated):
+                results[i], tiers[i] = result, tier
+        
+        # Latency is shared across the chunk, report the per-message share
+        latency_ms = int((time.time() - start_time) * 1000 / len(chunk))
+        
+        responses: list[AnalyzeResponse | None] = [None] * len(chunk)
+        for i, result in enumerate(results):
+            if result is not None:
+                responses[i] = self._build_response(result, message_texts[i], latency_ms, tiers[i])
+                await self._cache_set(make_cache_key(*chunk[i]), responses[i])
+        
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            logger.warning(
+                "Batch response missing %d of %d entries, retrying individually", len(missing), len(chunk)
+            )
+            retried = await asyncio.gather(
+                *(self._classify_uncached(*chunk[i], deadline=deadline) for i in missing)
+            )
+            for i, response in zip(missing, retried):
+                responses[i] = response
+        
+        return responses
+    
+    async def _classification_request(
+        self,
+        message_text: str,
+        building_id: str | None = None,
+        media: list[MediaItem] | None = None
+    ) -> tuple["ChatGoogleGenerativeAI", list]:
+        """
+        Pick the model client and messages for a single classification.
+        
+        With provider context caching active, only the message itself is
+        sent and the static prefix is served from the provider cache.
+        
+        Args:
+            message_text: The raw Hebrew message from the resident
+            building_id: Optional building identifier
+            media: Prepared images sent with the message
+            
+        Returns:
+            (model client, chat messages) to invoke
+        """
+        if self.context_cache_enabled:
+            if time.time() > self._context_cache_expires_at - CONTEXT_CACHE_REFRESH_MARGIN:
+                async with self._context_cache_lock:
+                    if time.time() > self._context_cache_expires_at - CONTEXT_CACHE_REFRESH_MARGIN:
+                        await asyncio.to_thread(self._refresh_context_cache)
+            
+            if self._context_llm is not None:
+                tail = CLASSIFICATION_TEMPLATE.render_dynamic(message_text=message_text)
+                return self._context_llm, [self._human_message(tail, media)]
+        
+        return self.llm, self._classification_messages(message_text, building_id, media)
+    
+    @classmethod
+    def _classification_messages(
+        cls,
+        message_text: str,
+        building_id: str | None = None,
+        media: list[MediaItem] | None = None
+    ) -> list:
+        """Build the full chat messages for a single classification."""
+        return [
+            SystemMessage(content=CLASSIFICATION_TEMPLATE.system),
+            cls._human_message(get_classification_prompt(message_text, building_id), media)
+        ]
+    
+    @staticmethod
+    def _human_message(prompt: str, media: list[MediaItem] | None = None) -> HumanMessage:
+        """Build the user turn: the prompt text, followed by any images."""
+        if not media:
+            return HumanMessage(content=prompt)
+        return HumanMessage(content=[
+            {"type": "text", "text": f"{prompt}\n\n{get_media_note(len(media))}"},
+            *(item.to_message_part() for item in media)
+        ])
+    
+    def _cache_key(
+        self,
+        message_text: str,
+        building_id: str | None = None,
+        media: list[MediaItem] | None = None
+    ) -> str:
+        """Cache key for a message, including the content of its images."""
+        return make_cache_key(message_text, building_id, [item.sha256 for item in media or []])
+    
+    async def _escalate(
+        self,
+        message_text: str,
+        building_id: str | None,
+        result: dict[str, Any],
+        tier: int = 0,
+        deadline: float | None = None,
+        media: list[MediaItem] | None = None
+    ) -> tuple[dict[str, Any], int]:
+        """
+        Re-classify an unsure answer with stronger tiers until one is sure.
+        
+        If a stronger tier fails (error, overload, deadline, unparseable
+        output), the answer already obtained is kept rather than replaced
+        by a fallback.
+        
+        Args:
+            message_text: The raw Hebrew message from the resident
+            building_id: Optional building identifier
+            result: Validated classification from the current tier
+            tier: Index of the tier that produced result
+            deadline: time.monotonic() by which the caller needs the answer
+            media: Prepared images sent with the message
+            
+        Returns:
+            (final validated classification, index of the tier that gave it)
+        """
+        while self.router.should_escalate(result):
+            next_tier = self.router.next_tier(tier)
+            if next_tier is None:
+                break
+            model = self.router.tiers[next_tier]
+            ESCALATIONS.labels(model=model.name).inc()
+            logger.info(
+                "Escalating to %s: type=%s, confidence=%s", model.name, result["ticket_type"], result["confidence"]
+            )
+            try:
+                response = await self._invoke(
+                    self._classification_messages(message_text, building_id, media),
+                    model.llm,
+                    deadline=deadline
                 )
+            except Exception as e:
+                logger.warning("Escalation to %s failed, keeping tier %s answer: %s", model.name, tier, e)
+                break
+            escalated = self._parse_classification(response.content, message_text)
+            if escalated is None:
+                logger.warning(
+                    "Escalation to %s returned unparseable output, keeping tier %d answer", model.name, tier
+                )
+                break
+            result, tier = escalated, next_tier
+        return result, tier
+    
+    def _refresh_context_cache(self) -> None:
+        """
+        Upload the static prompt prefix to Gemini's context cache.
+        
+        Gemini only caches prefixes above a minimum token count, so this
+        can fail for short prompts; full prompts are sent in that case and
+        the upload is retried after the TTL.
+        """
+        settings = get_settings()
+        self._context_cache_expires_at = time.time() + self.context_cache_ttl
+        
+        try:
+            import google.generativeai as genai
+            from google.generativeai import caching
+            
+            genai.configure(api_key=settings.gemini_api_key)
+            cached = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                display_name="ticket-classification-prefix",
+                system_instruction=CLASSIFICATION_TEMPLATE.system,
+                contents=[CLASSIFICATION_TEMPLATE.static_prefix],
+                ttl=timedelta(seconds=self.context_cache_ttl)
             )
+        except Exception as e:
+            logger.warning("Provider context caching unavailable, sending full prompts: %s", e)
+            self._context_llm = None
+            return
+        
+        logger.info("Created provider context cache %s", cached.name)
+        self._context_llm = self._create_llm(cached_content=cached.name)
     
-    def _parse_response(self, content: str, original_text: str) -> dict[str, Any]:
+    def _output_kwargs(self, schema: dict[str, Any]) -> dict[str, Any]:
+        """Call arguments constraining the response to a schema, if enabled."""
+        if not self.structured_output:
+            return {}
+        return {"generation_config": generation_config(schema)}
+    
+    async def _invoke(
+        self,
+        messages: list,
+        llm: "ChatGoogleGenerativeAI | None" = None,
+        schema: dict[str, Any] = CLASSIFICATION_SCHEMA,
+        deadline: float | None = None,
+        hedge: bool = False
+    ) -> Any:
         """
-        Parse the LLM response and validate the classification.
+        Call the model within the concurrency and rate limits and a deadline.
         
         Args:
-            content: Raw LLM response content
-            original_text: Original message for fallback
+            messages: Chat messages to send
+            llm: Model client to use, defaults to self.llm
+            schema: Response schema used when structured output is enabled
+            deadline: time.monotonic() after which the call is cancelled,
+                defaults to the configured LLM timeout from now
+            hedge: Send a backup call if this one is slow (single-message
+                calls to the first tier, whose latency the policy tracks)
             
         Returns:
-            Parsed dictionary with classification fields
+            The model response
+            
+        Raises:
+            LLMOverloadedError: When too many calls are already waiting
+            DeadlineExceededError: When the deadline passes first
+        """
+        deadline = deadline or deadline_after(self.llm_timeout)
+        
+        def call():
+            return self._invoke_once(messages, llm, schema)
+        
+        if hedge and self.hedge is not None:
+            return await within(deadline, hedged(call, self.hedge))
+        return await within(deadline, call())
+    
+    async def _invoke_once(
+        self,
+        messages: list,
+        llm: "ChatGoogleGenerativeAI | None",
+        schema: dict[str, Any]
+    ) -> Any:
+        """Make one model call, waiting for a limiter slot first."""
+        self.pool.start()
+        with STAGE_LATENCY.labels(stage="queue_wait").time():
+            await self.limiter.acquire()
+        
+        try:
+            with STAGE_LATENCY.labels(stage="llm_call").time():
+                response = await (llm or self.llm).ainvoke(messages, **self._output_kwargs(schema))
+        except Exception as e:
+            await self.limiter.record(e)
+            raise
+        finally:
+            self.limiter.release()
+        
+        await self.limiter.record(None)
+        return response
+    
+    def _build_response(
+        self,
+        result: dict[str, Any],
+        message_text: str,
+        latency_ms: int,
+        tier: int = 0
+    ) -> AnalyzeResponse:
+        """Build an AnalyzeResponse from a validated classification dict."""
+        return AnalyzeResponse(
+            ticket_type=result["ticket_type"],
+            location=result["location"],
+            normalized_summary=result["normalized_summary"],
+            original_text=message_text,
+            language="he",
+            confidence=result["confidence"],
+            model_metadata=ModelMetadata(
+                model=self.router.tiers[tier].name,
+                latency_ms=latency_ms,
+                tier=tier
+            )
+        )
+    
+    async def _cache_get(
+        self,
+        cache_key: str,
+        message_text: str,
+        start_time: float
+    ) -> AnalyzeResponse | None:
+        """
+        Look up a cached classification for this message.
+        
+        Args:
+            cache_key: Key from make_cache_key
+            message_text: The message being classified
+            start_time: When classification started, for latency reporting
+            
+        Returns:
+            The cached response re-targeted at this message, or None on a miss
         """
-        # Clean up potential markdown code blocks
+        if self.cache is None:
+            return None
+        
+        cached = await self.cache.aget(cache_key)
+        if cached is None:
+            return None
+        
+        latency_ms = int((time.time() - start_time) * 1000)
+        return cached.model_copy(update={
+            "original_text": message_text,
+            "model_metadata": cached.model_metadata.model_copy(update={
+                "latency_ms": latency_ms,
+                "cache_hit": True,
+                "cached_latency_ms": cached.model_metadata.latency_ms
+            })
+        })
+    
+    async def _cache_set(self, cache_key: str, response: AnalyzeResponse) -> None:
+        """Cache a classification, skipping zero-confidence fallbacks."""
+        if self.cache is not None and response.confidence > 0:
+            await self.cache.aset(cache_key, response)
+    
+    def _fallback_response(self, message_text: str, latency_ms: int, reason: str) -> AnalyzeResponse:
+        """Build the fallback response used when classification fails."""
+        FALLBACKS.labels(reason=reason).inc()
+        return AnalyzeResponse(
+            ticket_type="אחר",
+            location="אחר",
+            normalized_summary=message_text[:50] + ("..." if len(message_text) > 50 else ""),
+            original_text=message_text,
+            language="he",
+            confidence=0.0,
+            model_metadata=ModelMetadata(
+                model=self.model_name,
+                latency_ms=latency_ms
+            )
+        )
+    
+    @staticmethod
+    def _strip_code_fences(content: str) -> str:
+        """Remove markdown code fences the model may wrap JSON in."""
         cleaned = content.strip()
         if cleaned.startswith("```json"):
             cleaned = cleaned[7:]
@@ -119,35 +793,179 @@ class TicketClassifier:
             cleaned = cleaned[3:]
         if cleaned.endswith("```"):
             cleaned = cleaned[:-3]
-        cleaned = cleaned.strip()
+        return cleaned.strip()
+    
+    @classmethod
+    def _decode(cls, content: str) -> tuple[Any, str]:
+        """
+        Decode a JSON response, repairing it once if it is truncated.
         
-        try:
-            result = json.loads(cleaned)
-        except json.JSONDecodeError:
-            logger.warning(f"Failed to parse LLM response as JSON: {content}")
+        Args:
+            content: Raw LLM response content
+            
+        Returns:
+            (decoded value, "success" or "repaired")
+            
+        Raises:
+            json.JSONDecodeError: If the response cannot be decoded or repaired
+        """
+        with STAGE_LATENCY.labels(stage="parse").time():
+            # Clean up potential markdown code blocks
+            cleaned = cls._strip_code_fences(content)
+            try:
+                return json.loads(cleaned), "success"
+            except json.JSONDecodeError:
+                return repair_json(cleaned), "repaired"
+    
+    def _parse_response(self, content: str, original_text: str) -> dict[str, Any]:
+        """
+        Parse the LLM response and validate the classification.
+        
+        Args:
+            content: Raw LLM response content
+            original_text: Original message for fallback
+            
+        Returns:
+            Parsed dictionary with classification fields, or a zero-confidence
+            "אחר" fallback if the response cannot be decoded
+        """
+        result = self._parse_classification(content, original_text)
+        if result is None:
+            FALLBACKS.labels(reason="parse_error").inc()
             return {
                 "ticket_type": "אחר",
                 "location": "אחר",
                 "normalized_summary": original_text[:50],
                 "confidence": 0.0
             }
+        return result
+    
+    def _parse_classification(self, content: str, original_text: str) -> dict[str, Any] | None:
+        """
+        Parse the LLM response and validate the classification.
+        
+        Args:
+            content: Raw LLM response content
+            original_text: Original message for fallback
+            
+        Returns:
+            Parsed dictionary with classification fields, or None if the
+            response cannot be decoded
+        """
+        try:
+            result, outcome = self._decode(content)
+            if not isinstance(result, dict):
+                raise json.JSONDecodeError("Expected a JSON object", content, 0)
+        except json.JSONDecodeError:
+            logger.warning(
+                "Failed to parse LLM response as JSON (%d chars): %r",
+                len(content), content[:LOGGED_RESPONSE_CHARS]
+            )
+            PARSE_RESULTS.labels(outcome="failure").inc()
+            return None
+        
+        PARSE_RESULTS.labels(outcome=outcome).inc()
+        with STAGE_LATENCY.labels(stage="validation").time():
+            return self._validate_result(result, original_text, repaired=outcome == "repaired")
+    
+    def _parse_batch_response(
+        self,
+        content: str,
+        original_texts: list[str]
+    ) -> list[dict[str, Any] | None]:
+        """
+        Parse a batch LLM response (a JSON array) into per-message results.
+        
+        Results are matched to messages by their echoed index. Unless the
+        indexes are exactly 0..n-1, each once, the whole response is
+        rejected: a skipped or repeated index could put a classification
+        on the wrong message.
         
+        Args:
+            content: Raw LLM response content
+            original_texts: Original messages, in prompt order
+            
+        Returns:
+            One validated dict per message, or None where the entry is
+            malformed or the response was rejected
+        """
+        results: list[dict[str, Any] | None] = [None] * len(original_texts)
+        
+        try:
+            entries, outcome = self._decode(content)
+        except json.JSONDecodeError:
+            logger.warning(
+                "Failed to parse batch LLM response as JSON (%d chars): %r",
+                len(content), content[:LOGGED_RESPONSE_CHARS]
+            )
+            PARSE_RESULTS.labels(outcome="failure").inc()
+            return results
+        
+        if not isinstance(entries, list):
+            logger.warning("Batch LLM response is not a JSON array")
+            PARSE_RESULTS.labels(outcome="failure").inc()
+            return results
+        
+        indexes = [entry.get("index") if isinstance(entry, dict) else None for entry in entries]
+        if (
+            not all(type(index) is int for index in indexes)
+            or sorted(indexes) != list(range(len(original_texts)))
+        ):
+            logger.warning(
+                "Batch LLM response indexes %s do not match %d messages",
+                indexes, len(original_texts)
+            )
+            PARSE_RESULTS.labels(outcome="failure").inc()
+            return results
+        
+        PARSE_RESULTS.labels(outcome=outcome).inc()
+        
+        for index, entry in zip(indexes, entries):
+            if "ticket_type" not in entry:
+                continue
+            with STAGE_LATENCY.labels(stage="validation").time():
+                results[index] = self._validate_result(
+                    entry, original_texts[index], repaired=outcome == "repaired"
+                )
+        
+        return results
+    
+    def _validate_result(
+        self,
+        result: dict[str, Any],
+        original_text: str,
+        repaired: bool = False
+    ) -> dict[str, Any]:
+        """
+        Validate and normalize a decoded classification.
+        
+        Args:
+            result: Decoded JSON object from the LLM
+            original_text: Original message for fallback
+            repaired: Whether the JSON was repaired (e.g. a truncated
+                response); a missing confidence then counts as none, so the
+                result escalates and is not cached
+            
+        Returns:
+            Dictionary with validated classification fields
+        """
         # Validate and normalize ticket_type
         ticket_type = result.get("ticket_type", "אחר")
         if ticket_type not in TICKET_TYPES:
-            logger.warning(f"Unknown ticket_type: {ticket_type}, defaulting to 'אחר'")
+            logger.warning("Unknown ticket_type: %s, defaulting to 'אחר'", ticket_type)
             ticket_type = "אחר"
         
         # Validate and normalize location
         location = result.get("location", "אחר")
         if location not in LOCATIONS:
-            logger.warning(f"Unknown location: {location}, defaulting to 'אחר'")
+            logger.warning("Unknown location: %s, defaulting to 'אחר'", location)
             location = "אחר"
         
         # Validate confidence
-        confidence = result.get("confidence", 0.5)
-        if not isinstance(confidence, (int, float)):
-            confidence = 0.5
+        default_confidence = 0.0 if repaired else DEFAULT_CONFIDENCE
+        confidence = result.get("confidence", default_confidence)
+        if not isinstance(confidence, (int, float)) or isinstance(confidence, bool):
+            confidence = default_confidence
         confidence = max(0.0, min(1.0, float(confidence)))
         
         return {
@@ -168,3 +986,18 @@ def get_classifier() -> TicketClassifier:
     if _classifier is None:
         _classifier = TicketClassifier()
     return _classifier
+
+
+def get_initialized_classifier() -> TicketClassifier | None:
+    """Get the classifier singleton if it exists, without creating it."""
+    return _classifier
+
+
+def load_llm_modules() -> None:
+    """
+    Import the Gemini client modules ahead of the first classification.
+    
+    Safe to run in a worker thread, so the event loop keeps serving
+    /health while the import runs.
+    """
+    import langchain_google_genai  # noqa: F401
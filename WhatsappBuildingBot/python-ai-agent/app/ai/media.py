@@ -0,0 +1,361 @@
+"""
+Media stage: fetches AnalyzeRequest.media_urls for the multimodal prompt.
+
+Residents often send a photo instead of describing the problem. Photos
+are downloaded concurrently (capped per request and across the process),
+with size and time limits, then downscaled and re-encoded as JPEG so a
+full-resolution phone photo does not blow up latency, memory or tokens.
+Prepared images are cached by content hash, and URLs by the hash they
+resolved to, so a photo forwarded to several groups is fetched and
+encoded once.
+
+Media URLs come from callers, so they are only fetched from allow-listed
+hosts (Twilio by default) that resolve to public addresses. Redirects are
+followed by hand: each hop is checked again, and the media host's
+credentials are never sent to another host.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app.ai.deadline import DeadlineExceededError, within
+from app.config import Settings, get_settings
+from app.metrics import MEDIA_FETCHES
+from app.url_policy import host_listed, resolves_to_public, url_allowed
+
+
+logger = logging.getLogger(__name__)
+
+# Images with more pixels than this are rejected before decoding
+MAX_SOURCE_PIXELS = 50_000_000
+
+# URLs remembered for skipping repeated downloads
+MAX_REMEMBERED_URLS = 1000
+
+# Redirects followed per download (Twilio answers with one, to its CDN)
+MAX_REDIRECTS = 3
+
+
+class MediaTooLargeError(Exception):
+    """Raised when an attachment exceeds the configured size limit."""
+
+
+class MediaRejectedError(Exception):
+    """Raised when an attachment URL or redirect points somewhere not allowed."""
+
+
+@dataclass(frozen=True)
+class MediaItem:
+    """An attachment prepared for the prompt."""
+    sha256: str  # Hash of the downloaded bytes
+    mime_type: str
+    data: bytes
+
+    def to_message_part(self) -> dict[str, Any]:
+        """Build the LangChain content part for a multimodal HumanMessage."""
+        encoded = base64.b64encode(self.data).decode("ascii")
+        return {"type": "image_url", "image_url": {"url": f"data:{self.mime_type};base64,{encoded}"}}
+
+
+def prepare_image(data: bytes, max_dimension: int, jpeg_quality: int) -> tuple[bytes, str] | None:
+    """
+    Downscale an image and re-encode it as JPEG.
+
+    CPU-bound; run it in a worker thread.
+
+    Args:
+        data: Downloaded image bytes
+        max_dimension: Longest side of the result, in pixels
+        jpeg_quality: JPEG quality of the result (1-95)
+
+    Returns:
+        (JPEG bytes, "image/jpeg"), or None if data is not a usable image
+    """
+    # Imported here to keep Pillow out of app startup
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                logger.warning("Skipping %sx%s image, too many pixels", image.width, image.height)
+                return None
+            # JPEG can decode at a reduced scale, much faster than a full decode
+            image.draft("RGB", (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((max_dimension, max_dimension))
+
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=jpeg_quality)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        logger.warning("Skipping unreadable image: %s", e)
+        return None
+    return output.getvalue(), "image/jpeg"
+
+
+class MediaCache:
+    """
+    LRU cache of prepared images by content hash, bounded in bytes, plus a
+    map from URL to the hash it last resolved to.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Total size of cached images before LRU eviction
+            ttl_seconds: Seconds an entry stays valid after it is stored
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[str, tuple[MediaItem, float]] = OrderedDict()
+        self._urls: OrderedDict[str, str] = OrderedDict()
+
+    def get(self, sha256: str) -> MediaItem | None:
+        """Get a prepared image by content hash."""
+        entry = self._items.get(sha256)
+        if entry is None or time.time() - entry[1] > self.ttl_seconds:
+            if entry is not None:
+                self._evict(sha256)
+            self.misses += 1
+            return None
+        self._items.move_to_end(sha256)
+        self.hits += 1
+        return entry[0]
+
+    def get_by_url(self, url: str) -> MediaItem | None:
+        """Get the prepared image a URL resolved to before, if still cached."""
+        sha256 = self._urls.get(url)
+        return self.get(sha256) if sha256 is not None else None
+
+    def set(self, url: str, item: MediaItem) -> None:
+        """Store a prepared image and remember the URL it came from."""
+        self._urls[url] = item.sha256
+        self._urls.move_to_end(url)
+        while len(self._urls) > MAX_REMEMBERED_URLS:
+            self._urls.popitem(last=False)
+
+        if item.sha256 in self._items:
+            self._evict(item.sha256)
+        self._items[item.sha256] = (item, time.time())
+        self.size_bytes += len(item.data)
+        while self.size_bytes > self.max_bytes and self._items:
+            self._evict(next(iter(self._items)))
+
+    def _evict(self, sha256: str) -> None:
+        item, _ = self._items.pop(sha256)
+        self.size_bytes -= len(item.data)
+
+
+class MediaFetcher:
+    """
+    Downloads and prepares attachments within per-request and global limits.
+    """
+
+    def __init__(
+        self,
+        max_per_request: int,
+        max_concurrent: int,
+        max_bytes: int,
+        timeout_seconds: float,
+        max_dimension: int,
+        jpeg_quality: int,
+        cache: MediaCache,
+        allowed_hosts: str = "",
+        auth: tuple[str, str] | None = None,
+        allow_private_addresses: bool = False
+    ):
+        """
+        Initialize the fetcher.
+
+        Args:
+            max_per_request: Attachments used per request; the rest are ignored
+            max_concurrent: Downloads running at once across all requests
+            max_bytes: Largest attachment downloaded
+            timeout_seconds: Time limit for one download
+            max_dimension: Longest side of prepared images, in pixels
+            jpeg_quality: JPEG quality of prepared images
+            cache: Cache of prepared images
+            allowed_hosts: Comma-separated hosts media may come from ("*.example.com"
+                for subdomains); empty allows any
+            auth: HTTP basic auth, e.g. Twilio SID and token; only sent to hosts
+                listed in allowed_hosts
+            allow_private_addresses: Also fetch from loopback and private
+                addresses, for local testing
+        """
+        self.max_per_request = max_per_request
+        self.max_bytes = max_bytes
+        self.timeout_seconds = timeout_seconds
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.cache = cache
+        self.allowed_hosts = allowed_hosts
+        self.auth = auth
+        self.allow_private_addresses = allow_private_addresses
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._client: httpx.AsyncClient | None = None
+
+    async def fetch_all(self, urls: list[str], deadline: float | None = None) -> list[MediaItem]:
+        """
+        Fetch and prepare a request's attachments concurrently.
+
+        Attachments that fail (too large, too slow, not an image) are
+        skipped, so the message is still classified from its text.
+
+        Args:
+            urls: Media URLs from the request
+            deadline: time.monotonic() after which downloads are abandoned
+
+        Returns:
+            Prepared images, in request order
+        """
+        unique = list(dict.fromkeys(urls))
+        if len(unique) > self.max_per_request:
+            logger.info("Using %s of %s attachments", self.max_per_request, len(unique))
+            unique = unique[:self.max_per_request]
+
+        items = await asyncio.gather(*(self._fetch_one(url, deadline) for url in unique))
+        return [item for item in items if item is not None]
+
+    async def _fetch_one(self, url: str, deadline: float | None) -> MediaItem | None:
+        """Fetch and prepare one attachment, or None if it cannot be used."""
+        if not url_allowed(url, self.allowed_hosts):
+            logger.warning("Skipping attachment from a host that is not allowed")
+            MEDIA_FETCHES.labels(outcome="rejected").inc()
+            return None
+
+        cached = self.cache.get_by_url(url)
+        if cached is not None:
+            MEDIA_FETCHES.labels(outcome="cache_hit").inc()
+            return cached
+
+        try:
+            async with self._semaphore:
+                download = asyncio.wait_for(self._download(url), self.timeout_seconds)
+                data = await (within(deadline, download) if deadline is not None else download)
+        except MediaTooLargeError as e:
+            logger.warning("Skipping attachment: %s", e)
+            MEDIA_FETCHES.labels(outcome="too_large").inc()
+            return None
+        except MediaRejectedError as e:
+            logger.warning("Skipping attachment: %s", e)
+            MEDIA_FETCHES.labels(outcome="rejected").inc()
+            return None
+        except (httpx.HTTPError, asyncio.TimeoutError, DeadlineExceededError) as e:
+            logger.warning("Failed to fetch attachment: %r", e)
+            MEDIA_FETCHES.labels(outcome="error").inc()
+            return None
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        item = self.cache.get(sha256)
+        if item is None:
+            prepared = await asyncio.to_thread(prepare_image, data, self.max_dimension, self.jpeg_quality)
+            if prepared is None:
+                MEDIA_FETCHES.labels(outcome="unsupported").inc()
+                return None
+            item = MediaItem(sha256=sha256, mime_type=prepared[1], data=prepared[0])
+
+        self.cache.set(url, item)
+        MEDIA_FETCHES.labels(outcome="fetched").inc()
+        return item
+
+    async def _download(self, url: str) -> bytes:
+        """
+        Download an attachment, stopping as soon as it exceeds max_bytes.
+
+        Credentials are only sent to the allow-listed host the URL names,
+        not to hosts it redirects to.
+
+        Raises:
+            MediaTooLargeError: If the attachment is larger than max_bytes
+            MediaRejectedError: If a hop is not http(s), resolves to an
+                internal address, or there are too many redirects
+            httpx.HTTPError: On connection errors and non-2xx responses
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(follow_redirects=False)
+
+        origin = httpx.URL(url).host
+        for _ in range(MAX_REDIRECTS + 1):
+            host = httpx.URL(url).host
+            if not self.allow_private_addresses and not await resolves_to_public(host):
+                raise MediaRejectedError(f"{host} is not a public address")
+            auth = self.auth if host == origin and host_listed(host, self.allowed_hosts) else None
+
+            async with self._client.stream("GET", url, auth=auth) as response:
+                if response.is_redirect:
+                    url = str(response.url.join(response.headers["location"]))
+                    if not url_allowed(url, ""):
+                        raise MediaRejectedError("redirect to a URL that is not http(s)")
+                    continue
+
+                response.raise_for_status()
+                declared = int(response.headers.get("content-length") or 0)
+                if declared > self.max_bytes:
+                    raise MediaTooLargeError(f"{declared} bytes (max {self.max_bytes})")
+
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_bytes:
+                        raise MediaTooLargeError(f"over {self.max_bytes} bytes")
+                    chunks.append(chunk)
+            return b"".join(chunks)
+        raise MediaRejectedError(f"more than {MAX_REDIRECTS} redirects")
+
+    async def close(self) -> None:
+        """Close the HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_media_fetcher(settings: Settings) -> MediaFetcher:
+    """
+    Create the media fetcher configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Configured MediaFetcher
+    """
+    auth = None
+    if settings.media_auth_username:
+        auth = (settings.media_auth_username, settings.media_auth_password)
+    return MediaFetcher(
+        max_per_request=settings.media_max_per_request,
+        max_concurrent=settings.media_max_concurrent_fetches,
+        max_bytes=settings.media_max_bytes,
+        timeout_seconds=settings.media_fetch_timeout_seconds,
+        max_dimension=settings.media_max_dimension,
+        jpeg_quality=settings.media_jpeg_quality,
+        cache=MediaCache(settings.media_cache_max_bytes, settings.media_cache_ttl_seconds),
+        allowed_hosts=settings.media_allowed_hosts,
+        auth=auth
+    )
+
+
+# Singleton instance
+_media_fetcher: MediaFetcher | None = None
+
+
+def get_media_fetcher() -> MediaFetcher:
+    """Get or create the media fetcher singleton."""
+    global _media_fetcher
+    if _media_fetcher is None:
+        _media_fetcher = create_media_fetcher(get_settings())
+    return _media_fetcher
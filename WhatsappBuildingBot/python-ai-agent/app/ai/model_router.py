@@ -0,0 +1,107 @@
+"""
+Tiered model routing for ticket classification.
+
+Most resident messages are easy, so they are sent to the cheapest, fastest
+model first. Only answers that come back unsure (confidence below the
+threshold, or the catch-all "אחר" ticket type, which is also what a failed
+parse falls back to) are escalated to the next, stronger tier.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """One routing tier: a model name and its chat client."""
+    name: str
+    llm: Any
+
+
+class ModelRouter:
+    """
+    Ordered model tiers, cheapest first, plus the escalation policy.
+    """
+
+    def __init__(self, tiers: list[ModelTier], min_confidence: float):
+        """
+        Initialize the router.
+
+        Args:
+            tiers: Model tiers, cheapest first; must not be empty
+            min_confidence: Answers below this confidence are escalated
+        """
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one tier")
+        self.tiers = tiers
+        self.min_confidence = min_confidence
+
+    @property
+    def primary(self) -> ModelTier:
+        """The first (cheapest) tier."""
+        return self.tiers[0]
+
+    def next_tier(self, tier: int) -> int | None:
+        """
+        Get the tier to escalate to from a given tier.
+
+        Args:
+            tier: Index of the tier that answered
+
+        Returns:
+            Index of the next tier, or None when tier is the last one
+        """
+        return tier + 1 if tier + 1 < len(self.tiers) else None
+
+    def should_escalate(self, result: dict[str, Any]) -> bool:
+        """
+        Check whether a validated classification is too unsure to keep.
+
+        Args:
+            result: Validated classification from _validate_result
+
+        Returns:
+            True when a stronger tier should be asked; a confident "אחר"
+            is kept, as many messages really are about something else
+        """
+        # Parse failures have confidence 0, so they escalate too
+        return result["confidence"] < self.min_confidence
+
+
+def parse_model_names(value: str) -> list[str]:
+    """
+    Split a comma-separated model list, cheapest first.
+
+    Args:
+        value: e.g. "gemini-1.5-flash-8b,gemini-1.5-flash"
+
+    Returns:
+        Non-empty model names in order
+    """
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def create_router(settings: Settings, create_llm: Callable[[str], Any]) -> ModelRouter:
+    """
+    Create the router for the models configured in settings.
+
+    Args:
+        settings: Application settings
+        create_llm: Builds the chat client for a model name
+
+    Returns:
+        Configured ModelRouter
+    """
+    names = parse_model_names(settings.llm_models) or ["gemini-1.5-flash"]
+    if len(names) > 1:
+        logger.info("Model tiers: %s", " -> ".join(names))
+    return ModelRouter(
+        [ModelTier(name=name, llm=create_llm(name)) for name in names],
+        settings.llm_escalation_confidence
+    )
@@ -0,0 +1,120 @@
+"""
+Response schemas and JSON repair for classification output.
+
+With structured output enabled, the schemas below are sent to Gemini as
+the response schema, so the model can only produce a JSON object whose
+ticket_type and location are one of the allowed values. Responses that
+still fail to decode (e.g. cut off by the output token limit) get a single
+cheap repair pass before being given up on.
+"""
+
+import json
+from typing import Any
+
+from app.config import LOCATIONS, TICKET_TYPES
+
+
+CLASSIFICATION_FIELDS: dict[str, Any] = {
+    "ticket_type": {"type": "string", "enum": TICKET_TYPES},
+    "location": {"type": "string", "enum": LOCATIONS},
+    "normalized_summary": {"type": "string"},
+    "confidence": {"type": "number"}
+}
+
+CLASSIFICATION_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": CLASSIFICATION_FIELDS,
+    "required": list(CLASSIFICATION_FIELDS)
+}
+
+BATCH_CLASSIFICATION_SCHEMA: dict[str, Any] = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"index": {"type": "integer"}, **CLASSIFICATION_FIELDS},
+        "required": ["index", *CLASSIFICATION_FIELDS]
+    }
+}
+
+# How many trailing members repair_json drops before giving up
+MAX_REPAIR_CUTS = 3
+
+
+def generation_config(schema: dict[str, Any]) -> dict[str, Any]:
+    """
+    Build the Gemini generation config that constrains output to a schema.
+
+    Args:
+        schema: CLASSIFICATION_SCHEMA or BATCH_CLASSIFICATION_SCHEMA
+
+    Returns:
+        Value for the generation_config argument of ainvoke/astream
+    """
+    # Imported here to keep the Gemini SDK out of app startup
+    from google.generativeai.types.generation_types import to_generation_config_dict
+
+    return to_generation_config_dict({"response_mime_type": "application/json", "response_schema": schema})
+
+
+def _close_json(text: str) -> str:
+    """
+    Close the open strings, objects and arrays of a truncated JSON text.
+
+    Text after the end of a complete top-level value is dropped.
+    """
+    closers: list[str] = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+            if not closers:
+                return text[:i + 1]
+
+    if in_string:
+        text += '"'
+    return text.rstrip().rstrip(",") + "".join(reversed(closers))
+
+
+def repair_json(content: str) -> Any:
+    """
+    Decode JSON that is truncated or wrapped in extra text.
+
+    Skips anything before the first object or array, closes whatever the
+    model left open, and if a member was cut mid-way (e.g. a key without
+    its value), drops trailing members one at a time.
+
+    Args:
+        content: Model output that json.loads rejected
+
+    Returns:
+        The decoded value
+
+    Raises:
+        json.JSONDecodeError: If the text cannot be repaired
+    """
+    starts = [i for i in (content.find("{"), content.find("[")) if i >= 0]
+    if not starts:
+        raise json.JSONDecodeError("No JSON object or array found", content, 0)
+    text = content[min(starts):]
+
+    for _ in range(MAX_REPAIR_CUTS + 1):
+        try:
+            return json.loads(_close_json(text))
+        except json.JSONDecodeError as e:
+            error = e
+        cut = text.rfind(",")
+        if cut <= 0:
+            break
+        text = text[:cut]
+    raise error
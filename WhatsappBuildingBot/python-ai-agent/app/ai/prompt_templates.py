@@ -1,25 +1,62 @@
 """
 Prompt templates for Hebrew building ticket classification.
+
+The static part of each prompt (instructions, category lists and output
+format) is built once at import time and always sent first, so that only
+the resident's message changes between calls. A stable prefix is what
+provider-side context caching needs to avoid re-billing those tokens.
 """
 
+import json
+from dataclasses import dataclass
+
 from app.config import TICKET_TYPES, LOCATIONS
 
 
-def get_classification_prompt(message_text: str, building_id: str | None = None) -> str:
-    """
-    Generate the classification prompt for the LLM.
-    
-    Args:
-        message_text: The raw Hebrew message from the resident
-        building_id: Optional building identifier for context
-        
-    Returns:
-        Formatted prompt string for the LLM
-    """
+SYSTEM_PROMPT = """אתה עוזר AI מקצועי למערכת ניהול קריאות שירות בבניין מגורים.
+התפקיד שלך הוא לקרוא הודעות WhatsApp בעברית מדיירים ולסווג אותן לקריאות שירות מובנות.
+אתה מחזיר תמיד תשובות בפורמט JSON בלבד, ללא הסברים נוספים.
+הסיכומים שאתה כותב הם מנומסים, תמציתיים ומקצועיים."""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A prompt split into a static prefix and a small per-call tail."""
+    system: str
+    static_prefix: str
+    dynamic_format: str
+
+    def render_dynamic(self, **fields: str) -> str:
+        """
+        Render only the per-call tail of the prompt.
+
+        Args:
+            **fields: Values for the placeholders in dynamic_format
+
+        Returns:
+            The per-call part of the prompt
+        """
+        return self.dynamic_format.format(**fields)
+
+    def render(self, **fields: str) -> str:
+        """
+        Render the full prompt: the static prefix followed by the tail.
+
+        Args:
+            **fields: Values for the placeholders in dynamic_format
+
+        Returns:
+            Formatted prompt string for the LLM
+        """
+        return f"{self.static_prefix}\n\n{self.render_dynamic(**fields)}"
+
+
+def _build_classification_template() -> PromptTemplate:
+    """Build the single-message classification template."""
     ticket_types_str = ", ".join(TICKET_TYPES)
     locations_str = ", ".join(LOCATIONS)
-    
-    prompt = f"""אתה עוזר AI למערכת קריאות שירות בבניין מגורים.
+
+    static_prefix = f"""אתה עוזר AI למערכת קריאות שירות בבניין מגורים.
 קיבלת הודעת WhatsApp בעברית מדייר בבניין לגבי בעיה בבניין.
 
 המשימות שלך:
@@ -28,9 +65,6 @@ def get_classification_prompt(message_text: str, building_id: str | None = None)
 3. לכתוב סיכום מנומס ותמציתי בעברית המתאים לקריאת שירות (עד 20 מילים)
 4. להעריך את רמת הביטחון שלך בסיווג (מספר בין 0 ל-1)
 
-הודעת הדייר:
-"{message_text}"
-
 החזר תשובה אך ורק בפורמט JSON הבא, ללא טקסט נוסף:
 {{
     "ticket_type": "סוג הקריאה מהרשימה",
@@ -45,10 +79,102 @@ def get_classification_prompt(message_text: str, building_id: str | None = None)
 - הסיכום צריך להיות מנומס ומקצועי
 - אל תציין את שם הדייר בסיכום"""
 
-    return prompt
+    return PromptTemplate(
+        system=SYSTEM_PROMPT,
+        static_prefix=static_prefix,
+        dynamic_format='הודעת הדייר:\n"{message_text}"'
+    )
 
 
-SYSTEM_PROMPT = """אתה עוזר AI מקצועי למערכת ניהול קריאות שירות בבניין מגורים.
-התפקיד שלך הוא לקרוא הודעות WhatsApp בעברית מדיירים ולסווג אותן לקריאות שירות מובנות.
-אתה מחזיר תמיד תשובות בפורמט JSON בלבד, ללא הסברים נוספים.
-הסיכומים שאתה כותב הם מנומסים, תמציתיים ומקצועיים."""
+def _build_batch_classification_template() -> PromptTemplate:
+    """Build the multi-message (batch) classification template."""
+    ticket_types_str = ", ".join(TICKET_TYPES)
+    locations_str = ", ".join(LOCATIONS)
+
+    static_prefix = f"""אתה עוזר AI למערכת קריאות שירות בבניין מגורים.
+קיבלת מספר הודעות WhatsApp בעברית מדיירים בבניין לגבי בעיות בבניין.
+
+עבור כל הודעה בנפרד, המשימות שלך:
+1. לסווג את סוג הבעיה לאחת מהקטגוריות הבאות: [{ticket_types_str}]
+2. לסווג את המיקום לאחד מהמיקומים הבאים: [{locations_str}]
+3. לכתוב סיכום מנומס ותמציתי בעברית המתאים לקריאת שירות (עד 20 מילים)
+4. להעריך את רמת הביטחון שלך בסיווג (מספר בין 0 ל-1)
+
+החזר תשובה אך ורק כמערך JSON, עם אובייקט אחד לכל הודעה, ללא טקסט נוסף:
+[
+    {{
+        "index": 0,
+        "ticket_type": "סוג הקריאה מהרשימה",
+        "location": "המיקום מהרשימה",
+        "normalized_summary": "סיכום מנומס ותמציתי בעברית",
+        "confidence": 0.0
+    }}
+]
+
+חשוב:
+- השדה "index" הוא ערך ה-"index" של ההודעה, כפי שהתקבל, פעם אחת לכל הודעה
+- אם לא ניתן לזהות את סוג הבעיה, השתמש ב"אחר"
+- אם לא ניתן לזהות את המיקום, השתמש ב"אחר"
+- הסיכום צריך להיות מנומס ומקצועי
+- אל תציין את שם הדייר בסיכום"""
+
+    return PromptTemplate(
+        system=SYSTEM_PROMPT,
+        static_prefix=static_prefix,
+        dynamic_format="הודעות הדיירים כמערך JSON, יש להחזיר בדיוק {count} אובייקטים:\n{messages}"
+    )
+
+
+# Built once at import time and reused for every request
+CLASSIFICATION_TEMPLATE = _build_classification_template()
+BATCH_CLASSIFICATION_TEMPLATE = _build_batch_classification_template()
+
+
+def get_classification_prompt(message_text: str, building_id: str | None = None) -> str:
+    """
+    Generate the classification prompt for the LLM.
+
+    Args:
+        message_text: The raw Hebrew message from the resident
+        building_id: Optional building identifier for context
+
+    Returns:
+        Formatted prompt string for the LLM
+    """
+    return CLASSIFICATION_TEMPLATE.render(message_text=message_text)
+
+
+def get_media_note(count: int) -> str:
+    """
+    Generate the line that tells the model about attached photos.
+
+    Appended to the per-call tail, so the static prefix stays cacheable.
+
+    Args:
+        count: Number of images sent with the message
+
+    Returns:
+        Hebrew instruction referring to the images
+    """
+    return (
+        f"הדייר צירף {count} תמונות. השתמש בהן כדי לזהות את סוג הבעיה ואת המיקום, "
+        "במיוחד כאשר הטקסט קצר או לא ברור."
+    )
+
+
+def get_batch_classification_prompt(message_texts: list[str]) -> str:
+    """
+    Generate a prompt that classifies several messages in one LLM call.
+
+    Args:
+        message_texts: Raw Hebrew messages, in the order results are expected
+
+    Returns:
+        Formatted prompt string asking for a JSON array with one entry per message
+    """
+    # JSON-encoded, so quotes and newlines in a message cannot break the list
+    messages_str = "[\n" + ",\n".join(
+        json.dumps({"index": index, "text": message_text}, ensure_ascii=False)
+        for index, message_text in enumerate(message_texts)
+    ) + "\n]"
+    return BATCH_CLASSIFICATION_TEMPLATE.render(count=str(len(message_texts)), messages=messages_str)
@@ -0,0 +1,270 @@
+"""
+Shared, pre-warmed connections to the Gemini API.
+
+Left alone, every ChatGoogleGenerativeAI instance (one per model tier, plus
+the context-cached one) opens its own gRPC channel on its first call, and
+gRPC drops connections after 30 idle minutes, so the first requests after
+a deploy or a quiet night pay for DNS, TCP, TLS and HTTP/2 setup. Here all
+model clients share one async Gemini client whose calls are spread over a
+small pool of HTTP/2 connections, kept alive with pings and connected at
+startup, before /ready reports ready.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Callable
+
+from app.config import Settings
+from app.schemas import ProviderPoolStats
+
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_ENDPOINT = "generativelanguage.googleapis.com"
+
+
+class _PooledMultiCallable:
+    """gRPC multi-callable that sends each call over the least busy channel."""
+
+    def __init__(self, channel: "PooledChannel", callables: list[Callable[..., Any]]):
+        self._channel = channel
+        self._callables = callables
+
+    def __call__(self, *args, **kwargs) -> Any:
+        index = self._channel.acquire()
+        try:
+            call = self._callables[index](*args, **kwargs)
+        except BaseException:
+            self._channel.release(index)
+            raise
+        call.add_done_callback(lambda _: self._channel.release(index))
+        return call
+
+
+class PooledChannel:
+    """
+    Several grpc.aio channels presented to the generated transport as one.
+
+    Each channel holds its own HTTP/2 connection; calls go to the channel
+    with the fewest calls in flight.
+    """
+
+    def __init__(self, channels: list[Any]):
+        """
+        Initialize the pool.
+
+        Args:
+            channels: grpc.aio channels, each with a local subchannel pool
+        """
+        self.channels = channels
+        self.in_flight = [0] * len(channels)
+        self.peak_in_flight = 0
+        self.calls = 0
+
+    def acquire(self) -> int:
+        """Pick the least busy channel and count a call on it."""
+        index = min(range(len(self.channels)), key=self.in_flight.__getitem__)
+        self.in_flight[index] += 1
+        self.calls += 1
+        self.peak_in_flight = max(self.peak_in_flight, sum(self.in_flight))
+        return index
+
+    def release(self, index: int) -> None:
+        """Count a call on a channel as finished."""
+        self.in_flight[index] -= 1
+
+    def unary_unary(self, method: str, *args, **kwargs) -> _PooledMultiCallable:
+        return _PooledMultiCallable(self, [c.unary_unary(method, *args, **kwargs) for c in self.channels])
+
+    def unary_stream(self, method: str, *args, **kwargs) -> _PooledMultiCallable:
+        return _PooledMultiCallable(self, [c.unary_stream(method, *args, **kwargs) for c in self.channels])
+
+    def stream_unary(self, method: str, *args, **kwargs) -> _PooledMultiCallable:
+        return _PooledMultiCallable(self, [c.stream_unary(method, *args, **kwargs) for c in self.channels])
+
+    def stream_stream(self, method: str, *args, **kwargs) -> _PooledMultiCallable:
+        return _PooledMultiCallable(self, [c.stream_stream(method, *args, **kwargs) for c in self.channels])
+
+    async def channel_ready(self) -> None:
+        """Connect every channel and wait until all of them are ready."""
+        await asyncio.gather(*(c.channel_ready() for c in self.channels))
+
+    def states(self) -> list[str]:
+        """Connectivity state of each channel, e.g. READY or IDLE."""
+        return [c.get_state(try_to_connect=False).name for c in self.channels]
+
+    async def close(self) -> None:
+        """Close every channel."""
+        await asyncio.gather(*(c.close() for c in self.channels))
+
+
+class ProviderPool:
+    """
+    One async Gemini client over a pool of kept-alive connections, shared by
+    every model client attached to it.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        size: int,
+        keepalive_seconds: int,
+        keepalive_timeout_seconds: int,
+        idle_timeout_seconds: int,
+        prewarm_timeout_seconds: float
+    ):
+        """
+        Initialize the pool; connections are only opened by start().
+
+        Args:
+            api_key: Gemini API key
+            size: Number of HTTP/2 connections
+            keepalive_seconds: Interval of keepalive pings, also while idle
+            keepalive_timeout_seconds: Seconds to wait for a ping reply
+                before the connection is considered dead
+            idle_timeout_seconds: Seconds without calls before gRPC closes
+                the connections
+            prewarm_timeout_seconds: Seconds prewarm() waits for connections
+        """
+        self.api_key = api_key
+        self.size = max(1, size)
+        self.keepalive_seconds = keepalive_seconds
+        self.keepalive_timeout_seconds = keepalive_timeout_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.prewarm_timeout_seconds = prewarm_timeout_seconds
+        self.client: Any = None
+        self.channel: PooledChannel | None = None
+        self.prewarm_ms: int | None = None
+        self._waiting: list[Any] = []
+
+    def attach(self, llm: Any) -> None:
+        """
+        Make a ChatGoogleGenerativeAI instance use the shared client.
+
+        Args:
+            llm: Model client; bound now if the pool is started, else on start()
+        """
+        if self.client is not None:
+            llm.async_client_running = self.client
+        else:
+            self._waiting.append(llm)
+
+    def start(self) -> None:
+        """
+        Create the shared client and bind the attached model clients.
+
+        Must run inside the event loop that will use the connections.
+        Does nothing if already started or if nothing is attached.
+        """
+        if self.client is not None or not self._waiting:
+            return
+
+        # Imported here to keep the Gemini SDK out of app startup
+        from google.ai.generativelanguage_v1beta.services.generative_service import GenerativeServiceAsyncClient
+        from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+            GenerativeServiceGrpcAsyncIOTransport,
+        )
+        from google.api_core.client_options import ClientOptions
+
+        self.client = GenerativeServiceAsyncClient(
+            client_options=ClientOptions(api_endpoint=GEMINI_API_ENDPOINT, api_key=self.api_key),
+            transport=functools.partial(GenerativeServiceGrpcAsyncIOTransport, channel=self._create_channel)
+        )
+        for llm in self._waiting:
+            llm.async_client_running = self.client
+        self._waiting = []
+
+    def _create_channel(self, host: str, **kwargs) -> PooledChannel:
+        """Channel factory for the transport: size tuned channels as one."""
+        from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+            GenerativeServiceGrpcAsyncIOTransport,
+        )
+
+        options = [
+            *kwargs.pop("options", ()),
+            ("grpc.keepalive_time_ms", self.keepalive_seconds * 1000),
+            ("grpc.keepalive_timeout_ms", self.keepalive_timeout_seconds * 1000),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+            ("grpc.client_idle_timeout_ms", self.idle_timeout_seconds * 1000),
+            # Without this, channels with equal settings share one connection
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+        self.channel = PooledChannel([
+            GenerativeServiceGrpcAsyncIOTransport.create_channel(host, options=options, **kwargs)
+            for _ in range(self.size)
+        ])
+        return self.channel
+
+    async def prewarm(self, model_name: str | None = None) -> None:
+        """
+        Open the connections (DNS, TCP, TLS, HTTP/2) ahead of the first call.
+
+        Failures are logged, not raised: the service still starts, and the
+        first calls connect as they would without prewarming.
+
+        Args:
+            model_name: If given, also send a free countTokens request to
+                this model, which warms up authentication and routing too
+        """
+        self.start()
+        if self.channel is None:
+            return
+
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.channel.channel_ready(), self.prewarm_timeout_seconds)
+            if model_name:
+                await asyncio.wait_for(
+                    self.client.count_tokens(request={
+                        "model": f"models/{model_name}",
+                        "contents": [{"parts": [{"text": "ping"}]}]
+                    }),
+                    self.prewarm_timeout_seconds
+                )
+        except Exception as e:
+            logger.warning("Gemini connection prewarm failed, connecting on first use: %r", e)
+            return
+
+        self.prewarm_ms = int((time.perf_counter() - start_time) * 1000)
+        logger.info("Prewarmed %s Gemini connection(s) in %sms", self.size, self.prewarm_ms)
+
+    def stats(self) -> ProviderPoolStats | None:
+        """Get pool statistics, or None before the pool is started."""
+        if self.channel is None:
+            return None
+        return ProviderPoolStats(
+            size=self.size,
+            states=self.channel.states(),
+            in_flight=sum(self.channel.in_flight),
+            peak_in_flight=self.channel.peak_in_flight,
+            calls=self.channel.calls,
+            prewarm_ms=self.prewarm_ms
+        )
+
+    async def close(self) -> None:
+        """Close the connections."""
+        if self.channel is not None:
+            await self.channel.close()
+
+
+def create_provider_pool(settings: Settings) -> ProviderPool:
+    """
+    Create the Gemini connection pool configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Configured ProviderPool, not yet started
+    """
+    return ProviderPool(
+        api_key=settings.gemini_api_key,
+        size=settings.llm_pool_size,
+        keepalive_seconds=settings.llm_keepalive_seconds,
+        keepalive_timeout_seconds=settings.llm_keepalive_timeout_seconds,
+        idle_timeout_seconds=settings.llm_idle_timeout_seconds,
+        prewarm_timeout_seconds=settings.llm_prewarm_timeout_seconds
+    )
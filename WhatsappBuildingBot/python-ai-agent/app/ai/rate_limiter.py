@@ -0,0 +1,356 @@
+"""
+Concurrency cap and adaptive rate limiting for outbound LLM calls.
+
+Calls wait for a concurrency slot and a token from an AIMD token bucket:
+the refill rate halves when Gemini answers 429/503 and creeps back up on
+success. When too many calls are already waiting, new ones are rejected
+with LLMOverloadedError instead of queueing without bound.
+
+With several worker processes the bucket lives in SQLite, so all workers
+draw from one Gemini rate budget instead of each getting the full rate.
+"""
+
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from app.config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_STATUS_CODES = {429, 503}
+
+# Seconds a shared bucket waits for another worker's SQLite lock
+ACQUIRE_BUSY_TIMEOUT_SECONDS = 10.0
+RECORD_BUSY_TIMEOUT_SECONDS = 0.5
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the LLM call queue is full."""
+
+    def __init__(self, retry_after: int):
+        """
+        Initialize the error.
+
+        Args:
+            retry_after: Suggested seconds to wait before retrying
+        """
+        super().__init__(f"LLM call queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """
+    Check whether an exception (or its cause) is a provider 429/503.
+
+    Args:
+        exc: Exception raised by the LLM client
+
+    Returns:
+        True when the provider asked us to slow down
+    """
+    while exc is not None:
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if code in THROTTLING_STATUS_CODES:
+            return True
+        if type(exc).__name__ in ("ResourceExhausted", "ServiceUnavailable", "TooManyRequests"):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate backs off on throttling (AIMD).
+    """
+
+    _clock = staticmethod(time.monotonic)
+
+    # Whether rate updates do file I/O, which must stay off the event loop
+    blocking: bool = False
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        min_rate: float,
+        backoff_factor: float = 0.5,
+        recovery_step: float = 0.1
+    ):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate: Target tokens per second, also the ceiling for recovery
+            capacity: Maximum burst size
+            min_rate: Floor the rate never backs off below
+            backoff_factor: Multiplier applied to the rate on throttling
+            recovery_step: Tokens per second added back on each success
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+        self._tokens = float(capacity)
+        self._updated_at = self._clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_throttled(self) -> None:
+        """Multiplicatively decrease the rate after a 429/503."""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+        self._tokens = min(self._tokens, 0.0)
+        logger.warning("LLM throttled, backing off to %.2f calls/s", self.rate)
+
+    def on_success(self) -> None:
+        """Additively increase the rate after a successful call."""
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class SharedTokenBucket(AdaptiveTokenBucket):
+    """
+    AIMD token bucket whose state is shared by processes through SQLite.
+
+    Tokens, the current rate and the last refill time live in one row that
+    is read and written in an IMMEDIATE transaction, so worker processes
+    draw from (and back off) a single budget.
+    """
+
+    _clock = staticmethod(time.time)  # Monotonic clocks are per process
+    blocking = True
+
+    def __init__(self, path: str, name: str = "gemini", **bucket_args):
+        """
+        Open (or create) the shared bucket.
+
+        Args:
+            path: Path of the SQLite database file
+            name: Bucket name, for several budgets in one file
+            **bucket_args: Rate settings, as for AdaptiveTokenBucket
+        """
+        super().__init__(**bucket_args)
+        self.name = name
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=ACQUIRE_BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_rate_limit (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                rate REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    async def acquire(self) -> None:
+        """Wait until a shared token is available and take it."""
+        async with self._lock:
+            while True:
+                wait = await asyncio.to_thread(self._try_take)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def on_throttled(self) -> None:
+        """Multiplicatively decrease the shared rate after a 429/503."""
+        with self._shared_state(RECORD_BUSY_TIMEOUT_SECONDS):
+            super().on_throttled()
+
+    def on_success(self) -> None:
+        """Additively increase the shared rate after a successful call."""
+        # self.rate is the value seen at the last acquire; skip the write at full rate
+        if self.rate < self.max_rate:
+            with self._shared_state(RECORD_BUSY_TIMEOUT_SECONDS):
+                super().on_success()
+
+    def _try_take(self) -> float:
+        """Take a token if one is available; otherwise return seconds to wait."""
+        with self._shared_state(ACQUIRE_BUSY_TIMEOUT_SECONDS):
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    @contextmanager
+    def _shared_state(self, busy_timeout: float) -> Iterator[None]:
+        """
+        Load the shared row into this bucket, run the body, store it back.
+
+        Args:
+            busy_timeout: Seconds to wait for another worker's lock before
+                sqlite3.OperationalError is raised
+        """
+        with self._db_lock:
+            self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, rate, updated_at FROM llm_rate_limit WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+                if row is not None:
+                    self._tokens, rate, self._updated_at = row
+                    # Settings may have changed since the row was written
+                    self.rate = min(self.max_rate, max(self.min_rate, rate))
+                    self._tokens = min(self._tokens, self.capacity)
+                yield
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_rate_limit (name, tokens, rate, updated_at) VALUES (?, ?, ?, ?)",
+                    (self.name, self._tokens, self.rate, self._updated_at)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class LLMLimiter:
+    """
+    Bounded concurrency plus rate limiting for LLM calls.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, bucket: AdaptiveTokenBucket):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrency: Maximum LLM calls running at once
+            max_queue: Maximum calls waiting for a slot before rejecting
+            bucket: Token bucket shaping the call rate
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.bucket = bucket
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self) -> None:
+        """
+        Wait for a concurrency slot and a rate token for one LLM call.
+
+        Every successful acquire must be paired with release().
+
+        Raises:
+            LLMOverloadedError: When max_queue calls are already waiting
+        """
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise LLMOverloadedError(self.retry_after())
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self) -> None:
+        """Release the concurrency slot taken by acquire()."""
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold a concurrency slot and a rate token for one LLM call.
+
+        Raises:
+            LLMOverloadedError: When max_queue calls are already waiting
+        """
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def record(self, exc: BaseException | None) -> None:
+        """
+        Feed a call outcome back into the adaptive rate.
+
+        A shared bucket is updated in a worker thread. If another worker
+        holds its lock for long, the update is skipped rather than waited for.
+
+        Args:
+            exc: Exception raised by the call, or None on success
+        """
+        if exc is None:
+            update = self.bucket.on_success
+        elif is_throttling_error(exc):
+            update = self.bucket.on_throttled
+        else:
+            return
+
+        if not self.bucket.blocking:
+            update()
+            return
+        try:
+            await asyncio.to_thread(update)
+        except sqlite3.OperationalError as e:
+            logger.warning("Shared LLM rate update skipped: %r", e)
+
+    def retry_after(self) -> int:
+        """Estimate seconds until the current queue drains."""
+        return max(1, math.ceil((self.waiting + self.max_concurrency) / self.bucket.rate))
+
+
+def create_limiter(settings: Settings) -> LLMLimiter:
+    """
+    Create the LLM limiter configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Configured LLMLimiter
+    """
+    bucket_args = dict(
+        rate=settings.llm_rate_per_second,
+        capacity=settings.llm_burst,
+        min_rate=settings.llm_min_rate_per_second,
+        backoff_factor=settings.llm_backoff_factor,
+        recovery_step=settings.llm_recovery_step
+    )
+    if settings.workers <= 1:
+        return LLMLimiter(settings.llm_max_concurrency, settings.llm_max_queue, AdaptiveTokenBucket(**bucket_args))
+
+    # One rate budget for all workers; concurrency and queue split between them
+    bucket = SharedTokenBucket(settings.llm_rate_limit_sqlite_path, **bucket_args)
+    return LLMLimiter(
+        max(1, math.ceil(settings.llm_max_concurrency / settings.workers)),
+        max(1, math.ceil(settings.llm_max_queue / settings.workers)),
+        bucket
+    )
@@ -0,0 +1,326 @@
+"""
+Deterministic keyword classifier used as a fast path in front of the LLM.
+
+Most tickets are obvious ("נורה שרופה בלובי"). When both the ticket type
+and the location match keywords unambiguously, the message is answered
+locally in microseconds and never reaches Gemini. Messages that negate
+the problem or report it as fixed ("אין בעיה בלובי, הנורה תוקנה") contain
+the same keywords, so they are always left to the LLM.
+"""
+
+import re
+import time
+
+from app.config import LOCATIONS, TICKET_TYPES, get_settings
+from app.ai.cache import normalize_message
+from app.schemas import AnalyzeResponse, FastPathStats, ModelMetadata
+
+
+MODEL_NAME = "rule-based"
+
+# Single-letter prefixes that attach to Hebrew words (ו, ה, ב, ל, מ, ש, כ)
+HEBREW_PREFIXES = "והבלמשכ"
+MAX_PREFIX_LENGTH = 3
+
+STRONG = 1.0
+WEAK = 0.5
+
+# Words that negate a problem or report it as handled. A message with any
+# of them goes to the LLM.
+NEGATION_WORDS = {"אין", "אל", "לא"}
+RESOLVED_WORDS = {
+    "תוקן", "תוקנה", "תוקנו", "טופל", "טופלה", "טופלו", "כבר",
+}
+
+# Words that after a negation still describe a fault ("לא עובד", "אין מים")
+FAULT_AFTER_NEGATION = {
+    "עובד", "עובדת", "עובדים", "עובדות", "נדלק", "נדלקת", "נדלקים",
+    "נפתח", "נפתחת", "נסגר", "נסגרת", "מגיע", "מגיעה",
+    "מים", "חשמל", "אור",
+}
+
+# Keywords per ticket type, written without prefixes. Multi-word keywords
+# are matched as consecutive words.
+TICKET_TYPE_KEYWORDS: dict[str, dict[str, float]] = {
+    "מעלית": {
+        "מעלית": STRONG, "מעליות": STRONG, "תקועה": WEAK, "תקוע": WEAK,
+    },
+    "גינה": {
+        "גינון": STRONG, "גנן": STRONG, "דשא": STRONG, "השקיה": STRONG,
+        "ממטרה": STRONG, "ממטרות": STRONG, "גיזום": STRONG,
+        "עץ": WEAK, "עצים": WEAK, "ענפים": WEAK, "צמחים": WEAK, "גינה": WEAK,
+    },
+    "בינוי": {
+        "סדק": STRONG, "סדקים": STRONG, "טיח": STRONG, "ריצוף": STRONG,
+        "מרצפת": STRONG, "מרצפות": STRONG, "אריח": STRONG, "אריחים": STRONG,
+        "מעקה": STRONG, "שיפוץ": STRONG, "קיר": WEAK, "דלת": WEAK, "חלון": WEAK,
+        "שבור": WEAK, "שבורה": WEAK,
+    },
+    "תאורה": {
+        "נורה": STRONG, "נורות": STRONG, "תאורה": STRONG, "מנורה": STRONG,
+        "מנורות": STRONG, "חשוך": STRONG, "חושך": STRONG, "פנס": STRONG,
+        "שרופה": WEAK, "שרוף": WEAK, "אור": WEAK,
+    },
+    "הדברה": {
+        "הדברה": STRONG, "מדביר": STRONG, "גוקים": STRONG,
+        "גוק": STRONG, "מקקים": STRONG, "תיקנים": STRONG, "נמלים": STRONG,
+        "עכבר": STRONG, "עכברים": STRONG, "חולדה": STRONG, "חולדות": STRONG,
+        "יתושים": STRONG, "פשפשים": STRONG, "מזיקים": STRONG, "נחש": STRONG,
+    },
+    "כיבוי אש": {
+        "כיבוי אש": STRONG, "מטף": STRONG, "מטפים": STRONG, "גלאי עשן": STRONG,
+        "ספרינקלר": STRONG, "ספרינקלרים": STRONG, "גלגלון": STRONG,
+        "שריפה": STRONG, "עשן": WEAK, "אש": WEAK,
+    },
+    "אינטרקום": {
+        "אינטרקום": STRONG, "אינטרקם": STRONG, "פעמון": WEAK, "צלצול": WEAK,
+    },
+    "חשמל": {
+        "חשמל": STRONG, "קצר": STRONG, "שקע": STRONG, "שקעים": STRONG,
+        "מפסק": STRONG, "לוח חשמל": STRONG, "חוטים": WEAK, "ניצוצות": WEAK,
+    },
+    "חניה": {
+        "חניה": STRONG, "חנייה": STRONG, "חונה": STRONG,
+        "חוסם": WEAK, "חסם": WEAK, "רכב": WEAK, "מכונית": WEAK,
+    },
+    "אינסטלציה": {
+        "אינסטלציה": STRONG, "אינסטלטור": STRONG, "נזילה": STRONG, "נזילות": STRONG,
+        "דליפה": STRONG, "ביוב": STRONG, "סתימה": STRONG, "סתום": STRONG,
+        "סתומה": STRONG, "הצפה": STRONG, "צינור": STRONG, "צנרת": STRONG,
+        "ברז": WEAK, "מים": WEAK, "רטיבות": WEAK, "נוזל": WEAK,
+    },
+    "ניקיון": {
+        "ניקיון": STRONG, "נקיון": STRONG, "מלוכלך": STRONG, "מלוכלכת": STRONG,
+        "לכלוך": STRONG, "מסריח": STRONG, "מסריחה": STRONG, "סירחון": STRONG,
+        "מנקה": STRONG, "לנקות": STRONG, "גועל נפש": STRONG,
+        "ריח": WEAK, "זבל": WEAK,
+    },
+}
+
+# Keywords per location, written without prefixes. Floors are matched
+# separately by FLOOR_PATTERN.
+LOCATION_KEYWORDS: dict[str, dict[str, float]] = {
+    "לובי": {"לובי": STRONG, "כניסה": WEAK},
+    "חניון": {"חניון": STRONG, "חניונים": STRONG},
+    "גינה": {"גינה": STRONG, "חצר": STRONG, "דשא": WEAK},
+    "מעלית": {"מעלית": STRONG, "מעליות": STRONG},
+    "חדר אשפה": {"חדר אשפה": STRONG, "חדר זבל": STRONG, "פח": WEAK, "פחים": WEAK},
+    "גג": {"גג": STRONG},
+    "חדר עגלות": {"חדר עגלות": STRONG, "עגלות": WEAK},
+    "חדר מחסנים": {"חדר מחסנים": STRONG, "מחסן": STRONG, "מחסנים": STRONG},
+    "קרקע": {"קומת קרקע": STRONG, "קרקע": STRONG},
+}
+
+HEBREW_ORDINAL_FLOORS = {
+    "ראשונה": 1, "שנייה": 2, "שניה": 2, "שלישית": 3, "רביעית": 4,
+    "חמישית": 5, "שישית": 6, "שביעית": 7, "שמינית": 8, "תשיעית": 9,
+    "עשירית": 10,
+}
+
+# "קומה 7", "בקומה ה 7" (after normalization), "לקומה שביעית"
+FLOOR_PATTERN = re.compile(
+    rf"(?:^|\s)[{HEBREW_PREFIXES}]{{0,{MAX_PREFIX_LENGTH}}}קומה\s+(?:ה\s*)?"
+    rf"(\d{{1,2}}|{'|'.join(HEBREW_ORDINAL_FLOORS)})(?=\s|$)"
+)
+
+
+def _word_variants(word: str) -> set[str]:
+    """
+    Get a word and its forms with up to MAX_PREFIX_LENGTH prefixes removed.
+
+    Args:
+        word: A normalized word
+
+    Returns:
+        Set of candidate base forms, e.g. "שבלובי" -> {"שבלובי", "בלובי", "לובי"}
+    """
+    variants = {word}
+    stripped = word
+    for _ in range(MAX_PREFIX_LENGTH):
+        if len(stripped) <= 2 or stripped[0] not in HEBREW_PREFIXES:
+            break
+        stripped = stripped[1:]
+        variants.add(stripped)
+    return variants
+
+
+def _compile_keywords(table: dict[str, dict[str, float]]) -> list[tuple[str, tuple[str, ...], float]]:
+    """Split multi-word keywords into word tuples once, at import time."""
+    return [
+        (category, tuple(keyword.split()), weight)
+        for category, keywords in table.items()
+        for keyword, weight in keywords.items()
+    ]
+
+
+_TICKET_TYPE_RULES = _compile_keywords(
+    {k: v for k, v in TICKET_TYPE_KEYWORDS.items() if k in TICKET_TYPES}
+)
+_LOCATION_RULES = _compile_keywords(
+    {k: v for k, v in LOCATION_KEYWORDS.items() if k in LOCATIONS}
+)
+
+
+class RuleBasedClassifier:
+    """
+    Keyword and pattern classifier that answers only when it is confident.
+    """
+
+    def __init__(self, min_confidence: float = 0.85):
+        """
+        Initialize the classifier.
+
+        Args:
+            min_confidence: Confidence both fields must reach to skip the LLM
+        """
+        self.min_confidence = min_confidence
+        self.attempts = 0
+        self.hits = 0
+
+    def classify(self, message_text: str) -> AnalyzeResponse | None:
+        """
+        Classify a message locally when the keywords are unambiguous.
+
+        Args:
+            message_text: The raw Hebrew message from the resident
+
+        Returns:
+            AnalyzeResponse when both ticket type and location reach
+            min_confidence, otherwise None so the caller uses the LLM
+        """
+        start_time = time.time()
+        self.attempts += 1
+
+        normalized = normalize_message(message_text)
+        words = [_word_variants(word) for word in normalized.split()]
+        if self._negated(words):
+            return None
+
+        ticket_type, type_confidence = self._score(words, _TICKET_TYPE_RULES)
+        location, location_confidence = self._score(words, _LOCATION_RULES)
+        floor, floor_confidence = self._match_floor(normalized)
+        if floor is not None:
+            # A floor together with another named place is ambiguous
+            location_confidence = floor_confidence if location is None else floor_confidence / 2
+            location = floor
+
+        confidence = min(type_confidence, location_confidence)
+        if ticket_type is None or location is None or confidence < self.min_confidence:
+            return None
+
+        self.hits += 1
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        return AnalyzeResponse(
+            ticket_type=ticket_type,
+            location=location,
+            # Built from the matched fields only: the message may hold names
+            # and phone numbers that must not reach the ticket sheet
+            normalized_summary=f"התקבל דיווח על בעיית {ticket_type} ב{location}. נדרש טיפול.",
+            original_text=message_text,
+            language="he",
+            confidence=round(confidence, 2),
+            model_metadata=ModelMetadata(
+                model=MODEL_NAME,
+                latency_ms=latency_ms
+            )
+        )
+
+    def stats(self) -> FastPathStats:
+        """Get the fast-path hit statistics."""
+        return FastPathStats(
+            attempts=self.attempts,
+            hits=self.hits,
+            hit_rate=round(self.hits / self.attempts, 4) if self.attempts else 0.0
+        )
+
+    @staticmethod
+    def _negated(words: list[set[str]]) -> bool:
+        """
+        Check whether a message negates the problem or reports it as handled.
+
+        Args:
+            words: Per-word variant sets of the normalized message
+
+        Returns:
+            True if a resolution word appears, or a negation not followed by
+            a fault word
+        """
+        for i, variants in enumerate(words):
+            if variants & RESOLVED_WORDS:
+                return True
+            if variants & NEGATION_WORDS:
+                following = words[i + 1] if i + 1 < len(words) else set()
+                if not following & FAULT_AFTER_NEGATION:
+                    return True
+        return False
+
+    @staticmethod
+    def _score(
+        words: list[set[str]],
+        rules: list[tuple[str, tuple[str, ...], float]]
+    ) -> tuple[str | None, float]:
+        """
+        Score categories by matched keywords.
+
+        Confidence is the best category's share of all matched weight,
+        scaled down when only weak keywords matched.
+
+        Args:
+            words: Per-word variant sets of the normalized message
+            rules: Compiled (category, keyword words, weight) rules
+
+        Returns:
+            Best category and its confidence, or (None, 0.0) with no match
+        """
+        scores: dict[str, float] = {}
+        for category, keyword, weight in rules:
+            for start in range(len(words) - len(keyword) + 1):
+                if all(part in words[start + i] for i, part in enumerate(keyword)):
+                    scores[category] = scores.get(category, 0.0) + weight
+                    break
+
+        if not scores:
+            return None, 0.0
+
+        best = max(scores, key=scores.get)
+        share = scores[best] / sum(scores.values())
+        strength = min(1.0, scores[best] / STRONG)
+        return best, 0.95 * share * strength
+
+    @staticmethod
+    def _match_floor(normalized: str) -> tuple[str | None, float]:
+        """
+        Match an explicit floor such as "קומה 7" or "קומה שביעית".
+
+        Args:
+            normalized: Normalized message text
+
+        Returns:
+            Floor location and its confidence, or (None, 0.0) with no match
+        """
+        floors = set()
+        for match in FLOOR_PATTERN.finditer(normalized):
+            value = match.group(1)
+            number = int(value) if value.isdigit() else HEBREW_ORDINAL_FLOORS[value]
+            floors.add(f"קומה {number}")
+
+        if len(floors) != 1:
+            return None, 0.0
+
+        location = floors.pop()
+        if location not in LOCATIONS:
+            return None, 0.0
+        return location, 0.95
+
+
+# Singleton instance
+_rule_classifier: RuleBasedClassifier | None = None
+
+
+def get_rule_classifier() -> RuleBasedClassifier:
+    """Get or create the rule-based classifier singleton."""
+    global _rule_classifier
+    if _rule_classifier is None:
+        _rule_classifier = RuleBasedClassifier(get_settings().fast_path_min_confidence)
+    return _rule_classifier
@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing of duplicate in-flight classifications.
+
+Group chats forward the same complaint many times within seconds. While
+a classification for a key is pending, later callers with the same key
+await that call instead of starting their own.
+
+The shared call runs with the first caller's deadline, so callers only
+share a call when their deadlines fall in the same bucket (see
+with_deadline): a caller that allows more time does not get a deadline
+fallback cut at someone else's timeout.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Width of the deadline buckets callers must share to join a call
+DEADLINE_BUCKET_SECONDS = 1.0
+
+
+def with_deadline(key: str, deadline: float) -> str:
+    """
+    Extend a coalescing key with the bucket of the caller's deadline.
+
+    Args:
+        key: Coalescing key, e.g. from make_cache_key
+        deadline: time.monotonic() by which the caller needs the answer
+
+    Returns:
+        Key shared only by callers whose deadlines are in the same bucket
+    """
+    return f"{key}:{int(deadline // DEADLINE_BUCKET_SECONDS)}"
+
+
+class SingleFlight:
+    """
+    Shares one pending coroutine between concurrent callers with the same key.
+    """
+
+    def __init__(self):
+        """Initialize the in-flight table and counters."""
+        self._pending: dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn for key, or join the call already in flight for it.
+
+        The shared call is shielded, so a caller that disconnects does not
+        cancel the work for the others.
+
+        Args:
+            key: Coalescing key, e.g. from make_cache_key
+            fn: Factory for the coroutine to run when nothing is in flight
+
+        Returns:
+            The result of the shared call
+        """
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._pending[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug("Joining in-flight classification")
+
+        return await asyncio.shield(future)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct calls currently pending."""
+        return len(self._pending)
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        """Drop a finished call from the in-flight table."""
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+
+# Singleton instance
+_single_flight: SingleFlight | None = None
+
+
+def get_single_flight() -> SingleFlight:
+    """Get or create the single-flight singleton."""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -15,11 +15,120 @@ class Settings(BaseSettings):
     # Server
     host: str = "0.0.0.0"
     port: int = 8001
-    log_level: str = "INFO"
     
     # Environment
     environment: str = "development"
     
+    # Logging: records are queued and written by a background thread
+    log_level: str = "INFO"
+    log_format: str = "text"  # "text" or "json"
+    log_async: bool = True  # False writes from the calling thread
+    log_queue_size: int = 10000  # Records beyond this are dropped, not waited for
+    log_sample_rates: str = ""  # Share kept per level, e.g. "DEBUG=0.01,INFO=0.2"; unlisted levels are kept
+    log_redact_pii: bool = True  # Mask phone numbers, e-mails and resident fields
+    log_max_field_chars: int = 500  # Longer values (e.g. raw LLM output) are cut
+    
+    # Startup: "eager" builds the classifier before serving, "lazy" warms it
+    # up in the background while /health already answers (see /ready)
+    startup_mode: str = "eager"
+    
+    # Multi-worker mode: with workers > 1 the cache, LLM rate budget and
+    # metrics are shared between worker processes through local files
+    workers: int = 1
+    llm_rate_limit_sqlite_path: str = "llm_rate_limit.sqlite3"
+    metrics_multiproc_dir: str = "prometheus_multiproc"  # Unless PROMETHEUS_MULTIPROC_DIR is set
+    
+    # Background jobs: /analyze with a callback_url (or ?async=true) answers
+    # 202 and is classified by queue workers
+    jobs_enabled: bool = False  # Off: such requests are rejected with 400 and no workers run
+    job_queue_sqlite_path: str = "analyze_jobs.sqlite3"
+    job_workers: int = 4  # Worker tasks per process
+    job_lease_seconds: int = 300  # A running job is retried after this long
+    job_retention_seconds: int = 86400  # Finished jobs kept for GET /jobs/{id}
+    job_callback_timeout_seconds: float = 10.0
+    job_callback_retries: int = 3
+    job_callback_allowed_hosts: str = ""  # Comma-separated, may be internal; empty allows any public host
+    job_max_attempts: int = 10  # Runs (LLM overloaded, worker died) before a job fails
+    
+    # Batch classification
+    batch_chunk_size: int = 10  # Messages packed into a single LLM call
+    batch_max_items: int = 100  # Maximum messages accepted per /analyze/batch request
+    
+    # Classification cache
+    cache_backend: str = "memory"  # "memory", "sqlite" or "none"
+    cache_max_entries: int = 1000
+    cache_ttl_seconds: int = 3600
+    cache_sqlite_path: str = "classification_cache.sqlite3"
+    
+    # Outbound LLM call limits
+    llm_max_concurrency: int = 8  # LLM calls running at once
+    llm_max_queue: int = 32  # Calls waiting for a slot before overload kicks in
+    llm_rate_per_second: float = 5.0  # Token bucket refill rate
+    llm_burst: int = 10  # Token bucket capacity
+    llm_min_rate_per_second: float = 0.2  # Floor for adaptive backoff
+    llm_backoff_factor: float = 0.5  # Rate multiplier on 429/503
+    llm_recovery_step: float = 0.1  # Rate added back per successful call
+    llm_overload_behavior: str = "reject"  # "reject" (503 + Retry-After) or "fallback"
+    
+    # Gemini connections: a pool of kept-alive HTTP/2 connections shared by
+    # all model clients, opened at startup before /ready reports ready
+    llm_pool_size: int = 1  # Each connection multiplexes up to ~100 concurrent calls
+    llm_keepalive_seconds: int = 60  # Ping interval, also while idle
+    llm_keepalive_timeout_seconds: int = 20
+    llm_idle_timeout_seconds: int = 86400  # gRPC closes idle connections after this (its default is 30 min)
+    llm_prewarm: bool = True
+    llm_prewarm_timeout_seconds: float = 5.0
+    llm_prewarm_request: bool = False  # Also send a free countTokens call while prewarming
+    
+    # Deadlines and hedging: a classification is cancelled when the client's
+    # timeout (X-Request-Timeout-Ms or timeout_ms) or this default passes
+    llm_timeout_seconds: float = 30.0
+    llm_hedging_enabled: bool = False
+    llm_hedge_percentile: float = 0.95  # Hedge calls slower than this latency percentile
+    llm_hedge_budget_ratio: float = 0.05  # At most this many extra calls per call
+    llm_hedge_min_samples: int = 20  # Calls observed before hedging starts
+    
+    # Provider-side context caching of the static prompt prefix
+    prompt_context_cache_enabled: bool = False
+    prompt_context_cache_ttl_seconds: int = 3600
+    
+    # Tiered model routing: models cheapest first (comma-separated); the next
+    # tier is asked when confidence is below the threshold or parsing failed
+    llm_models: str = "gemini-1.5-flash"
+    llm_escalation_confidence: float = 0.6
+    
+    # Structured output: constrain responses to a JSON schema with the
+    # allowed ticket types and locations as enums
+    llm_structured_output: bool = True
+    
+    # Media: photos from media_urls are downloaded, downscaled and sent to
+    # the model with the message text. Off by default: Twilio media URLs
+    # need media_auth_username/media_auth_password as well
+    media_enabled: bool = False
+    media_max_per_request: int = 3  # Further attachments are ignored
+    media_max_concurrent_fetches: int = 8  # Downloads at once across all requests
+    media_max_bytes: int = 10_000_000  # Larger attachments are skipped
+    media_fetch_timeout_seconds: float = 5.0
+    media_max_dimension: int = 768  # Longest side after downscaling, in pixels
+    media_jpeg_quality: int = 80
+    media_cache_max_bytes: int = 50_000_000  # Prepared images kept in memory
+    media_cache_ttl_seconds: int = 3600
+    media_allowed_hosts: str = "api.twilio.com,*.twilio.com"  # Comma-separated; empty allows any host
+    media_auth_username: str = ""  # HTTP basic auth for allow-listed hosts (Twilio account SID)
+    media_auth_password: str = ""  # Twilio auth token
+    
+    # Incident clustering: reports close to an open incident in the same
+    # building are returned as duplicates of it (see app/ai/incidents.py)
+    incidents_enabled: bool = False  # The gateway then skips tickets for duplicates
+    incident_window_seconds: int = 7200  # An incident closes this long after its last report
+    incident_text_similarity: float = 0.7  # Text similarity that skips the LLM
+    incident_related_similarity: float = 0.5  # Needed on top of equal ticket type and location
+    incident_max_per_building: int = 100
+    
+    # Rule-based fast path
+    fast_path_enabled: bool = False
+    fast_path_min_confidence: float = 0.85  # Both ticket_type and location must reach this
+    
     class Config:
         env_file = "../.env"  # Read from parent directory
         env_file_encoding = "utf-8"
@@ -0,0 +1,501 @@
+"""
+Background job queue for asynchronous /analyze requests.
+
+A request with a callback_url (or ?async=true) is stored in a local SQLite
+queue and answered with 202 right away. Worker tasks drain the queue,
+classify each message and POST the result to the callback URL, so the
+gateway does not hold its connection open while Gemini answers. Jobs
+survive restarts, and with several worker processes they all drain the
+same file. A finished job keeps its callback pending until delivery ends,
+so a result whose process died before delivering it is sent after the
+lease runs out.
+
+Callbacks only go to hosts in the allow-list, or with an empty list, to
+hosts that resolve to public addresses.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.ai.rate_limiter import LLMOverloadedError
+from app.config import Settings, get_settings
+from app.metrics import JOB_CALLBACKS, JOBS
+from app.schemas import AnalyzeRequest, AnalyzeResponse, JobStatus
+from app.url_policy import host_listed, resolves_to_public, url_allowed
+
+
+logger = logging.getLogger(__name__)
+
+# How often one idle worker looks for expired leases: jobs and callbacks
+# whose process died, possibly another worker process. New jobs wake the
+# workers of the process they were submitted to instead.
+RECOVERY_POLL_SECONDS = 15.0
+
+# Delay between callback delivery attempts, doubled after each failure
+CALLBACK_BACKOFF_SECONDS = 1.0
+
+
+class JobStore:
+    """
+    Persistent job queue in a local SQLite file.
+
+    Jobs move from queued to running to done or failed. A running job
+    whose lease runs out (its worker died) is handed out again, and so is
+    the callback delivery of a finished job.
+    """
+
+    def __init__(self, path: str, lease_seconds: int, retention_seconds: int):
+        """
+        Open (or create) the job queue file.
+
+        Args:
+            path: Path of the SQLite database file
+            lease_seconds: Seconds a claimed job may run before it is retried
+            retention_seconds: Seconds finished jobs are kept for polling
+        """
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS analyze_jobs (
+                id TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                callback_url TEXT,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_status TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analyze_jobs_queue ON analyze_jobs (status, available_at)"
+        )
+
+    def enqueue(self, request: AnalyzeRequest, callback_url: str | None) -> str:
+        """
+        Add a job to the queue.
+
+        Args:
+            request: The /analyze request to classify
+            callback_url: Where to POST the result, if anywhere
+
+        Returns:
+            The new job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analyze_jobs (id, request, callback_url, status, callback_status, "
+                "available_at, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (
+                    job_id, request.model_dump_json(), callback_url,
+                    "pending" if callback_url else None, now, now, now
+                )
+            )
+        return job_id
+
+    def claim(self) -> tuple[str, AnalyzeRequest, int] | None:
+        """
+        Take the oldest available job and mark it running.
+
+        Returns:
+            (job ID, request, attempts including this one), or None when
+            nothing is available
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, request, attempts FROM analyze_jobs "
+                    "WHERE status IN ('queued', 'running') AND available_at <= ? "
+                    "ORDER BY available_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE analyze_jobs SET status = 'running', attempts = attempts + 1, "
+                        "available_at = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return row[0], AnalyzeRequest.model_validate_json(row[1]), row[2] + 1
+
+    def claim_callback(self) -> tuple[str, str] | None:
+        """
+        Take a finished job whose callback delivery was interrupted.
+
+        Delivery is leased like a running job, so it is retried only once
+        the process that owned it is presumed dead.
+
+        Returns:
+            (job ID, callback URL), or None when nothing is pending
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, callback_url FROM analyze_jobs "
+                    "WHERE status IN ('done', 'failed') AND callback_status = 'pending' AND available_at <= ? "
+                    "ORDER BY available_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE analyze_jobs SET available_at = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[0], row[1]) if row is not None else None
+
+    def complete(self, job_id: str, result: AnalyzeResponse) -> None:
+        """Store a job's result and mark it done."""
+        self._finish(job_id, "done", result.model_dump_json(), None)
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job failed with an error message."""
+        self._finish(job_id, "failed", None, error)
+
+    def retry_later(self, job_id: str, delay_seconds: float) -> None:
+        """Put a claimed job back in the queue, available after a delay."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyze_jobs SET status = 'queued', available_at = ?, updated_at = ? WHERE id = ?",
+                (now + delay_seconds, now, job_id)
+            )
+
+    def set_callback_status(self, job_id: str, callback_status: str) -> None:
+        """Record whether the result was delivered to the callback URL."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyze_jobs SET callback_status = ?, updated_at = ? WHERE id = ?",
+                (callback_status, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> JobStatus | None:
+        """
+        Look up a job.
+
+        Args:
+            job_id: ID returned by enqueue
+
+        Returns:
+            The job's status, or None if it does not exist (or was purged)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error, callback_status, attempts, created_at, updated_at "
+                "FROM analyze_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        status, result, error, callback_status, attempts, created_at, updated_at = row
+        return JobStatus(
+            job_id=job_id,
+            status=status,
+            result=AnalyzeResponse.model_validate_json(result) if result else None,
+            error=error,
+            callback_status=callback_status,
+            attempts=attempts,
+            created_at=created_at,
+            updated_at=updated_at
+        )
+
+    def callback_url(self, job_id: str) -> str | None:
+        """Get the callback URL a job was submitted with."""
+        with self._lock:
+            row = self._conn.execute("SELECT callback_url FROM analyze_jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def pending_count(self) -> int:
+        """Count jobs that are queued or running."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM analyze_jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def purge(self) -> int:
+        """
+        Delete finished jobs older than the retention period.
+
+        Returns:
+            Number of jobs deleted
+        """
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM analyze_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention_seconds,)
+            ).rowcount
+
+    def _finish(self, job_id: str, status: str, result: str | None, error: str | None) -> None:
+        # The lease now covers the callback delivery
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analyze_jobs SET status = ?, result = ?, error = ?, available_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, result, error, now + self.lease_seconds, now, job_id)
+            )
+
+
+class JobQueue:
+    """
+    Worker tasks draining a JobStore and delivering results to callbacks.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int,
+        callback_timeout: float,
+        callback_retries: int,
+        max_attempts: int,
+        callback_allowed_hosts: str = ""
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            store: Persistent job store
+            workers: Number of worker tasks in this process
+            callback_timeout: Seconds to wait for the callback endpoint
+            callback_retries: Delivery attempts before a callback is given up
+            max_attempts: Times a job is run (LLM overloaded, worker died)
+                before it fails
+            callback_allowed_hosts: Comma-separated callback hosts, which may
+                be internal; empty allows any host with a public address
+        """
+        self.store = store
+        self.workers = workers
+        self.callback_timeout = callback_timeout
+        self.callback_retries = callback_retries
+        self.max_attempts = max_attempts
+        self.callback_allowed_hosts = callback_allowed_hosts
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+
+    async def submit(self, request: AnalyzeRequest, callback_url: str | None) -> str:
+        """
+        Enqueue a job and wake an idle worker.
+
+        Args:
+            request: The /analyze request to classify
+            callback_url: Where to POST the result, if anywhere
+
+        Returns:
+            The new job ID
+        """
+        job_id = await asyncio.to_thread(self.store.enqueue, request, callback_url)
+        self._wakeup.set()
+        return job_id
+
+    async def callback_allowed(self, callback_url: str) -> bool:
+        """
+        Check that results may be sent to a callback URL.
+
+        Args:
+            callback_url: URL from the request
+
+        Returns:
+            True if the URL is http(s) and its host is allow-listed, or with
+            no allow-list, resolves only to public addresses
+        """
+        if not url_allowed(callback_url, self.callback_allowed_hosts):
+            return False
+        host = httpx.URL(callback_url).host
+        return host_listed(host, self.callback_allowed_hosts) or await resolves_to_public(host)
+
+    def start(self, handler: Callable[[AnalyzeRequest], Awaitable[AnalyzeResponse]]) -> None:
+        """
+        Start the worker tasks.
+
+        Args:
+            handler: Classifies one request, as /analyze does
+        """
+        self._client = httpx.AsyncClient(timeout=self.callback_timeout)
+        purged = self.store.purge()
+        if purged:
+            logger.info("Purged %s finished jobs", purged)
+        # One worker polls for expired leases; the others sleep until woken
+        self._tasks = [
+            asyncio.create_task(self._worker(handler, polls=index == 0))
+            for index in range(self.workers)
+        ]
+        logger.info("Job queue started with %s workers, %s jobs pending", self.workers, self.store.pending_count())
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; running jobs are retried after their lease."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _worker(
+        self,
+        handler: Callable[[AnalyzeRequest], Awaitable[AnalyzeResponse]],
+        polls: bool
+    ) -> None:
+        """
+        Claim and run jobs until cancelled.
+
+        Args:
+            handler: Classifies one request
+            polls: Also wake up every RECOVERY_POLL_SECONDS to pick up
+                expired leases; otherwise sleep until submit()
+        """
+        while True:
+            # Cleared before claiming, so a submit() after the claim still wakes us
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                pending = await asyncio.to_thread(self.store.claim_callback)
+                if pending is not None:
+                    logger.info("Resuming interrupted callback for job %s", pending[0])
+                    await self._deliver(*pending)
+                    continue
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), RECOVERY_POLL_SECONDS if polls else None)
+                continue
+
+            # More jobs may be waiting: let another idle worker look
+            self._wakeup.set()
+            job_id, request, attempts = job
+            try:
+                if attempts > self.max_attempts:
+                    raise RuntimeError(f"Gave up after {self.max_attempts} attempts")
+                result = await handler(request)
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back instead of waiting out the lease
+                self.store.retry_later(job_id, 0)
+                raise
+            except LLMOverloadedError as e:
+                if attempts < self.max_attempts:
+                    # Keep the job instead of failing it; the queue absorbs the burst
+                    logger.info("LLM overloaded, retrying job %s in %ss", job_id, e.retry_after)
+                    await asyncio.to_thread(self.store.retry_later, job_id, e.retry_after)
+                    asyncio.get_running_loop().call_later(e.retry_after, self._wakeup.set)
+                    continue
+                logger.error("Job %s failed: LLM still overloaded after %s attempts", job_id, attempts)
+                JOBS.labels(status="failed").inc()
+                await asyncio.to_thread(self.store.fail, job_id, str(e))
+            except Exception as e:
+                logger.error("Job %s failed: %s", job_id, e)
+                JOBS.labels(status="failed").inc()
+                await asyncio.to_thread(self.store.fail, job_id, str(e))
+            else:
+                JOBS.labels(status="done").inc()
+                await asyncio.to_thread(self.store.complete, job_id, result)
+
+            callback_url = await asyncio.to_thread(self.store.callback_url, job_id)
+            if callback_url:
+                await self._deliver(job_id, callback_url)
+
+    async def _deliver(self, job_id: str, callback_url: str) -> None:
+        """POST a finished job to its callback URL, retrying with backoff."""
+        # Checked again at delivery, as the host may resolve differently now
+        if not await self.callback_allowed(callback_url):
+            logger.warning("Not delivering job %s, callback host is not allowed", job_id)
+            JOB_CALLBACKS.labels(outcome="failed").inc()
+            await asyncio.to_thread(self.store.set_callback_status, job_id, "failed")
+            return
+
+        job = await asyncio.to_thread(self.store.get, job_id)
+        payload = json.loads(job.model_dump_json())
+        delay = CALLBACK_BACKOFF_SECONDS
+
+        for attempt in range(1, self.callback_retries + 1):
+            try:
+                response = await self._client.post(callback_url, json=payload)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(
+                    "Callback for job %s failed (attempt %d/%d): %s", job_id, attempt, self.callback_retries, e
+                )
+                if attempt < self.callback_retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+                continue
+
+            JOB_CALLBACKS.labels(outcome="delivered").inc()
+            await asyncio.to_thread(self.store.set_callback_status, job_id, "delivered")
+            return
+
+        JOB_CALLBACKS.labels(outcome="failed").inc()
+        await asyncio.to_thread(self.store.set_callback_status, job_id, "failed")
+
+
+def create_job_queue(settings: Settings) -> JobQueue:
+    """
+    Create the job queue configured in settings.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Configured JobQueue
+    """
+    store = JobStore(
+        settings.job_queue_sqlite_path,
+        lease_seconds=settings.job_lease_seconds,
+        retention_seconds=settings.job_retention_seconds
+    )
+    return JobQueue(
+        store,
+        workers=settings.job_workers,
+        callback_timeout=settings.job_callback_timeout_seconds,
+        callback_retries=settings.job_callback_retries,
+        max_attempts=settings.job_max_attempts,
+        callback_allowed_hosts=settings.job_callback_allowed_hosts
+    )
+
+
+# Singleton instance
+_job_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Get or create the job queue singleton.
+
+    Returns:
+        JobQueue instance
+    """
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = create_job_queue(get_settings())
+    return _job_queue
@@ -3,42 +3,199 @@ FastAPI application for the Python AI Agent service.
 Provides /analyze endpoint for Hebrew building ticket classification.
 """
 
-import logging
+import asyncio
+import contextlib
+import json
 import time
+from collections import Counter
 from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-from fastapi import FastAPI, Request
+import structlog
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from app.config import get_settings
-from app.schemas import AnalyzeRequest, AnalyzeResponse, HealthResponse
-from app.ai.langchain_agent import get_classifier
+from app.metrics import (
+    HTTP_REQUEST_LATENCY,
+    HTTP_REQUESTS,
+    STAGE_LATENCY,
+    monitor_event_loop_lag,
+    prepare_multiprocess_metrics,
+    record_classification,
+    render_metrics,
+)
+from app.schemas import (
+    AnalyzeRequest,
+    AnalyzeResponse,
+    HealthResponse,
+    JobAccepted,
+    JobStatus,
+    ReadinessResponse,
+)
+from app.jobs import get_job_queue
+from app.structured_logging import configure_logging, lazy
+from app.ai.cache import make_cache_key
+from app.ai.deadline import deadline_after
+from app.ai.incidents import get_incident_index
+from app.ai.media import MediaItem, get_media_fetcher
+from app.ai.langchain_agent import (
+    TicketClassifier,
+    get_classifier,
+    get_initialized_classifier,
+    load_llm_modules,
+    response_events,
+)
+from app.ai.rate_limiter import LLMOverloadedError
+from app.ai.rule_classifier import get_rule_classifier
+from app.ai.single_flight import get_single_flight, with_deadline
 
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger(__name__)
+configure_logging(get_settings())
+logger = structlog.stdlib.get_logger(__name__)
+
+# Background classifier warm-up in lazy startup mode
+_warmup_task: asyncio.Task | None = None
+_warmup_ms: int | None = None
+
+
+async def warm_up_classifier() -> None:
+    """Import the Gemini client off the event loop, then build the classifier."""
+    global _warmup_ms
+    start_time = time.perf_counter()
+    await asyncio.to_thread(load_llm_modules)
+    classifier = get_classifier()
+    if get_settings().llm_prewarm:
+        await classifier.prewarm()
+    _warmup_ms = int((time.perf_counter() - start_time) * 1000)
+    logger.info("TicketClassifier warmed up", warmup_ms=_warmup_ms)
+
+
+def request_deadline(*timeouts_ms: int | None) -> float | None:
+    """
+    Turn client timeouts into a deadline for the classification.
+    
+    Args:
+        *timeouts_ms: Timeouts sent by the client (header, body field), if any
+        
+    Returns:
+        time.monotonic() deadline for the shortest timeout given, or None
+        to use the configured default
+    """
+    given = [t for t in timeouts_ms if t is not None and t > 0]
+    if not given:
+        return None
+    return deadline_after(min(given) / 1000)
+
+
+async def fetch_media(request: AnalyzeRequest, deadline: float | None = None) -> list[MediaItem]:
+    """
+    Download and prepare a request's attachments, if media is enabled.
+    
+    Args:
+        request: AnalyzeRequest whose media_urls to fetch
+        deadline: time.monotonic() after which downloads are abandoned
+        
+    Returns:
+        Prepared images; attachments that could not be used are left out
+    """
+    if not request.media_urls or not get_settings().media_enabled:
+        return []
+    with STAGE_LATENCY.labels(stage="media").time():
+        return await get_media_fetcher().fetch_all(request.media_urls, deadline)
+
+
+def find_incident(request: AnalyzeRequest) -> AnalyzeResponse | None:
+    """
+    Answer a request from an open incident whose reports read the same.
+    
+    Args:
+        request: AnalyzeRequest to look up
+        
+    Returns:
+        The incident's classification marked as a duplicate, or None
+    """
+    settings = get_settings()
+    if not settings.incidents_enabled:
+        return None
+    # The photo may show a different problem than the text suggests
+    if request.media_urls and settings.media_enabled:
+        return None
+    return get_incident_index().match(request.building_id, request.message_text)
+
+
+def assign_incident(request: AnalyzeRequest, result: AnalyzeResponse) -> AnalyzeResponse:
+    """
+    Attach a classification to a matching open incident, or open a new one.
+    
+    Args:
+        request: AnalyzeRequest that was classified
+        result: Its classification
+        
+    Returns:
+        The classification with incident_id and duplicate set
+    """
+    if not get_settings().incidents_enabled:
+        return result
+    return get_incident_index().assign(request.building_id, request.message_text, result)
+
+
+async def get_ready_classifier() -> TicketClassifier:
+    """
+    Get the classifier, waiting for the background warm-up if it is running.
+    
+    Returns:
+        The classifier singleton
+    """
+    if _warmup_task is not None and not _warmup_task.done():
+        await asyncio.shield(_warmup_task)
+    return get_classifier()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
+    global _warmup_task, _warmup_ms
     # Startup
     logger.info("Python AI Agent service starting up...")
     settings = get_settings()
-    logger.info(f"Environment: {settings.environment}")
+    logger.info("Environment", environment=settings.environment)
     
-    # Pre-initialize the classifier
-    _ = get_classifier()
-    logger.info("TicketClassifier initialized")
+    if settings.startup_mode == "lazy":
+        # Serve /health right away; /ready flips once the warm-up is done
+        _warmup_task = asyncio.create_task(warm_up_classifier())
+    else:
+        # Pre-initialize the classifier and open its Gemini connections
+        start_time = time.perf_counter()
+        classifier = get_classifier()
+        if settings.llm_prewarm:
+            await classifier.prewarm()
+        _warmup_ms = int((time.perf_counter() - start_time) * 1000)
+        logger.info("TicketClassifier initialized")
+    
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    if settings.jobs_enabled:
+        get_job_queue().start(classify_request)
     
     yield
     
     # Shutdown
     logger.info("Python AI Agent service shutting down...")
+    if settings.jobs_enabled:
+        await get_job_queue().stop()
+    await get_media_fetcher().close()
+    classifier = get_initialized_classifier()
+    if classifier is not None:
+        await classifier.pool.close()
+    lag_monitor.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await lag_monitor
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _warmup_task
 
 
 # Create FastAPI app
@@ -60,67 +217,392 @@ app.add_middleware(
 
 
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all incoming requests."""
-    start_time = time.time()
-    
-    # Log request (without sensitive data)
-    logger.info(f"Request: {request.method} {request.url.path}")
+async def instrument_requests(request: Request, call_next):
+    """Record request counts and latency for all incoming requests."""
+    start_time = time.perf_counter()
     
     response = await call_next(request)
     
-    # Log response
-    process_time = (time.time() - start_time) * 1000
-    logger.info(f"Response: {response.status_code} - {process_time:.2f}ms")
+    # Label by route template rather than raw path to bound cardinality
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    duration = time.perf_counter() - start_time
+    HTTP_REQUEST_LATENCY.labels(method=request.method, path=path).observe(duration)
+    HTTP_REQUESTS.labels(method=request.method, path=path, status=str(response.status_code)).inc()
+    
+    logger.debug(
+        "Request handled",
+        method=request.method,
+        path=path,
+        status=response.status_code,
+        duration_ms=round(duration * 1000, 1)
+    )
     
     return response
 
 
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError) -> JSONResponse:
+    """Tell the caller to back off when the LLM queue is full."""
+    logger.warning("Rejecting request, LLM overloaded", path=request.url.path, retry_after=exc.retry_after)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI service is overloaded, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
     """
     Health check endpoint.
     
     Returns:
-        HealthResponse with service status
+        HealthResponse with service status, cache and coalescing statistics
+    """
+    # Never build the classifier here, so health checks answer during warm-up
+    classifier = get_initialized_classifier()
+    cache = classifier.cache if classifier is not None else None
+    return HealthResponse(
+        cache=cache.stats() if cache is not None else None,
+        coalesced_requests=get_single_flight().coalesced,
+        fast_path=get_rule_classifier().stats() if get_settings().fast_path_enabled else None,
+        llm_pool=classifier.pool.stats() if classifier is not None else None,
+        incidents=get_incident_index().stats() if get_settings().incidents_enabled else None
+    )
+
+
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check() -> JSONResponse:
+    """
+    Readiness endpoint: 200 once the classifier is warmed up and its Gemini
+    connections are open, 503 before.
+    
+    Returns:
+        ReadinessResponse with the startup mode and warm-up time
     """
-    return HealthResponse()
+    ready = _warmup_ms is not None
+    body = ReadinessResponse(
+        ready=ready,
+        startup_mode=get_settings().startup_mode,
+        warmup_ms=_warmup_ms
+    )
+    return JSONResponse(status_code=200 if ready else 503, content=body.model_dump())
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_message(request: AnalyzeRequest) -> AnalyzeResponse:
+@app.get("/metrics")
+async def metrics() -> Response:
+    """
+    Prometheus metrics endpoint.
+    
+    Returns:
+        Metrics in the Prometheus text exposition format
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.post(
+    "/analyze",
+    response_model=AnalyzeResponse,
+    responses={202: {"model": JobAccepted, "description": "Queued as a background job"}}
+)
+async def analyze_message(
+    request: AnalyzeRequest,
+    run_async: bool = Query(default=False, alias="async", description="Queue the request and poll /jobs/{id}"),
+    x_request_timeout_ms: int | None = Header(default=None, description="How long the caller waits, in ms")
+) -> AnalyzeResponse | JSONResponse:
     """
     Analyze a Hebrew WhatsApp message and classify it into a structured ticket.
     
+    With a callback_url in the body, or ?async=true, the request is queued
+    and answered with 202 right away; the result is POSTed to callback_url
+    and can be polled at /jobs/{job_id}. Otherwise the LLM call is cancelled
+    once the client's timeout passes, and a fallback is returned.
+    
     Args:
         request: AnalyzeRequest containing building_id, resident info, and message
+        run_async: Queue the request even without a callback_url
+        x_request_timeout_ms: Client timeout header, the shorter of it and
+            request.timeout_ms applies
         
     Returns:
-        AnalyzeResponse with classified ticket_type, location, and normalized summary
+        AnalyzeResponse with classified ticket_type, location, and normalized summary,
+        or a 202 JobAccepted response for queued requests
     """
-    logger.info(f"Analyzing message for building: {request.building_id}")
-    logger.info(f"Resident: {request.resident.name} ({request.resident.phone})")
-    logger.info(f"Message length: {len(request.message_text)} chars")
+    logger.info(
+        "Analyzing message",
+        building_id=request.building_id,
+        message_chars=len(request.message_text),
+        media=len(request.media_urls)
+    )
     
-    # Get classifier and process
-    classifier = get_classifier()
-    result = await classifier.classify(
-        message_text=request.message_text,
-        building_id=request.building_id
+    if request.callback_url or run_async:
+        if not get_settings().jobs_enabled:
+            raise HTTPException(status_code=400, detail="Background jobs are disabled (JOBS_ENABLED=false)")
+        
+        job_queue = get_job_queue()
+        if request.callback_url and not await job_queue.callback_allowed(request.callback_url):
+            raise HTTPException(status_code=422, detail="callback_url host is not allowed")
+        
+        job_id = await job_queue.submit(request, request.callback_url)
+        logger.info("Queued job", job_id=job_id)
+        body = JobAccepted(job_id=job_id, status_url=f"/jobs/{job_id}")
+        return JSONResponse(status_code=202, content=body.model_dump(), headers={"Location": body.status_url})
+    
+    return await classify_request(request, request_deadline(x_request_timeout_ms, request.timeout_ms))
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str) -> JobStatus:
+    """
+    Get the status, and once done the result, of a queued analyze job.
+    
+    Args:
+        job_id: ID returned in the 202 response
+        
+    Returns:
+        JobStatus for the job
+    """
+    if not get_settings().jobs_enabled:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job = await asyncio.to_thread(get_job_queue().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def classify_request(request: AnalyzeRequest, deadline: float | None = None) -> AnalyzeResponse:
+    """
+    Classify one request: open incidents and the fast path first, then
+    attachments are fetched and the LLM call is shared with identical
+    requests.
+    
+    Args:
+        request: AnalyzeRequest to classify
+        deadline: time.monotonic() by which the caller needs the answer;
+            the call is only shared with identical requests whose deadline
+            is in the same one-second bucket
+        
+    Returns:
+        AnalyzeResponse for the message
+    """
+    # Another report of an open incident gets that incident's classification
+    duplicate = find_incident(request)
+    if duplicate is not None:
+        logger.info("Duplicate report, skipping the LLM", incident_id=duplicate.incident_id)
+        record_classification(duplicate)
+        return duplicate
+    
+    # Obvious messages are answered locally, without the LLM
+    if get_settings().fast_path_enabled:
+        result = get_rule_classifier().classify(request.message_text)
+        if result is not None:
+            result = assign_incident(request, result)
+            logger.info(
+                "Fast-path result",
+                ticket_type=result.ticket_type,
+                location=result.location,
+                confidence=result.confidence,
+                incident_id=result.incident_id
+            )
+            record_classification(result)
+            return result
+    
+    # Get classifier and process, sharing the call with identical in-flight requests
+    media = await fetch_media(request, deadline)
+    classifier = await get_ready_classifier()
+    deadline = deadline or deadline_after(classifier.llm_timeout)
+    result = await get_single_flight().do(
+        with_deadline(
+            make_cache_key(request.message_text, request.building_id, [item.sha256 for item in media]),
+            deadline
+        ),
+        lambda: classifier.classify(
+            message_text=request.message_text,
+            building_id=request.building_id,
+            deadline=deadline,
+            media=media
+        )
     )
+    if result.original_text != request.message_text:
+        result = result.model_copy(update={"original_text": request.message_text})
+    result = assign_incident(request, result)
     
-    logger.info(f"Classification result: type={result.ticket_type}, location={result.location}, confidence={result.confidence}")
+    logger.info(
+        "Classification result",
+        ticket_type=result.ticket_type,
+        location=result.location,
+        confidence=result.confidence,
+        model=result.model_metadata.model,
+        incident_id=result.incident_id,
+        duplicate=result.duplicate
+    )
+    record_classification(result)
     
     return result
 
 
+@app.post("/analyze/stream")
+async def analyze_message_stream(
+    request: AnalyzeRequest,
+    x_request_timeout_ms: int | None = Header(default=None, description="How long the caller waits, in ms")
+) -> StreamingResponse:
+    """
+    Analyze a message, streaming partial results as newline-delimited JSON.
+    
+    Emits {"event": "field", ...} lines for ticket_type and location as soon
+    as they are known, then a final {"event": "result", "data": ...} line
+    holding the same AnalyzeResponse as /analyze.
+    
+    Args:
+        request: AnalyzeRequest containing building_id, resident info, and message
+        x_request_timeout_ms: Client timeout header
+        
+    Returns:
+        StreamingResponse with application/x-ndjson content
+    """
+    logger.info("Streaming analysis", building_id=request.building_id, message_chars=len(request.message_text))
+    deadline = request_deadline(x_request_timeout_ms, request.timeout_ms)
+    
+    async def events() -> AsyncIterator[dict[str, Any]]:
+        duplicate = find_incident(request)
+        if duplicate is not None:
+            for event in response_events(duplicate):
+                yield event
+            return
+        
+        if get_settings().fast_path_enabled:
+            result = get_rule_classifier().classify(request.message_text)
+            if result is not None:
+                for event in response_events(assign_incident(request, result)):
+                    yield event
+                return
+        
+        media = await fetch_media(request, deadline)
+        classifier = await get_ready_classifier()
+        async for event in classifier.classify_stream(
+            message_text=request.message_text,
+            building_id=request.building_id,
+            deadline=deadline,
+            media=media
+        ):
+            if event["event"] == "result":
+                result = assign_incident(request, AnalyzeResponse(**event["data"]))
+                event = {"event": "result", "data": result.model_dump()}
+            yield event
+    
+    async def ndjson() -> AsyncIterator[str]:
+        async for event in events():
+            if event["event"] == "result":
+                record_classification(AnalyzeResponse(**event["data"]))
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.post("/analyze/batch", response_model=list[AnalyzeResponse])
+async def analyze_batch(
+    requests: list[AnalyzeRequest],
+    x_request_timeout_ms: int | None = Header(default=None, description="How long the caller waits, in ms")
+) -> list[AnalyzeResponse]:
+    """
+    Analyze several Hebrew WhatsApp messages, packing them into chunked LLM calls.
+    
+    Args:
+        requests: List of AnalyzeRequest payloads
+        x_request_timeout_ms: Client timeout header for the whole batch
+        
+    Returns:
+        List of AnalyzeResponse, in the same order as the requests
+    """
+    settings = get_settings()
+    if len(requests) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(requests)} items (max {settings.batch_max_items})"
+        )
+    
+    logger.info("Analyzing batch", messages=len(requests))
+    
+    # Reports of open incidents and obvious messages are answered locally,
+    # the rest go to the LLM
+    results: list[AnalyzeResponse | None] = [find_incident(request) for request in requests]
+    duplicates = {i for i, result in enumerate(results) if result is not None}
+    if settings.fast_path_enabled:
+        rule_classifier = get_rule_classifier()
+        results = [
+            result or rule_classifier.classify(request.message_text)
+            for request, result in zip(requests, results)
+        ]
+    
+    deadline = request_deadline(x_request_timeout_ms)
+    pending = [i for i, result in enumerate(results) if result is None]
+    
+    # Messages with photos need their own multimodal call
+    with_media = []
+    if settings.media_enabled:
+        with_media = [i for i in pending if requests[i].media_urls]
+        pending = [i for i in pending if not requests[i].media_urls]
+    
+    if pending or with_media:
+        classifier = await get_ready_classifier()
+        classified, classified_with_media = await asyncio.gather(
+            classifier.classify_batch(
+                [(requests[i].message_text, requests[i].building_id) for i in pending],
+                deadline
+            ),
+            asyncio.gather(*(classify_media_request(classifier, requests[i], deadline) for i in with_media))
+        )
+        for i, result in zip(pending + with_media, classified + list(classified_with_media)):
+            results[i] = result
+    
+    # In request order, so repeats within the batch join the first report's incident
+    for i, request in enumerate(requests):
+        if i not in duplicates:
+            results[i] = assign_incident(request, results[i])
+    
+    logger.info(
+        "Batch classification complete",
+        results=len(results),
+        ticket_types=lazy(lambda: dict(Counter(result.ticket_type for result in results)))
+    )
+    for request, result in zip(requests, results):
+        record_classification(result)
+    
+    return results
+
+
+async def classify_media_request(
+    classifier: TicketClassifier,
+    request: AnalyzeRequest,
+    deadline: float | None
+) -> AnalyzeResponse:
+    """Classify one batch entry together with its attachments."""
+    media = await fetch_media(request, deadline)
+    return await classifier.classify(
+        message_text=request.message_text,
+        building_id=request.building_id,
+        deadline=deadline,
+        media=media
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     
     settings = get_settings()
+    if settings.workers > 1:
+        prepare_multiprocess_metrics(settings.metrics_multiproc_dir)
+        logger.info("Starting workers with shared cache, rate limit and metrics", workers=settings.workers)
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.environment == "development"
+        workers=settings.workers,
+        # Reload runs a single process, so it only applies to one worker
+        reload=settings.environment == "development" and settings.workers <= 1,
+        # Keep the queued logging configured at import instead of uvicorn's
+        log_config=None
     )
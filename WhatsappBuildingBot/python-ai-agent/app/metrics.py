@@ -0,0 +1,186 @@
+"""
+Prometheus metrics for the Python AI Agent service.
+
+Classification latency is split into stages (prompt build, queue wait,
+LLM call, parse, validation) so a slow p99 can be traced to Gemini, JSON
+parsing or the event loop. Exposed in text format on /metrics.
+
+With several workers, PROMETHEUS_MULTIPROC_DIR must be set before this
+module is imported; each worker then writes its samples there and
+/metrics aggregates all of them.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from app.schemas import AnalyzeResponse
+
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests handled",
+    ["method", "path", "status"]
+)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "path"],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_LATENCY = Histogram(
+    "classification_stage_duration_seconds",
+    "Classification latency by stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+PARSE_RESULTS = Counter(
+    "classification_parse_total",
+    "LLM responses parsed, by outcome",
+    ["outcome"]
+)
+
+FALLBACKS = Counter(
+    "classification_fallbacks_total",
+    "Fallback classifications returned, by reason",
+    ["reason"]
+)
+
+ESCALATIONS = Counter(
+    "classification_escalations_total",
+    "Classifications escalated to a stronger model tier, by target model",
+    ["model"]
+)
+
+CLASSIFICATIONS = Counter(
+    "classifications_total",
+    "Classifications returned, by ticket type and source",
+    ["ticket_type", "source"]
+)
+
+HEDGED_CALLS = Counter(
+    "llm_hedged_calls_total",
+    "Backup LLM calls for slow requests, by outcome (sent, won, no_budget)",
+    ["outcome"]
+)
+
+JOBS = Counter(
+    "analyze_jobs_total",
+    "Background analyze jobs finished, by status",
+    ["status"]
+)
+
+JOB_CALLBACKS = Counter(
+    "analyze_job_callbacks_total",
+    "Background job results posted to callback URLs, by outcome",
+    ["outcome"]
+)
+
+MEDIA_FETCHES = Counter(
+    "media_fetches_total",
+    "Attachments requested, by outcome (fetched, cache_hit, too_large, unsupported, rejected, error)",
+    ["outcome"]
+)
+
+INCIDENT_REPORTS = Counter(
+    "incident_reports_total",
+    "Classified reports by incident outcome (opened, attached, skipped_llm)",
+    ["outcome"]
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records not written, by reason (sampled, queue_full)",
+    ["reason"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled event loop wakeup and when it ran",
+    buckets=STAGE_BUCKETS
+)
+
+
+def record_classification(response: AnalyzeResponse) -> None:
+    """
+    Count a returned classification by ticket type and source.
+
+    Not by building: building_id comes from the request body, and each
+    value would add a time series.
+
+    Args:
+        response: The classification returned to the caller
+    """
+    metadata = response.model_metadata
+    if metadata.model == "rule-based":
+        source = "rule"
+    elif metadata.model == "incident":
+        source = "incident"
+    elif metadata.cache_hit:
+        source = "cache"
+    else:
+        source = "llm"
+
+    CLASSIFICATIONS.labels(ticket_type=response.ticket_type, source=source).inc()
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Sample event loop lag until cancelled.
+
+    Args:
+        interval: Seconds between samples
+    """
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - expected))
+
+
+def prepare_multiprocess_metrics(path: str) -> str:
+    """
+    Set up a clean multiprocess metrics directory for worker processes.
+
+    Must run in the parent before workers start, as the environment
+    variable is read when prometheus_client is imported. An existing
+    PROMETHEUS_MULTIPROC_DIR takes precedence over path.
+
+    Args:
+        path: Directory for the per-process metric files
+
+    Returns:
+        The directory in use
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or path
+    # Samples left by a previous run would be added to this one's
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        (body, content type) for the /metrics response
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Aggregate the samples written by every worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -18,12 +18,27 @@ class AnalyzeRequest(BaseModel):
     resident: ResidentInfo = Field(..., description="Resident information")
     message_text: str = Field(..., description="Raw message text from WhatsApp")
     media_urls: list[str] = Field(default_factory=list, description="List of media URLs attached to the message")
+    timeout_ms: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="How long the caller waits for the answer; the LLM call is cancelled after it"
+    )
+    callback_url: Optional[str] = Field(
+        default=None,
+        description="If set, answer 202 and POST the result here when the job finishes"
+    )
 
 
 class ModelMetadata(BaseModel):
     """Metadata about the AI model used for analysis."""
     model: str = Field(..., description="Model name used for classification")
     latency_ms: int = Field(..., description="Processing latency in milliseconds")
+    cache_hit: bool = Field(default=False, description="Whether the result was served from the cache")
+    cached_latency_ms: Optional[int] = Field(
+        default=None,
+        description="Latency of the original LLM call, when served from the cache"
+    )
+    tier: int = Field(default=0, description="Model routing tier that answered (0 = first, cheapest)")
 
 
 class AnalyzeResponse(BaseModel):
@@ -35,6 +50,66 @@ class AnalyzeResponse(BaseModel):
     language: str = Field(default="he", description="Detected language code")
     confidence: float = Field(..., ge=0.0, le=1.0, description="Classification confidence score")
     model_metadata: ModelMetadata = Field(..., description="Model metadata")
+    incident_id: Optional[str] = Field(default=None, description="Open incident this report belongs to")
+    duplicate: bool = Field(
+        default=False,
+        description="Whether the incident was already reported; no new ticket is needed"
+    )
+
+
+class JobAccepted(BaseModel):
+    """Response for an /analyze request queued as a background job."""
+    job_id: str = Field(..., description="ID of the queued job")
+    status: str = Field(default="queued", description="Job status")
+    status_url: str = Field(..., description="Where to poll the job status")
+
+
+class JobStatus(BaseModel):
+    """Status of a background analyze job, also the callback payload."""
+    job_id: str = Field(..., description="ID of the job")
+    status: str = Field(..., description="queued, running, done or failed")
+    result: Optional[AnalyzeResponse] = Field(default=None, description="Classification, once done")
+    error: Optional[str] = Field(default=None, description="Error message, if failed")
+    callback_status: Optional[str] = Field(
+        default=None,
+        description="pending, delivered or failed; None without a callback_url"
+    )
+    attempts: int = Field(default=0, description="Times the job was picked up by a worker")
+    created_at: float = Field(..., description="Unix time the job was queued")
+    updated_at: float = Field(..., description="Unix time of the last status change")
+
+
+class CacheStats(BaseModel):
+    """Classification cache statistics."""
+    backend: str = Field(..., description="Cache backend name")
+    size: int = Field(..., description="Number of cached entries")
+    hits: int = Field(..., description="Cache hits since startup")
+    misses: int = Field(..., description="Cache misses since startup")
+
+
+class FastPathStats(BaseModel):
+    """Rule-based fast-path statistics."""
+    attempts: int = Field(..., description="Messages tried on the fast path")
+    hits: int = Field(..., description="Messages answered without the LLM")
+    hit_rate: float = Field(..., description="Share of messages answered without the LLM")
+
+
+class IncidentStats(BaseModel):
+    """Incident clustering statistics."""
+    buildings: int = Field(..., description="Buildings with tracked incidents")
+    open_incidents: int = Field(..., description="Incidents still within their window")
+    duplicates: int = Field(..., description="Reports attached to an open incident since startup")
+    skipped_llm: int = Field(..., description="Duplicates answered without the LLM")
+
+
+class ProviderPoolStats(BaseModel):
+    """Gemini connection pool statistics."""
+    size: int = Field(..., description="Number of HTTP/2 connections")
+    states: list[str] = Field(..., description="Connectivity state of each connection")
+    in_flight: int = Field(..., description="Calls currently running")
+    peak_in_flight: int = Field(..., description="Most calls running at once since startup")
+    calls: int = Field(..., description="Calls made since startup")
+    prewarm_ms: Optional[int] = Field(default=None, description="Time the startup prewarm took")
 
 
 class HealthResponse(BaseModel):
@@ -42,3 +117,15 @@ class HealthResponse(BaseModel):
     status: str = Field(default="healthy")
     service: str = Field(default="python-ai-agent")
     version: str = Field(default="1.0.0")
+    cache: Optional[CacheStats] = Field(default=None, description="Classification cache statistics")
+    coalesced_requests: int = Field(default=0, description="Requests that joined an identical in-flight classification")
+    fast_path: Optional[FastPathStats] = Field(default=None, description="Rule-based fast-path statistics")
+    llm_pool: Optional[ProviderPoolStats] = Field(default=None, description="Gemini connection pool statistics")
+    incidents: Optional[IncidentStats] = Field(default=None, description="Incident clustering statistics")
+
+
+class ReadinessResponse(BaseModel):
+    """Response for the readiness endpoint."""
+    ready: bool = Field(..., description="Whether the classifier is warmed up")
+    startup_mode: str = Field(..., description="eager or lazy")
+    warmup_ms: Optional[int] = Field(default=None, description="Time the classifier warm-up took")
@@ -0,0 +1,239 @@
+"""
+Non-blocking, structured logging for the service.
+
+Writing log lines to stdout from the event loop blocks it whenever the
+pipe is slow, which shows up directly in request latency. Here every
+logger (the app's, libraries' and uvicorn's) only puts records on a
+bounded in-memory queue. A background thread formats them (structlog, as
+text or JSON), redacts phone numbers and e-mail addresses, shortens long
+values and writes them out. Sampling drops a configurable share of
+records per level before they are queued. Structured fields wrapped in
+lazy() are only computed for records that are actually written.
+"""
+
+import atexit
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from typing import Any, Callable
+
+import structlog
+
+from app.config import Settings
+from app.metrics import LOG_RECORDS_DROPPED
+
+
+# Loggers that come with their own handlers and are rerouted to ours
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Field names whose values are always redacted
+REDACTED_FIELDS = {"phone", "resident", "resident_name", "name", "password", "api_key", "token", "authorization"}
+
+REDACTED = "[redacted]"
+
+_PHONE_RE = re.compile(r"(?<![\w+])(?:\+?972[- ]?|0)5\d(?:[- ]?\d){7}(?!\d)")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+_configured = False
+
+
+class Lazy:
+    """A log field computed only if the record is written, in the log thread."""
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+
+def lazy(fn: Callable[[], Any]) -> Lazy:
+    """
+    Wrap an expensive log field so it is only computed when written.
+
+    The function runs on the logging thread, so it must only read data
+    that does not change after the log call.
+
+    Args:
+        fn: Computes the field value
+
+    Returns:
+        Value to pass as a structured log field
+    """
+    return Lazy(fn)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records when the queue is full, never blocking."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler formats the message here, on the caller's
+        # thread; records stay in-process, so all of it is left to the
+        # listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(reason="queue_full").inc()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured share of the records of each level."""
+
+    def __init__(self, rates: dict[int, float]):
+        """
+        Initialize the filter.
+
+        Args:
+            rates: Share of records kept per level number; levels not listed
+                are kept in full
+        """
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        if rate is None or random.random() < rate:
+            return True
+        LOG_RECORDS_DROPPED.labels(reason="sampled").inc()
+        return False
+
+
+def parse_sample_rates(spec: str) -> dict[int, float]:
+    """
+    Parse per-level sample rates.
+
+    Args:
+        spec: Comma-separated LEVEL=rate pairs, e.g. "DEBUG=0.01,INFO=0.2"
+
+    Returns:
+        Share of records kept per level number
+    """
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def _capture_exc_info(logger: Any, method_name: str, event_dict: dict[str, Any]) -> dict[str, Any]:
+    """Resolve exc_info=True while still on the thread handling the exception."""
+    if event_dict.get("exc_info") is True:
+        event_dict["exc_info"] = sys.exc_info()
+    return event_dict
+
+
+def _add_record_fields(logger: Any, method_name: str, event_dict: dict[str, Any]) -> dict[str, Any]:
+    """Add time, level and logger name from the original log record."""
+    record = event_dict["_record"]
+    event_dict["timestamp"] = datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+    event_dict["level"] = record.levelname.lower()
+    event_dict["logger"] = record.name
+    return event_dict
+
+
+def _evaluate_lazy(logger: Any, method_name: str, event_dict: dict[str, Any]) -> dict[str, Any]:
+    """Compute the fields wrapped in lazy()."""
+    for key, value in event_dict.items():
+        if isinstance(value, Lazy):
+            try:
+                event_dict[key] = value.fn()
+            except Exception as e:
+                event_dict[key] = f"<error: {e!r}>"
+    return event_dict
+
+
+def redact_text(text: str) -> str:
+    """Mask phone numbers and e-mail addresses in a string."""
+    return _EMAIL_RE.sub(REDACTED, _PHONE_RE.sub(REDACTED, text))
+
+
+def _redact_pii(logger: Any, method_name: str, event_dict: dict[str, Any]) -> dict[str, Any]:
+    """Redact sensitive fields and phone numbers or e-mails in any string field."""
+    for key, value in event_dict.items():
+        if key.startswith("_"):
+            continue
+        if key in REDACTED_FIELDS:
+            event_dict[key] = REDACTED
+        elif isinstance(value, str):
+            event_dict[key] = redact_text(value)
+    return event_dict
+
+
+def _truncator(max_chars: int) -> Callable[[Any, str, dict[str, Any]], dict[str, Any]]:
+    """Build a processor that shortens string fields longer than max_chars."""
+    def truncate(logger: Any, method_name: str, event_dict: dict[str, Any]) -> dict[str, Any]:
+        for key, value in event_dict.items():
+            if key != "exception" and isinstance(value, str) and len(value) > max_chars:
+                event_dict[key] = f"{value[:max_chars]}... ({len(value) - max_chars} more chars)"
+        return event_dict
+    return truncate
+
+
+def configure_logging(settings: Settings) -> None:
+    """
+    Route all logging through the queue and structlog formatter.
+
+    Safe to call more than once; only the first call takes effect.
+
+    Args:
+        settings: Application settings
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    processors: list[Any] = [_add_record_fields, _evaluate_lazy]
+    if settings.log_redact_pii:
+        processors.append(_redact_pii)
+    processors += [
+        _truncator(settings.log_max_field_chars),
+        structlog.processors.format_exc_info,
+        structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+    ]
+    if settings.log_format == "json":
+        processors.append(structlog.processors.JSONRenderer(ensure_ascii=False))
+    else:
+        processors.append(structlog.dev.ConsoleRenderer(colors=False))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(structlog.stdlib.ProcessorFormatter(processors=processors))
+
+    if settings.log_async:
+        handler: logging.Handler = DroppingQueueHandler(queue.Queue(settings.log_queue_size))
+        listener = logging.handlers.QueueListener(handler.queue, output)
+        listener.start()
+        # Flush what is still queued at exit
+        atexit.register(listener.stop)
+    else:
+        handler = output
+
+    rates = parse_sample_rates(settings.log_sample_rates)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level.upper())
+    # uvicorn's CLI installs its own handlers before the app is imported
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            _capture_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
@@ -0,0 +1,73 @@
+"""
+Checks for URLs supplied by callers (job callbacks, media attachments).
+"""
+
+import asyncio
+import ipaddress
+import socket
+from urllib.parse import urlparse
+
+
+def host_listed(hostname: str, allowed_hosts: str) -> bool:
+    """
+    Check a host name against an allow-list.
+
+    Args:
+        hostname: Host name from a URL
+        allowed_hosts: Comma-separated host names; "*.example.com" matches
+            any subdomain of example.com
+
+    Returns:
+        True if the host is in the list
+    """
+    hostname = hostname.lower().rstrip(".")
+    for host in allowed_hosts.split(","):
+        host = host.strip().lower()
+        if not host:
+            continue
+        if host.startswith("*."):
+            if hostname.endswith(host[1:]):
+                return True
+        elif hostname == host:
+            return True
+    return False
+
+
+def url_allowed(url: str, allowed_hosts: str) -> bool:
+    """
+    Check a caller-supplied URL against a host allow-list.
+
+    Args:
+        url: URL from the request
+        allowed_hosts: Comma-separated host names, as in host_listed(); empty
+            allows any host
+
+    Returns:
+        True if the URL is http(s) and its host is allowed
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    return not allowed_hosts.strip() or host_listed(parsed.hostname, allowed_hosts)
+
+
+async def resolves_to_public(hostname: str) -> bool:
+    """
+    Check that a host resolves only to publicly routable addresses.
+
+    Keeps caller-supplied URLs away from loopback, private, link-local
+    (cloud metadata) and other internal addresses.
+
+    Args:
+        hostname: Host name or IP address from a URL
+
+    Returns:
+        False if the host does not resolve or any of its addresses is internal
+    """
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(infos) and all(
+        ipaddress.ip_address(str(info[4][0]).split("%")[0]).is_global for info in infos
+    )
@@ -0,0 +1,114 @@
+"""
+Local stand-in for ChatGoogleGenerativeAI, for benchmarks without network access.
+
+Answers classification prompts with plausible JSON after a configurable
+latency, and fails or returns malformed output at configurable rates.
+Inject it with TicketClassifier(llm=FakeChatModel(...)).
+"""
+
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from app.config import LOCATIONS, TICKET_TYPES
+
+
+# Matches the per-call tail of the batch prompt
+BATCH_COUNT_PATTERN = re.compile(r"בדיוק (\d+) אובייקטים")
+
+
+class FakeLLMError(Exception):
+    """Simulated provider error, carrying an HTTP-like status code."""
+
+    def __init__(self, code: int):
+        """
+        Initialize the error.
+
+        Args:
+            code: Simulated HTTP status, e.g. 429 or 500
+        """
+        super().__init__(f"Simulated LLM error {code}")
+        self.code = code
+
+
+@dataclass
+class FakeChatModel:
+    """
+    Chat model stand-in with configurable latency and failure rates.
+    """
+    latency_ms: float = 800.0  # Median call latency
+    jitter: float = 0.5  # Log-normal sigma; 0 gives a constant latency
+    error_rate: float = 0.0  # Share of calls raising a 500
+    throttle_rate: float = 0.0  # Share of calls raising a 429
+    malformed_rate: float = 0.0  # Share of calls returning broken JSON
+    stream_chunk_size: int = 16  # Characters per astream chunk
+    seed: int | None = None
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self.calls = 0
+
+    async def ainvoke(self, messages: list[BaseMessage], **kwargs) -> AIMessage:
+        """
+        Simulate a model call.
+
+        Args:
+            messages: Chat messages; the last one holds the prompt
+
+        Returns:
+            AIMessage with the simulated response
+        """
+        return AIMessage(content=await self._respond(messages))
+
+    async def astream(self, messages: list[BaseMessage], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        """
+        Simulate a streaming model call, chunking the response text.
+
+        Args:
+            messages: Chat messages; the last one holds the prompt
+
+        Yields:
+            AIMessageChunk pieces of the simulated response
+        """
+        content = await self._respond(messages)
+        for start in range(0, len(content), self.stream_chunk_size):
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=content[start:start + self.stream_chunk_size])
+
+    async def _respond(self, messages: list[BaseMessage]) -> str:
+        """Sleep for the simulated latency, then fail or build a response."""
+        self.calls += 1
+        latency = self.latency_ms * self._random.lognormvariate(0, self.jitter) if self.jitter else self.latency_ms
+        await asyncio.sleep(latency / 1000)
+
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            raise FakeLLMError(429)
+        if roll < self.throttle_rate + self.error_rate:
+            raise FakeLLMError(500)
+
+        match = BATCH_COUNT_PATTERN.search(str(messages[-1].content))
+        if match:
+            payload: object = [dict(self._classification(), index=i) for i in range(int(match.group(1)))]
+        else:
+            payload = self._classification()
+        content = json.dumps(payload, ensure_ascii=False)
+
+        if self._random.random() < self.malformed_rate:
+            # Truncated output, as when the model stops mid-object
+            return content[:len(content) // 2]
+        return f"```json\n{content}\n```"
+
+    def _classification(self) -> dict:
+        """Build one random but valid classification."""
+        return {
+            "ticket_type": self._random.choice(TICKET_TYPES),
+            "location": self._random.choice(LOCATIONS),
+            "normalized_summary": "דווח על תקלה בבניין, נדרש טיפול.",
+            "confidence": round(self._random.uniform(0.5, 0.99), 2)
+        }
@@ -0,0 +1,258 @@
+"""
+Load-test driver for the /analyze endpoint.
+
+By default the app runs in-process with FakeChatModel standing in for
+Gemini, so it needs neither network access nor an API key and can run in
+CI. Pass --url to load-test a running service instead.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1,8,32 --requests 200
+    python -m benchmarks.load_test --no-cache --fast-path --latency-ms 1500
+    python -m benchmarks.load_test --incidents both
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+import httpx
+
+
+# Mix of obvious (fast-path) and ambiguous messages
+SAMPLE_MESSAGES = [
+    "נורה שרופה בלובי",
+    "המעלית תקועה!!!",
+    "נזילה בקומה 7",
+    "גועל נפש בלובי!!! מסריח פה! מנקה דחוףףף!",
+    "יש ג'וקים בחדר האשפה",
+    "משהו לא בסדר עם הדלת של הכניסה, לא נסגרת כמו שצריך",
+    "מישהו חונה לי בחניה כבר יומיים",
+    "יש רעש מוזר מהגג כל הלילה",
+    "האינטרקום לא עובד, אי אפשר לפתוח לשליחים",
+    "הממטרות בגינה לא עובדות והדשא מתייבש",
+    "יש ריח של שריפה ליד לוח החשמל",
+    "שכן מהקומה השלישית משאיר עגלה במעבר",
+]
+
+
+@dataclass
+class LevelResult:
+    """Results for one concurrency level."""
+    concurrency: int
+    incidents: bool | None  # None when testing a running service
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_rss_mb: float
+    peak_traced_mb: float | None
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process, in megabytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def build_payload(rng: random.Random, unique_ratio: float, index: int) -> dict:
+    """Build an /analyze request, making a share of messages unique."""
+    message = rng.choice(SAMPLE_MESSAGES)
+    if rng.random() < unique_ratio:
+        message = f"{message} ({index})"
+    return {
+        "building_id": f"building-{rng.randint(1, 5)}",
+        "resident": {"name": "דייר", "phone": "0500000000"},
+        "message_text": message,
+        "media_urls": []
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    total: int,
+    unique_ratio: float,
+    seed: int,
+    incidents: bool | None = None
+) -> LevelResult:
+    """
+    Send total requests with at most concurrency in flight.
+
+    Args:
+        client: HTTP client bound to the app or a running service
+        concurrency: Requests in flight at once
+        total: Number of requests to send
+        unique_ratio: Share of messages made unique (cache misses)
+        seed: Random seed for the message mix
+        incidents: Whether incident clustering was on, for the report
+
+    Returns:
+        LevelResult with throughput, latency percentiles and memory
+    """
+    rng = random.Random(seed)
+    payloads = [build_payload(rng, unique_ratio, i) for i in range(total)]
+    latencies: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < total:
+            payload = payloads[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post("/analyze", json=payload)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return LevelResult(
+        concurrency=concurrency,
+        incidents=incidents,
+        requests=total,
+        errors=errors,
+        throughput_rps=round(total / elapsed, 2),
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        p99_ms=round(percentile(latencies, 99), 2),
+        max_rss_mb=round(max_rss_mb(), 1),
+        peak_traced_mb=round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1) if tracing else None
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Load-test the /analyze endpoint")
+    parser.add_argument("--url", help="Base URL of a running service (default: in-process with a fake LLM)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--unique-ratio", type=float, default=0.5, help="Share of unique messages (cache misses)")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Fake LLM median latency")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Fake LLM log-normal latency sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake LLM share of 500 errors")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fake LLM share of 429 errors")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fake LLM share of malformed JSON")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the classification cache")
+    parser.add_argument("--fast-path", action="store_true", help="Enable the rule-based fast path (off by default)")
+    parser.add_argument(
+        "--incidents",
+        choices=["off", "on", "both"],
+        default="off",
+        help="Incident clustering; it answers repeated messages without the pipeline, so \"both\" shows its share"
+    )
+    parser.add_argument("--trace-memory", action="store_true", help="Track Python allocations with tracemalloc")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    """Run the load test at each concurrency level and print a report."""
+    args = parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    if args.url:
+        client_factory = lambda: httpx.AsyncClient(base_url=args.url, timeout=120)
+        reset_app = lambda incidents: None
+        variants: list[bool | None] = [None]
+    else:
+        # Settings are read once, so configure them before importing the app
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+        if args.no_cache:
+            os.environ["CACHE_BACKEND"] = "none"
+        if args.fast_path:
+            os.environ["FAST_PATH_ENABLED"] = "true"
+
+        from app.main import app
+        from app.ai import incidents as incident_index, langchain_agent
+        from app.config import get_settings
+        from benchmarks.fake_llm import FakeChatModel
+
+        # Per-request log lines would dominate the measurement
+        logging.getLogger().setLevel(logging.WARNING)
+
+        variants = {"off": [False], "on": [True], "both": [False, True]}[args.incidents]
+
+        def reset_app(incidents: bool) -> None:
+            # Fresh incident index and classifier per level, so open
+            # incidents, caches and limits start cold
+            get_settings().incidents_enabled = incidents
+            incident_index._incident_index = None
+            langchain_agent._classifier = langchain_agent.TicketClassifier(llm=FakeChatModel(
+                latency_ms=args.latency_ms,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+                throttle_rate=args.throttle_rate,
+                malformed_rate=args.malformed_rate,
+                seed=args.seed
+            ))
+
+        transport = httpx.ASGITransport(app=app)
+        client_factory = lambda: httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    for concurrency in levels:
+        for incidents in variants:
+            reset_app(incidents)
+            async with client_factory() as client:
+                results.append(
+                    await run_level(client, concurrency, args.requests, args.unique_ratio, args.seed, incidents)
+                )
+
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], indent=2))
+        return
+
+    print(
+        f"{'conc':>5} {'incid':>5} {'reqs':>6} {'errs':>5} {'rps':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}"
+    )
+    for r in results:
+        incidents = "-" if r.incidents is None else ("on" if r.incidents else "off")
+        print(
+            f"{r.concurrency:>5} {incidents:>5} {r.requests:>6} {r.errors:>5} {r.throughput_rps:>9.2f} "
+            f"{r.p50_ms:>9.2f} {r.p95_ms:>9.2f} {r.p99_ms:>9.2f} {r.max_rss_mb:>8.1f}"
+        )
+    if args.trace_memory:
+        print("peak traced MB per level:", ", ".join(str(r.peak_traced_mb) for r in results))
+    if any(r.errors for r in results):
+        print("Note: errors include 503 rejections from the LLM limiter")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
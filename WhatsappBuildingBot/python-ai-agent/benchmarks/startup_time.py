@@ -0,0 +1,187 @@
+"""
+Startup-time benchmark for the Python AI Agent service.
+
+Reports per-module import time for app.main (from python -X importtime),
+and with --serve starts uvicorn in each startup mode and measures how
+long it takes until /health and /ready first answer 200.
+
+Usage:
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --top 30 --module app.ai.langchain_agent
+    python -m benchmarks.startup_time --serve --modes eager,lazy
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+import httpx
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose presence after import shows the heavy LLM client was loaded
+HEAVY_MODULES = ("langchain_google_genai", "google.generativeai")
+
+
+@dataclass
+class ModuleImport:
+    """Import time of one module, in milliseconds."""
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+@dataclass
+class ServeResult:
+    """Time from process start until each endpoint first answered 200."""
+    mode: str
+    health_ms: float | None
+    ready_ms: float | None
+
+
+def measure_imports(module: str) -> tuple[list[ModuleImport], list[str]]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module: Module to import, e.g. "app.main"
+
+    Returns:
+        (per-module import times in import order, heavy modules that got loaded)
+    """
+    code = (
+        f"import json, sys; import {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR,
+        env=dict(os.environ, GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "benchmark")),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append(ModuleImport(
+            module=name.strip(),
+            self_ms=int(self_us) / 1000,
+            cumulative_ms=int(cumulative_us) / 1000,
+            depth=(len(name) - len(name.lstrip())) // 2
+        ))
+    return imports, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    """Ask the OS for an unused local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_serve(mode: str, timeout: float) -> ServeResult:
+    """
+    Start uvicorn in a startup mode and poll /health and /ready.
+
+    Args:
+        mode: "eager" or "lazy"
+        timeout: Seconds to wait for /ready before giving up
+
+    Returns:
+        ServeResult with the time to the first 200 of each endpoint
+    """
+    port = free_port()
+    env = dict(
+        os.environ,
+        STARTUP_MODE=mode,
+        GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "benchmark")
+    )
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_DIR,
+        env=env
+    )
+
+    health_ms = ready_ms = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while ready_ms is None and time.perf_counter() - started < timeout:
+                for path in ("/health", "/ready"):
+                    try:
+                        ok = client.get(path).status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    elapsed = round((time.perf_counter() - started) * 1000, 1)
+                    if ok and path == "/health" and health_ms is None:
+                        health_ms = elapsed
+                    if ok and path == "/ready":
+                        ready_ms = elapsed
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return ServeResult(mode=mode, health_ms=health_ms, ready_ms=ready_ms)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Measure import and startup time of the service")
+    parser.add_argument("--module", default="app.main", help="Module whose import is measured")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list")
+    parser.add_argument("--serve", action="store_true", help="Also time /health and /ready under uvicorn")
+    parser.add_argument("--modes", default="eager,lazy", help="Startup modes to compare with --serve")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for /ready")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the measurements and print a report."""
+    args = parse_args()
+
+    imports, heavy_loaded = measure_imports(args.module)
+    total_ms = next((m.cumulative_ms for m in reversed(imports) if m.module == args.module), 0.0)
+    slowest = sorted(imports, key=lambda m: m.cumulative_ms, reverse=True)[:args.top]
+
+    serve_results = []
+    if args.serve:
+        serve_results = [measure_serve(mode, args.timeout) for mode in args.modes.split(",")]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "import_ms": total_ms,
+            "heavy_modules_loaded": heavy_loaded,
+            "slowest": [asdict(m) for m in slowest],
+            "serve": [asdict(r) for r in serve_results]
+        }, indent=2))
+        return
+
+    print(f"import {args.module}: {total_ms:.1f} ms")
+    print(f"heavy LLM modules loaded at import: {', '.join(heavy_loaded) or 'none'}")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for m in slowest:
+        print(f"{m.cumulative_ms:>14.1f} {m.self_ms:>9.1f}  {'  ' * m.depth}{m.module}")
+
+    if serve_results:
+        print(f"\n{'mode':<8} {'/health ms':>11} {'/ready ms':>10}")
+        for r in serve_results:
+            health = f"{r.health_ms:.1f}" if r.health_ms is not None else "-"
+            ready = f"{r.ready_ms:.1f}" if r.ready_ms is not None else "timeout"
+            print(f"{r.mode:<8} {health:>11} {ready:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Shared fixtures: a scripted stand-in for the Gemini chat model.
+"""
+
+import asyncio
+import os
+from typing import AsyncIterator, Callable
+
+# No Gemini connections from tests
+os.environ.setdefault("LLM_PREWARM", "false")
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from app.ai.langchain_agent import TicketClassifier
+from app.ai.model_router import ModelRouter
+
+
+class ScriptedChatModel:
+    """Chat model stand-in that answers every call with a fixed text or error."""
+
+    def __init__(self, respond: str | Callable[[list[BaseMessage]], str], chunk_size: int = 8):
+        self.respond = respond if callable(respond) else (lambda messages: respond)
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    async def ainvoke(self, messages: list[BaseMessage], **kwargs) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return AIMessage(content=self.respond(messages))
+
+    async def astream(self, messages: list[BaseMessage], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        self.calls += 1
+        content = self.respond(messages)
+        for start in range(0, len(content), self.chunk_size):
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=content[start:start + self.chunk_size])
+
+
+@pytest.fixture
+def make_classifier() -> Callable[..., TicketClassifier]:
+    def make(llm: ScriptedChatModel | None = None, router: ModelRouter | None = None) -> TicketClassifier:
+        classifier = TicketClassifier(llm=llm, router=router)
+        # Backup calls would make call counts depend on timing
+        classifier.hedge = None
+        return classifier
+    return make
+
+
+@pytest.fixture
+def scripted() -> type[ScriptedChatModel]:
+    return ScriptedChatModel
@@ -0,0 +1,129 @@
+"""
+Tests for the HTTP endpoints, with a scripted model behind the classifier.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import main
+from app.ai import langchain_agent
+
+RESPONSE = json.dumps({
+    "ticket_type": "מעלית", "location": "לובי", "normalized_summary": "המעלית תקועה.", "confidence": 0.9
+}, ensure_ascii=False)
+
+
+def analyze_body(message_text: str) -> dict:
+    return {
+        "building_id": "building-1",
+        "resident": {"name": "Test", "phone": "0500000000"},
+        "message_text": message_text
+    }
+
+
+@pytest.fixture
+def llm(make_classifier, scripted, monkeypatch):
+    llm = scripted(RESPONSE)
+    monkeypatch.setattr(langchain_agent, "_classifier", make_classifier(llm))
+    return llm
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def test_analyze_records_metrics(client, llm):
+    response = await client.post("/analyze", json=analyze_body("משהו לא בסדר עם המעלית בבניין, תבדקו"))
+    assert response.status_code == 200
+    assert response.json()["ticket_type"] == "מעלית"
+
+    metrics = (await client.get("/metrics")).text
+
+    assert 'http_requests_total{method="POST",path="/analyze",status="200"}' in metrics
+    assert 'classification_stage_duration_seconds_count{stage="llm_call"}' in metrics
+    assert "classifications_total" in metrics
+
+
+async def test_unknown_paths_share_one_metrics_label(client):
+    await client.get("/no/such/path/1")
+    await client.get("/no/such/path/2")
+
+    metrics = (await client.get("/metrics")).text
+
+    assert 'path="unmatched"' in metrics
+    assert "/no/such/path" not in metrics
+
+
+async def test_ready_only_after_warm_up(client, llm, monkeypatch):
+    monkeypatch.setattr(main, "_warmup_ms", None)
+
+    assert (await client.get("/health")).status_code == 200
+    assert (await client.get("/ready")).status_code == 503
+
+    await main.warm_up_classifier()
+
+    ready = await client.get("/ready")
+    assert ready.status_code == 200
+    assert ready.json()["warmup_ms"] is not None
+
+
+async def test_fast_path_is_off_by_default(client, llm):
+    response = await client.post("/analyze", json=analyze_body("נורה שרופה בלובי"))
+
+    assert response.json()["model_metadata"]["model"] != "rule-based"
+    assert llm.calls == 1
+
+
+async def test_fast_path_answers_without_the_classifier(client, monkeypatch):
+    monkeypatch.setattr(main.get_settings(), "fast_path_enabled", True)
+    # No classifier built, as during a lazy warm-up
+    monkeypatch.setattr(langchain_agent, "_classifier", None)
+
+    response = await client.post("/analyze", json=analyze_body("נורה שרופה בלובי"))
+
+    assert response.json()["model_metadata"]["model"] == "rule-based"
+    assert langchain_agent._classifier is None
+
+
+async def test_async_analyze_is_rejected_while_jobs_are_disabled(client):
+    response = await client.post("/analyze?async=true", json=analyze_body("המעלית תקועה"))
+
+    assert response.status_code == 400
+
+
+async def test_classification_metric_has_no_building_label(client, llm):
+    await client.post("/analyze", json={**analyze_body("המעלית תקועה"), "building_id": "any-client-value"})
+    metrics = (await client.get("/metrics")).text
+
+    assert "any-client-value" not in metrics
+
+
+async def test_requests_share_a_call_only_with_the_same_deadline(llm):
+    soon, later = main.request_deadline(5000), main.request_deadline(30000)
+
+    # Distinct messages, so neither round is answered from the cache
+    request = main.AnalyzeRequest(**analyze_body("המזגן בחדר הכושר מטפטף"))
+    await asyncio.gather(main.classify_request(request, soon), main.classify_request(request, soon))
+    assert llm.calls == 1
+
+    request = main.AnalyzeRequest(**analyze_body("המזגן בחדר הכושר רועש"))
+    await asyncio.gather(main.classify_request(request, soon), main.classify_request(request, later))
+    assert llm.calls == 3
+
+
+async def test_media_urls_are_ignored_by_default(client, llm, monkeypatch):
+    def no_fetcher():
+        raise AssertionError("media fetched while MEDIA_ENABLED is off")
+
+    monkeypatch.setattr(main, "get_media_fetcher", no_fetcher)
+    body = {**analyze_body("תראו את התמונה"), "media_urls": ["https://api.twilio.com/media/1"]}
+    response = await client.post("/analyze", json=body)
+
+    assert response.status_code == 200
+    assert llm.calls == 1
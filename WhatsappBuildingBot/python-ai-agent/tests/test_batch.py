@@ -0,0 +1,92 @@
+"""
+Tests for batch classification.
+"""
+
+import json
+import re
+
+from langchain_core.messages import BaseMessage
+
+
+BATCH_COUNT = re.compile(r"בדיוק (\d+) אובייקטים")
+
+
+def classification(ticket_type: str, **extra) -> dict:
+    return dict(
+        ticket_type=ticket_type, location="לובי", normalized_summary="דווח על תקלה.", confidence=0.9, **extra
+    )
+
+
+# Keyword in the message -> ticket type the stand-in model answers
+KEYWORDS = {"מעלית": "מעלית", "נזילה": "אינסטלציה", "נורה": "תאורה"}
+
+
+def answer_by_keyword(messages: list[BaseMessage], drop: frozenset[int] = frozenset()) -> str:
+    """Classify each message in the prompt by its keyword, leaving out dropped indexes."""
+    prompt = str(messages[-1].content)
+    # Messages appear in the prompt in request order
+    found = sorted((prompt.index(word), ticket_type) for word, ticket_type in KEYWORDS.items() if word in prompt)
+    if not BATCH_COUNT.search(prompt):
+        return json.dumps(classification(found[-1][1]), ensure_ascii=False)
+    entries = [classification(ticket_type, index=i) for i, (_, ticket_type) in enumerate(found) if i not in drop]
+    return json.dumps(entries, ensure_ascii=False)
+
+
+ITEMS = [("המעלית תקועה", "b1"), ("נזילה מהתקרה", "b1"), ("נורה שרופה", "b2")]
+
+
+async def test_batch_is_one_call_in_request_order(make_classifier, scripted):
+    llm = scripted(answer_by_keyword)
+    responses = await make_classifier(llm).classify_batch(ITEMS)
+
+    assert [r.ticket_type for r in responses] == ["מעלית", "אינסטלציה", "תאורה"]
+    assert [r.original_text for r in responses] == [text for text, _ in ITEMS]
+    assert llm.calls == 1
+
+
+async def test_malformed_entries_are_classified_individually(make_classifier, scripted):
+    def answer(messages):
+        entries = json.loads(answer_by_keyword(messages))
+        if isinstance(entries, list):
+            del entries[1]["ticket_type"]
+        return json.dumps(entries, ensure_ascii=False)
+
+    llm = scripted(answer)
+    responses = await make_classifier(llm).classify_batch(ITEMS)
+
+    assert [r.ticket_type for r in responses] == ["מעלית", "אינסטלציה", "תאורה"]
+    assert llm.calls == 2
+
+
+async def test_chunk_with_a_skipped_index_is_classified_individually(make_classifier, scripted):
+    llm = scripted(lambda messages: answer_by_keyword(messages, drop=frozenset({1})))
+    responses = await make_classifier(llm).classify_batch(ITEMS)
+
+    assert [r.ticket_type for r in responses] == ["מעלית", "אינסטלציה", "תאורה"]
+    assert llm.calls == 1 + len(ITEMS)
+
+
+async def test_chunk_with_indexes_from_one_is_classified_individually(make_classifier, scripted):
+    def answer(messages):
+        entries = json.loads(answer_by_keyword(messages))
+        if isinstance(entries, list):
+            for entry in entries:
+                entry["index"] += 1
+        return json.dumps(entries, ensure_ascii=False)
+
+    llm = scripted(answer)
+    responses = await make_classifier(llm).classify_batch(ITEMS)
+
+    assert [r.ticket_type for r in responses] == ["מעלית", "אינסטלציה", "תאורה"]
+    assert llm.calls == 1 + len(ITEMS)
+
+
+async def test_cached_messages_skip_the_batch_call(make_classifier, scripted):
+    llm = scripted(answer_by_keyword)
+    classifier = make_classifier(llm)
+    await classifier.classify_batch(ITEMS)
+
+    responses = await classifier.classify_batch(ITEMS)
+
+    assert all(r.model_metadata.cache_hit for r in responses)
+    assert llm.calls == 1
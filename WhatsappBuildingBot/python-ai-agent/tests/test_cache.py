@@ -0,0 +1,104 @@
+"""
+Tests for the classification cache.
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.ai.cache import MemoryCache, SQLiteCache, create_cache, make_cache_key, normalize_message
+from app.config import Settings
+from app.schemas import AnalyzeResponse, ModelMetadata
+
+
+def make_response(ticket_type: str = "מעלית") -> AnalyzeResponse:
+    return AnalyzeResponse(
+        ticket_type=ticket_type,
+        location="לובי",
+        normalized_summary="המעלית תקועה.",
+        original_text="המעלית תקועה",
+        confidence=0.9,
+        model_metadata=ModelMetadata(model="test", latency_ms=100)
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(max_entries: int = 10, ttl_seconds: int = 3600):
+        if request.param == "memory":
+            return MemoryCache(max_entries, ttl_seconds)
+        return SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries, ttl_seconds)
+    return make
+
+
+def test_trivially_different_messages_share_a_key():
+    assert normalize_message("המעלית   תקועה!!!") == normalize_message("הַמַּעֲלִית תקועה")
+    assert normalize_message("דחוףףף") == "דחוף"
+    assert make_cache_key("המעלית תקועה!", "b1") == make_cache_key("המעלית  תקועה", "b1")
+
+
+def test_key_depends_on_building_and_media():
+    assert make_cache_key("המעלית תקועה", "b1") != make_cache_key("המעלית תקועה", "b2")
+    assert make_cache_key("תראו", "b1", ["abc"]) != make_cache_key("תראו", "b1", ["def"])
+
+
+def test_get_counts_hits_and_misses(make_cache):
+    cache = make_cache()
+    cache.set("a", make_response())
+
+    assert cache.get("a").ticket_type == "מעלית"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set("a", make_response())
+    time.sleep(0.01)
+    cache.set("b", make_response())
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", make_response())
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+def test_expired_entry_is_a_miss(make_cache):
+    cache = make_cache(ttl_seconds=0)
+    cache.set("a", make_response())
+    time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path, 10, 3600).set("a", make_response())
+
+    assert SQLiteCache(path, 10, 3600).get("a").ticket_type == "מעלית"
+
+
+async def test_sqlite_async_access_runs_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), 10, 3600)
+    loop_thread = threading.current_thread()
+    threads = []
+    get = cache.get
+    cache.get = lambda key: threads.append(threading.current_thread()) or get(key)
+
+    await cache.aset("a", make_response())
+    response = await cache.aget("a")
+
+    assert response.ticket_type == "מעלית"
+    assert threads and threads[0] is not loop_thread
+
+
+def test_multiple_workers_share_the_sqlite_cache(tmp_path):
+    settings = Settings(cache_backend="memory", workers=2, cache_sqlite_path=str(tmp_path / "cache.sqlite3"))
+
+    assert isinstance(create_cache(settings), SQLiteCache)
+    assert isinstance(create_cache(Settings(cache_backend="memory", workers=1)), MemoryCache)
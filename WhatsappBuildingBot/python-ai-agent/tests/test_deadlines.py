@@ -0,0 +1,91 @@
+"""
+Tests for deadline propagation and hedged LLM calls.
+"""
+
+import asyncio
+
+import pytest
+
+from app.ai.deadline import DeadlineExceededError, deadline_after, within
+from app.ai.hedging import HedgePolicy, hedged
+
+
+async def test_within_returns_before_the_deadline():
+    assert await within(deadline_after(1.0), asyncio.sleep(0, result="done")) == "done"
+
+
+async def test_within_cancels_at_the_deadline():
+    with pytest.raises(DeadlineExceededError):
+        await within(deadline_after(0.01), asyncio.sleep(1))
+
+
+async def test_passed_deadline_fails_without_running():
+    with pytest.raises(DeadlineExceededError):
+        await within(deadline_after(-1), asyncio.sleep(0))
+
+
+def make_policy(delay: float, credits: float) -> HedgePolicy:
+    policy = HedgePolicy(percentile=0.95, budget_ratio=1.0, min_samples=1)
+    policy.observe(delay)
+    # earn() inside hedged() adds one more credit
+    policy._credits = credits
+    return policy
+
+
+async def test_slow_call_is_hedged_and_the_first_answer_wins():
+    latencies = iter([1.0, 0.01])
+    started = 0
+
+    async def call():
+        nonlocal started
+        started += 1
+        latency = next(latencies)
+        await asyncio.sleep(latency)
+        return latency
+
+    assert await within(deadline_after(0.5), hedged(call, make_policy(delay=0.02, credits=0))) == 0.01
+    assert started == 2
+
+
+async def test_no_hedge_without_budget():
+    policy = HedgePolicy(percentile=0.95, budget_ratio=0.0, min_samples=1)
+    policy.observe(0.01)
+    started = 0
+
+    async def call():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.05)
+        return "done"
+
+    assert await hedged(call, policy) == "done"
+    assert started == 1
+
+
+async def test_deadline_cancels_every_copy():
+    cancelled = 0
+
+    async def call():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    with pytest.raises(DeadlineExceededError):
+        await within(deadline_after(0.1), hedged(call, make_policy(delay=0.01, credits=0)))
+    await asyncio.sleep(0)
+
+    assert cancelled == 2
+
+
+async def test_deadline_reaches_the_llm_call(make_classifier, scripted):
+    async def slow_invoke(messages, **kwargs):
+        await asyncio.sleep(1)
+
+    llm = scripted("{}")
+    llm.ainvoke = slow_invoke
+    response = await make_classifier(llm).classify("המעלית תקועה", deadline=deadline_after(0.05))
+
+    assert response.confidence == 0.0
@@ -0,0 +1,127 @@
+"""
+Tests for the per-building incident index.
+"""
+
+import time
+
+import pytest
+
+from app.ai.incidents import IncidentIndex, numbers
+from app.schemas import AnalyzeResponse, ModelMetadata
+
+
+BUILDING = "building-1"
+
+
+def make_response(ticket_type: str, location: str, text: str, confidence: float = 0.9) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        ticket_type=ticket_type,
+        location=location,
+        normalized_summary=text,
+        original_text=text,
+        confidence=confidence,
+        model_metadata=ModelMetadata(model="test", latency_ms=1)
+    )
+
+
+@pytest.fixture
+def index() -> IncidentIndex:
+    return IncidentIndex(window_seconds=7200, text_similarity=0.7, related_similarity=0.5, max_per_building=100)
+
+
+def assign(index: IncidentIndex, ticket_type: str, location: str, text: str) -> AnalyzeResponse:
+    return index.assign(BUILDING, text, make_response(ticket_type, location, text))
+
+
+def test_numbers_ignore_leading_zeros():
+    assert numbers("קומה 07, דירה 21") == {"7", "21"}
+    assert numbers("אין מים") == frozenset()
+
+
+def test_same_report_twice_is_a_duplicate(index):
+    text = "המעלית תקועה בקומה 3 כבר שעה"
+    first = assign(index, "מעלית", "מעלית", text)
+    second = assign(index, "מעלית", "מעלית", text)
+
+    assert not first.duplicate
+    assert second.duplicate
+    assert second.incident_id == first.incident_id
+
+
+def test_different_apartments_are_not_merged(index):
+    first = assign(index, "אינסטלציה", "דירה", "נזילה בקומה 7 בדירה 21")
+    second = assign(index, "אינסטלציה", "דירה", "יש נזילה מהתקרה אצלי בקומה 7, דירה 28")
+
+    assert not second.duplicate
+    assert second.incident_id != first.incident_id
+
+
+def test_different_ticket_types_are_not_merged(index):
+    text = "משהו לא עובד בכניסה לבניין"
+    first = assign(index, "אינטרקום", "לובי", text)
+    second = assign(index, "מעלית", "לובי", text)
+
+    assert not second.duplicate
+    assert second.incident_id != first.incident_id
+
+
+def test_other_is_never_attached(index):
+    text = "יש בעיה בבניין, מישהו יכול לבדוק?"
+    first = assign(index, "אחר", "לובי", text)
+    second = assign(index, "אחר", "לובי", text)
+
+    assert first.incident_id is None
+    assert not second.duplicate
+    assert second.incident_id is None
+
+
+def test_unrelated_text_with_same_type_is_not_merged(index):
+    assign(index, "חשמל", "לובי", "הנורה בלובי שרופה כבר שבוע")
+    second = assign(index, "חשמל", "לובי", "יש ריח של שריפה מלוח החשמל ליד התיבות דואר")
+
+    assert not second.duplicate
+
+
+def test_match_skips_llm_for_the_same_text(index):
+    text = "המעלית תקועה בקומה 3 כבר שעה"
+    first = assign(index, "מעלית", "מעלית", text)
+
+    matched = index.match(BUILDING, "המעלית תקועה בקומה 3 כבר שעה!!")
+
+    assert matched is not None
+    assert matched.duplicate
+    assert matched.incident_id == first.incident_id
+    assert index.stats().skipped_llm == 1
+
+
+def test_match_requires_the_same_numbers(index):
+    assign(index, "מעלית", "מעלית", "המעלית תקועה בקומה 3 כבר שעה")
+
+    assert index.match(BUILDING, "המעלית תקועה בקומה 5 כבר שעה") is None
+
+
+def test_match_is_per_building(index):
+    text = "המעלית תקועה בקומה 3 כבר שעה"
+    assign(index, "מעלית", "מעלית", text)
+
+    assert index.match("building-2", text) is None
+
+
+def test_fallback_classification_is_not_tracked(index):
+    text = "המעלית תקועה בקומה 3 כבר שעה"
+    response = index.assign(BUILDING, text, make_response("מעלית", "מעלית", text, confidence=0.0))
+
+    assert response.incident_id is None
+    assert index.match(BUILDING, text) is None
+
+
+def test_buildings_without_open_incidents_are_dropped(index, monkeypatch):
+    assign(index, "מעלית", "מעלית", "המעלית תקועה בקומה 3 כבר שעה")
+    assert index.match("other-building", "המעלית תקועה בקומה 3 כבר שעה") is None
+    assert index.stats().buildings == 1
+
+    # Past the window, the incident closes and its building goes with it
+    later = time.time() + index.window_seconds + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert index.match(BUILDING, "המעלית תקועה בקומה 3 כבר שעה") is None
+    assert index.stats().buildings == 0
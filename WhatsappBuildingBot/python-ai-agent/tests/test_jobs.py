@@ -0,0 +1,180 @@
+"""
+Tests for the background job queue.
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.ai.rate_limiter import LLMOverloadedError
+from app.jobs import JobQueue, JobStore
+from app.schemas import AnalyzeRequest, AnalyzeResponse, ModelMetadata, ResidentInfo
+
+
+def make_request(text: str = "המעלית תקועה") -> AnalyzeRequest:
+    return AnalyzeRequest(
+        building_id="building-1",
+        resident=ResidentInfo(name="Test", phone="0500000000"),
+        message_text=text
+    )
+
+
+async def classify(request: AnalyzeRequest) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        ticket_type="מעלית",
+        location="מעלית",
+        normalized_summary="המעלית תקועה.",
+        original_text=request.message_text,
+        confidence=0.9,
+        model_metadata=ModelMetadata(model="test", latency_ms=1)
+    )
+
+
+class CallbackServer(ThreadingHTTPServer):
+    """Records the job payloads POSTed to it."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CallbackHandler)
+        self.payloads: list[dict] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/callback"
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    server: CallbackServer
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.payloads.append(json.loads(body))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def callback_server():
+    server = CallbackServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_queue(tmp_path, **overrides) -> JobQueue:
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=overrides.pop("lease_seconds", 300),
+                     retention_seconds=3600)
+    options = dict(workers=1, callback_timeout=5.0, callback_retries=1, max_attempts=3)
+    options.update(overrides)
+    return JobQueue(store, **options)
+
+
+async def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def test_job_is_classified(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.start(classify)
+    job_id = await queue.submit(make_request(), None)
+
+    await wait_for(lambda: queue.store.get(job_id).status == "done")
+    await queue.stop()
+
+    job = queue.store.get(job_id)
+    assert job.result.ticket_type == "מעלית"
+    assert job.callback_status is None
+
+
+async def test_overloaded_job_fails_after_max_attempts(tmp_path):
+    async def overloaded(request: AnalyzeRequest) -> AnalyzeResponse:
+        raise LLMOverloadedError(retry_after=0)
+
+    queue = make_queue(tmp_path, max_attempts=3)
+    queue.start(overloaded)
+    job_id = await queue.submit(make_request(), None)
+
+    await wait_for(lambda: queue.store.get(job_id).status == "failed")
+    await queue.stop()
+
+    assert queue.store.get(job_id).attempts == 3
+
+
+async def test_loopback_callback_needs_allow_list(tmp_path):
+    assert not await make_queue(tmp_path).callback_allowed("http://127.0.0.1:8080/callback")
+    assert not await make_queue(tmp_path).callback_allowed("http://169.254.169.254/latest/meta-data")
+    assert not await make_queue(tmp_path).callback_allowed("file:///etc/passwd")
+
+    listed = make_queue(tmp_path, callback_allowed_hosts="127.0.0.1")
+    assert await listed.callback_allowed("http://127.0.0.1:8080/callback")
+    assert not await listed.callback_allowed("http://example.com/callback")
+
+
+async def test_result_is_delivered_to_callback(tmp_path, callback_server):
+    queue = make_queue(tmp_path, callback_allowed_hosts="127.0.0.1")
+    queue.start(classify)
+    job_id = await queue.submit(make_request(), callback_server.url)
+
+    await wait_for(lambda: queue.store.get(job_id).callback_status == "delivered")
+    await queue.stop()
+
+    assert callback_server.payloads[0]["job_id"] == job_id
+    assert callback_server.payloads[0]["result"]["ticket_type"] == "מעלית"
+
+
+async def test_callback_to_disallowed_host_is_not_sent(tmp_path, callback_server):
+    queue = make_queue(tmp_path)
+    queue.start(classify)
+    job_id = await queue.submit(make_request(), callback_server.url)
+
+    await wait_for(lambda: queue.store.get(job_id).callback_status == "failed")
+    await queue.stop()
+
+    assert callback_server.payloads == []
+
+
+async def test_interrupted_callback_is_delivered_after_restart(tmp_path, callback_server):
+    # A process that finished the job but died before delivering it
+    crashed = make_queue(tmp_path, lease_seconds=0, callback_allowed_hosts="127.0.0.1")
+    job_id = crashed.store.enqueue(make_request(), callback_server.url)
+    claimed_id, request, _ = crashed.store.claim()
+    crashed.store.complete(claimed_id, await classify(request))
+    assert crashed.store.get(job_id).callback_status == "pending"
+
+    queue = make_queue(tmp_path, lease_seconds=0, callback_allowed_hosts="127.0.0.1")
+    queue.start(classify)
+    await wait_for(lambda: queue.store.get(job_id).callback_status == "delivered")
+    await queue.stop()
+
+    assert len(callback_server.payloads) == 1
+
+
+async def test_idle_workers_wait_for_submit_instead_of_polling(tmp_path):
+    queue = make_queue(tmp_path, workers=3)
+    claims = 0
+    claim = queue.store.claim
+
+    def counting_claim():
+        nonlocal claims
+        claims += 1
+        return claim()
+
+    queue.store.claim = counting_claim
+    queue.start(classify)
+    await asyncio.sleep(0.3)
+    assert claims == 3
+
+    job_id = await queue.submit(make_request(), None)
+    await wait_for(lambda: queue.store.get(job_id).status == "done")
+    await queue.stop()
@@ -0,0 +1,184 @@
+"""
+Tests for attachment downloads, against a local HTTP server.
+"""
+
+import io
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from app.ai.media import MediaCache, MediaFetcher
+from app.url_policy import host_listed, resolves_to_public, url_allowed
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+PHOTO = make_jpeg(2000, 1500)
+
+
+class MediaServer(ThreadingHTTPServer):
+    """Serves test attachments and records the requests it got."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MediaHandler)
+        self.hits: Counter[str] = Counter()
+        self.auth_headers: dict[str, str | None] = {}
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.server_port}{path}"
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    server: MediaServer
+
+    def do_GET(self):
+        self.server.hits[self.path] += 1
+        self.server.auth_headers[self.path] = self.headers.get("Authorization")
+        if self.path == "/photo.jpg":
+            self.reply(200, PHOTO, "image/jpeg")
+        elif self.path == "/large.jpg":
+            self.reply(200, b"\xff" * 5000, "image/jpeg")
+        elif self.path == "/note.txt":
+            self.reply(200, "לא תמונה".encode(), "text/plain")
+        elif self.path == "/redirect":
+            # Another host name for the same server
+            self.send_response(302)
+            self.send_header("Location", self.server.url("/photo.jpg", host="localhost"))
+            self.end_headers()
+        else:
+            self.reply(404, b"", "text/plain")
+
+    def reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    media_server = MediaServer()
+    thread = threading.Thread(target=media_server.serve_forever, daemon=True)
+    thread.start()
+    yield media_server
+    media_server.shutdown()
+    media_server.server_close()
+
+
+def make_fetcher(**overrides) -> MediaFetcher:
+    options = dict(
+        max_per_request=3,
+        max_concurrent=4,
+        max_bytes=1_000_000,
+        timeout_seconds=5.0,
+        max_dimension=768,
+        jpeg_quality=80,
+        cache=MediaCache(max_bytes=10_000_000, ttl_seconds=3600),
+        allowed_hosts="127.0.0.1,localhost",
+        allow_private_addresses=True
+    )
+    options.update(overrides)
+    return MediaFetcher(**options)
+
+
+async def test_photo_is_downscaled_to_jpeg(server):
+    fetcher = make_fetcher()
+    items = await fetcher.fetch_all([server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert len(items) == 1
+    assert items[0].mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(items[0].data)) as image:
+        assert max(image.size) == 768
+        assert image.size == (768, 576)
+
+
+async def test_repeated_url_is_served_from_cache(server):
+    fetcher = make_fetcher()
+    first = await fetcher.fetch_all([server.url("/photo.jpg")])
+    second = await fetcher.fetch_all([server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert second == first
+    assert server.hits["/photo.jpg"] == 1
+    assert fetcher.cache.hits == 1
+
+
+async def test_oversized_attachment_is_skipped(server):
+    fetcher = make_fetcher(max_bytes=1000)
+    items = await fetcher.fetch_all([server.url("/large.jpg")])
+    await fetcher.close()
+
+    assert items == []
+
+
+async def test_unsupported_attachment_is_skipped(server):
+    fetcher = make_fetcher()
+    items = await fetcher.fetch_all([server.url("/note.txt"), server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert len(items) == 1
+
+
+async def test_host_not_in_allow_list_is_rejected(server):
+    fetcher = make_fetcher(allowed_hosts="api.twilio.com,*.twilio.com")
+    items = await fetcher.fetch_all([server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert items == []
+    assert server.hits["/photo.jpg"] == 0
+
+
+async def test_loopback_address_is_rejected(server):
+    fetcher = make_fetcher(allow_private_addresses=False)
+    items = await fetcher.fetch_all([server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert items == []
+    assert server.hits["/photo.jpg"] == 0
+
+
+async def test_auth_is_not_sent_across_redirects(server):
+    fetcher = make_fetcher(auth=("sid", "token"))
+    items = await fetcher.fetch_all([server.url("/redirect")])
+    await fetcher.close()
+
+    assert len(items) == 1
+    assert server.auth_headers["/redirect"] is not None
+    assert server.auth_headers["/photo.jpg"] is None
+
+
+async def test_auth_is_only_sent_to_listed_hosts(server):
+    fetcher = make_fetcher(allowed_hosts="", auth=("sid", "token"))
+    items = await fetcher.fetch_all([server.url("/photo.jpg")])
+    await fetcher.close()
+
+    assert len(items) == 1
+    assert server.auth_headers["/photo.jpg"] is None
+
+
+def test_host_allow_list_wildcards():
+    allowed = "api.twilio.com,*.twilio.com"
+    assert host_listed("api.twilio.com", allowed)
+    assert host_listed("media.us1.twilio.com", allowed)
+    assert not host_listed("twilio.com.evil.example", allowed)
+    assert not host_listed("eviltwilio.com", allowed)
+    assert not url_allowed("ftp://api.twilio.com/x", allowed)
+    assert url_allowed("https://anything.example/x", "")
+
+
+async def test_internal_addresses_are_not_public():
+    for host in ("127.0.0.1", "localhost", "10.0.0.5", "169.254.169.254", "::1"):
+        assert not await resolves_to_public(host)
+    assert await resolves_to_public("8.8.8.8")
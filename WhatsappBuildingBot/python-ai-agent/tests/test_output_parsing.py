@@ -0,0 +1,80 @@
+"""
+Tests for decoding, repairing and validating LLM output.
+"""
+
+import json
+
+import pytest
+
+from app.ai.output_schema import repair_json
+
+
+def test_truncated_object_is_closed():
+    assert repair_json('{"ticket_type": "מעלית", "location": "לו') == {"ticket_type": "מעלית", "location": "לו"}
+
+
+def test_dangling_key_is_dropped():
+    assert repair_json('{"ticket_type": "מעלית", "confidence":') == {"ticket_type": "מעלית"}
+
+
+def test_text_around_json_is_skipped():
+    assert repair_json('Here you go: [{"index": 0}') == [{"index": 0}]
+
+
+def test_text_without_json_is_rejected():
+    with pytest.raises(json.JSONDecodeError):
+        repair_json("sorry, I cannot help with that")
+
+
+async def test_repaired_result_without_confidence_is_not_cached(make_classifier, scripted):
+    llm = scripted('```json\n{"ticket_type": "מעלית", "location": "לובי", "normalized_summary": "המעלית')
+    classifier = make_classifier(llm)
+
+    first = await classifier.classify("המעלית בלובי תקועה")
+    second = await classifier.classify("המעלית בלובי תקועה")
+
+    assert first.ticket_type == "מעלית"
+    assert first.confidence == 0.0
+    assert not second.model_metadata.cache_hit
+    assert llm.calls == 2
+
+
+async def test_complete_result_is_cached(make_classifier, scripted):
+    llm = scripted('{"ticket_type": "מעלית", "location": "לובי", "normalized_summary": "המעלית תקועה.", "confidence": 0.9}')
+    classifier = make_classifier(llm)
+
+    await classifier.classify("המעלית בלובי תקועה")
+    second = await classifier.classify("המעלית בלובי תקועה")
+
+    assert second.model_metadata.cache_hit
+    assert second.confidence == 0.9
+    assert llm.calls == 1
+
+
+async def test_complete_result_without_confidence_keeps_the_default(make_classifier, scripted):
+    llm = scripted('{"ticket_type": "מעלית", "location": "לובי", "normalized_summary": "המעלית תקועה."}')
+    classifier = make_classifier(llm)
+
+    first = await classifier.classify("המעלית בלובי תקועה")
+    second = await classifier.classify("המעלית בלובי תקועה")
+
+    assert first.confidence == 0.5
+    assert second.model_metadata.cache_hit
+    assert llm.calls == 1
+
+
+@pytest.mark.parametrize("confidence", ['"high"', "true", "null"])
+def test_invalid_confidence_gets_the_default(make_classifier, scripted, confidence):
+    classifier = make_classifier(scripted(""))
+    result = classifier._parse_response(
+        f'{{"ticket_type": "מעלית", "location": "לובי", "confidence": {confidence}}}', "המעלית תקועה"
+    )
+
+    assert result["confidence"] == 0.5
+
+
+def test_invalid_confidence_in_repaired_output_counts_as_none(make_classifier, scripted):
+    classifier = make_classifier(scripted(""))
+    result = classifier._parse_response('{"ticket_type": "מעלית", "location": "לובי", "confidence": "hi', "המעלית תקועה")
+
+    assert result["confidence"] == 0.0
@@ -0,0 +1,38 @@
+"""
+Tests for prompt construction.
+"""
+
+import json
+
+from app.ai.prompt_templates import (
+    BATCH_CLASSIFICATION_TEMPLATE, CLASSIFICATION_TEMPLATE, get_batch_classification_prompt,
+    get_classification_prompt,
+)
+from app.config import LOCATIONS, TICKET_TYPES
+
+
+def test_prompt_starts_with_the_static_prefix():
+    first = get_classification_prompt("המעלית תקועה")
+    second = get_classification_prompt("נזילה בלובי")
+
+    assert first.startswith(CLASSIFICATION_TEMPLATE.static_prefix)
+    assert second.startswith(CLASSIFICATION_TEMPLATE.static_prefix)
+    assert first.endswith(CLASSIFICATION_TEMPLATE.render_dynamic(message_text="המעלית תקועה"))
+
+
+def test_static_prefix_lists_every_category():
+    assert all(ticket_type in CLASSIFICATION_TEMPLATE.static_prefix for ticket_type in TICKET_TYPES)
+    assert all(location in CLASSIFICATION_TEMPLATE.static_prefix for location in LOCATIONS)
+
+
+def test_message_braces_are_not_treated_as_placeholders():
+    assert "{שלום}" in get_classification_prompt("{שלום}")
+
+
+def test_batch_prompt_lists_messages_as_json():
+    texts = ["המעלית תקועה", 'נזילה בלובי\n3. "ציטוט"']
+    prompt = get_batch_classification_prompt(texts)
+
+    assert prompt.startswith(BATCH_CLASSIFICATION_TEMPLATE.static_prefix)
+    listed = json.loads(prompt[prompt.rindex(":\n[") + 2:])
+    assert listed == [{"index": 0, "text": texts[0]}, {"index": 1, "text": texts[1]}]
@@ -0,0 +1,76 @@
+"""Tests for the pooled Gemini channel."""
+
+import pytest
+
+from app.ai.provider_pool import PooledChannel, ProviderPool
+
+
+class FakeCall:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_done_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def finish(self):
+        for callback in self.callbacks:
+            callback(self)
+
+
+class FakeChannel:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.calls = []
+
+    def unary_unary(self, method, *args, **kwargs):
+        def invoke(request):
+            if self.fail:
+                raise RuntimeError("channel closed")
+            call = FakeCall()
+            self.calls.append((method, request, call))
+            return call
+        return invoke
+
+
+def test_calls_go_to_the_least_busy_channel():
+    first, second = FakeChannel("a"), FakeChannel("b")
+    pool = PooledChannel([first, second])
+    generate = pool.unary_unary("/Generate")
+
+    call_a = generate("one")
+    generate("two")
+    assert len(first.calls) == 1 and len(second.calls) == 1
+    assert pool.in_flight == [1, 1]
+
+    call_a.finish()
+    generate("three")
+    assert len(first.calls) == 2
+    assert pool.calls == 3
+    assert pool.peak_in_flight == 2
+
+
+def test_failed_call_releases_its_channel():
+    pool = PooledChannel([FakeChannel("a", fail=True)])
+    generate = pool.unary_unary("/Generate")
+
+    with pytest.raises(RuntimeError):
+        generate("one")
+    assert pool.in_flight == [0]
+
+
+def test_stats_only_after_start():
+    pool = ProviderPool(
+        api_key="",
+        size=0,
+        keepalive_seconds=60,
+        keepalive_timeout_seconds=20,
+        idle_timeout_seconds=86400,
+        prewarm_timeout_seconds=1.0
+    )
+    assert pool.size == 1
+    assert pool.stats() is None
+
+    # Nothing attached, so start() creates no client
+    pool.start()
+    assert pool.client is None
@@ -0,0 +1,137 @@
+"""
+Tests for the LLM concurrency limiter and adaptive token bucket.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.ai.rate_limiter import (
+    AdaptiveTokenBucket, LLMLimiter, LLMOverloadedError, SharedTokenBucket, is_throttling_error,
+)
+
+
+class Throttled(Exception):
+    code = 429
+
+
+def make_bucket(**overrides) -> AdaptiveTokenBucket:
+    options = dict(rate=1000.0, capacity=100, min_rate=1.0, backoff_factor=0.5, recovery_step=10.0)
+    options.update(overrides)
+    return AdaptiveTokenBucket(**options)
+
+
+def test_throttling_errors_are_recognized():
+    assert is_throttling_error(Throttled())
+    wrapped = RuntimeError("call failed")
+    wrapped.__cause__ = Throttled()
+    assert is_throttling_error(wrapped)
+    assert not is_throttling_error(ValueError("bad JSON"))
+
+
+def test_rate_backs_off_on_throttling_and_recovers():
+    bucket = make_bucket(rate=8.0)
+
+    bucket.on_throttled()
+    bucket.on_throttled()
+    assert bucket.rate == 2.0
+
+    bucket.on_success()
+    assert bucket.rate == 8.0
+
+
+def test_rate_never_drops_below_the_floor():
+    bucket = make_bucket(rate=4.0, min_rate=3.0)
+    bucket.on_throttled()
+    assert bucket.rate == 3.0
+
+
+async def test_bucket_limits_the_call_rate():
+    bucket = make_bucket(rate=50.0, capacity=1)
+    loop = asyncio.get_running_loop()
+
+    start = loop.time()
+    for _ in range(6):
+        await bucket.acquire()
+
+    # The first token is in the bucket, the other five take 1/50 s each
+    assert loop.time() - start >= 0.09
+
+
+async def test_concurrency_is_bounded():
+    limiter = LLMLimiter(max_concurrency=2, max_queue=10, bucket=make_bucket())
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with limiter.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(8)))
+
+    assert peak == 2
+
+
+async def test_full_queue_rejects_with_retry_after():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=1, bucket=make_bucket())
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMOverloadedError) as error:
+        await limiter.acquire()
+    assert error.value.retry_after >= 1
+    assert limiter.rejected == 1
+
+    limiter.release()
+    await waiter
+    limiter.release()
+
+
+async def test_shared_bucket_backoff_is_seen_by_other_processes(tmp_path):
+    path = str(tmp_path / "rate.sqlite3")
+    first = SharedTokenBucket(path, rate=8.0, capacity=10, min_rate=1.0)
+    second = SharedTokenBucket(path, rate=8.0, capacity=10, min_rate=1.0)
+
+    first.on_throttled()
+    await second.acquire()
+
+    assert second.rate == 4.0
+
+
+async def test_limiter_records_shared_outcomes_in_a_worker_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / "rate.sqlite3")
+    bucket = SharedTokenBucket(path, rate=8.0, capacity=10, min_rate=1.0)
+    limiter = LLMLimiter(max_concurrency=1, max_queue=1, bucket=bucket)
+    offloaded = []
+    to_thread = asyncio.to_thread
+
+    async def spy(func, *args):
+        offloaded.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", spy)
+    await limiter.record(Throttled())
+    await limiter.record(ValueError("bad JSON"))
+
+    assert offloaded == ["on_throttled"]
+    assert bucket.rate == 4.0
+
+
+async def test_shared_rate_update_is_skipped_while_another_worker_holds_the_lock(tmp_path):
+    path = str(tmp_path / "rate.sqlite3")
+    bucket = SharedTokenBucket(path, rate=8.0, capacity=10, min_rate=1.0)
+    limiter = LLMLimiter(max_concurrency=1, max_queue=1, bucket=bucket)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        await limiter.record(Throttled())
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+    assert bucket.rate == 8.0
@@ -0,0 +1,71 @@
+"""
+Tests for tiered model routing.
+"""
+
+import json
+
+from app.ai.model_router import ModelRouter, ModelTier
+
+
+def answer(ticket_type: str, confidence: float) -> str:
+    return json.dumps({
+        "ticket_type": ticket_type, "location": "לובי", "normalized_summary": "דווח על תקלה.", "confidence": confidence
+    }, ensure_ascii=False)
+
+
+def make_router(*llms) -> ModelRouter:
+    return ModelRouter([ModelTier(name=f"tier-{i}", llm=llm) for i, llm in enumerate(llms)], min_confidence=0.6)
+
+
+async def test_sure_answer_stays_on_the_cheap_tier(make_classifier, scripted):
+    cheap, strong = scripted(answer("מעלית", 0.9)), scripted(answer("מעלית", 0.95))
+    response = await make_classifier(router=make_router(cheap, strong)).classify("המעלית תקועה")
+
+    assert response.model_metadata.tier == 0
+    assert (cheap.calls, strong.calls) == (1, 0)
+
+
+async def test_unsure_answer_is_escalated(make_classifier, scripted):
+    cheap, strong = scripted(answer("מעלית", 0.3)), scripted(answer("חשמל", 0.9))
+    response = await make_classifier(router=make_router(cheap, strong)).classify("אין חשמל במעלית")
+
+    assert response.ticket_type == "חשמל"
+    assert response.model_metadata.tier == 1
+    assert response.model_metadata.model == "tier-1"
+
+
+async def test_sure_other_is_not_escalated(make_classifier, scripted):
+    cheap, strong = scripted(answer("אחר", 0.9)), scripted(answer("ניקיון", 0.8))
+    response = await make_classifier(router=make_router(cheap, strong)).classify("יש פה בלגן")
+
+    assert response.ticket_type == "אחר"
+    assert strong.calls == 0
+
+
+async def test_unparseable_cheap_answer_is_escalated(make_classifier, scripted):
+    cheap, strong = scripted("sorry, I cannot help with that"), scripted(answer("ניקיון", 0.8))
+    response = await make_classifier(router=make_router(cheap, strong)).classify("יש פה בלגן")
+
+    assert response.ticket_type == "ניקיון"
+    assert response.model_metadata.tier == 1
+
+
+async def test_unparseable_escalation_keeps_the_cheap_answer(make_classifier, scripted):
+    cheap, strong = scripted(answer("מעלית", 0.4)), scripted("sorry, I cannot help with that")
+    response = await make_classifier(router=make_router(cheap, strong)).classify("המעלית תקועה")
+
+    assert response.ticket_type == "מעלית"
+    assert response.confidence == 0.4
+    assert response.model_metadata.tier == 0
+
+
+async def test_failed_escalation_keeps_the_cheap_answer(make_classifier, scripted):
+    def fail(messages):
+        raise RuntimeError("model unavailable")
+
+    cheap = scripted(answer("מעלית", 0.4))
+    response = await make_classifier(router=make_router(cheap, scripted(fail))).classify("המעלית תקועה")
+
+    assert response.ticket_type == "מעלית"
+    assert response.confidence == 0.4
+    assert response.model_metadata.tier == 0
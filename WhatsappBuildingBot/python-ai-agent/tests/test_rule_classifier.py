@@ -0,0 +1,62 @@
+"""
+Tests for the rule-based fast path.
+"""
+
+import pytest
+
+from app.ai.rule_classifier import MODEL_NAME, RuleBasedClassifier
+
+
+@pytest.fixture
+def classifier() -> RuleBasedClassifier:
+    return RuleBasedClassifier(min_confidence=0.85)
+
+
+def test_obvious_message_is_classified(classifier):
+    response = classifier.classify("נורה שרופה בלובי")
+
+    assert response is not None
+    assert response.ticket_type == "תאורה"
+    assert response.location == "לובי"
+    assert response.model_metadata.model == MODEL_NAME
+
+
+def test_floor_is_recognized(classifier):
+    response = classifier.classify("נזילה בקומה שביעית")
+
+    assert response is not None
+    assert response.ticket_type == "אינסטלציה"
+    assert response.location == "קומה 7"
+
+
+def test_summary_leaves_out_the_message_text(classifier):
+    response = classifier.classify("נורה שרופה בלובי, תתקשרו לדני 0501234567")
+
+    assert response.normalized_summary == "התקבל דיווח על בעיית תאורה בלובי. נדרש טיפול."
+    assert "0501234567" not in response.normalized_summary
+
+
+@pytest.mark.parametrize("message", [
+    "אין בעיה בלובי, הנורה תוקנה",
+    "אל תשלחו מדביר לגג, כבר טופל",
+    "הנורה בלובי תוקנה, תודה",
+    "לא צריך מנקה בלובי",
+])
+def test_negated_or_resolved_messages_go_to_the_llm(classifier, message):
+    assert classifier.classify(message) is None
+
+
+def test_negated_fault_is_still_classified(classifier):
+    response = classifier.classify("התאורה בלובי לא עובדת")
+
+    assert response is not None
+    assert response.ticket_type == "תאורה"
+
+
+def test_parked_is_not_a_strong_parking_keyword(classifier):
+    assert classifier.classify("מישהו חנה ליד הלובי") is None
+
+
+def test_ambiguous_message_goes_to_the_llm(classifier):
+    assert classifier.classify("יש בעיה") is None
+    assert classifier.stats().hits == 0
@@ -0,0 +1,80 @@
+"""
+Tests for coalescing duplicate in-flight classifications.
+"""
+
+import asyncio
+
+import pytest
+
+from app.ai.single_flight import SingleFlight, with_deadline
+
+
+async def test_concurrent_callers_share_one_call():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def classify():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(single_flight.do("key", classify) for _ in range(5)))
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert single_flight.coalesced == 4
+    assert single_flight.in_flight == 0
+
+
+async def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+
+    async def classify(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        single_flight.do("a", lambda: classify("a")),
+        single_flight.do("b", lambda: classify("b"))
+    )
+
+    assert results == ["a", "b"]
+    assert single_flight.coalesced == 0
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    single_flight = SingleFlight()
+
+    async def classify():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    first = asyncio.create_task(single_flight.do("key", classify))
+    second = asyncio.create_task(single_flight.do("key", classify))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_errors_reach_every_caller_and_are_not_kept():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM down")
+
+    results = await asyncio.gather(
+        single_flight.do("key", fail), single_flight.do("key", fail), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert single_flight.in_flight == 0
+
+
+def test_callers_with_distant_deadlines_get_different_keys():
+    assert with_deadline("key", 100.2) == with_deadline("key", 100.7)
+    assert with_deadline("key", 100.2) != with_deadline("key", 110.2)
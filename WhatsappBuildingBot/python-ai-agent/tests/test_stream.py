@@ -0,0 +1,36 @@
+"""
+Tests for streaming classification.
+"""
+
+from app.ai.langchain_agent import STREAMED_FIELDS
+
+
+RESPONSE = '{"ticket_type": "מעלית", "location": "לובי", "normalized_summary": "המעלית תקועה.", "confidence": 0.9}'
+
+
+async def collect(classifier, message_text: str) -> list[dict]:
+    return [event async for event in classifier.classify_stream(message_text, "building-1")]
+
+
+async def test_fields_are_streamed_before_the_result(make_classifier, scripted):
+    events = await collect(make_classifier(scripted(RESPONSE)), "המעלית בלובי תקועה")
+
+    fields = [event for event in events if event["event"] == "field"]
+    assert [event["field"] for event in fields] == list(STREAMED_FIELDS)
+    assert events[-1]["event"] == "result"
+    assert events[-1]["data"]["ticket_type"] == "מעלית"
+
+
+async def test_limiter_slot_is_released_when_the_stream_cannot_start(make_classifier, scripted):
+    class BrokenModel:
+        def astream(self, messages, **kwargs):
+            raise RuntimeError("connection refused")
+
+    classifier = make_classifier(BrokenModel())
+    slots = classifier.limiter.max_concurrency
+
+    for _ in range(slots + 1):
+        events = await collect(classifier, "המעלית בלובי תקועה")
+        assert events[-1]["data"]["confidence"] == 0.0
+
+    assert classifier.limiter._semaphore._value == slots
@@ -0,0 +1,92 @@
+"""
+Tests for the structured logging processors, filters and handler.
+"""
+
+import logging
+import queue
+
+from app.structured_logging import (
+    REDACTED, DroppingQueueHandler, SamplingFilter, _evaluate_lazy, _redact_pii, _truncator, lazy,
+    parse_sample_rates, redact_text,
+)
+
+
+def record(level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, "event", None, None)
+
+
+def test_phone_numbers_and_emails_are_redacted():
+    text = redact_text("call 050-1234567 or +972 52 765 4321, mail dana@example.co.il, apartment 21")
+
+    assert "1234567" not in text and "765 4321" not in text and "dana@" not in text
+    assert text.count(REDACTED) == 3
+    assert "apartment 21" in text
+
+
+def test_sensitive_fields_are_redacted():
+    event = _redact_pii(None, "info", {"event": "Queued job", "phone": "0501234567", "job_id": "abc"})
+
+    assert event["phone"] == REDACTED
+    assert event["job_id"] == "abc"
+
+
+def test_long_fields_are_truncated():
+    event = _truncator(10)(None, "info", {"event": "x" * 25})
+
+    assert event["event"] == "xxxxxxxxxx... (15 more chars)"
+
+
+def test_lazy_fields_are_computed_when_written():
+    calls = []
+    value = lazy(lambda: calls.append(1) or 42)
+    assert calls == []
+
+    assert _evaluate_lazy(None, "info", {"answer": value})["answer"] == 42
+    assert calls == [1]
+
+
+def test_sample_rates_are_parsed_per_level():
+    assert parse_sample_rates("debug=0.01, INFO=0.2,WARNING=3") == {
+        logging.DEBUG: 0.01, logging.INFO: 0.2, logging.WARNING: 1.0
+    }
+    assert parse_sample_rates("") == {}
+
+
+def test_sampling_only_affects_listed_levels():
+    sampler = SamplingFilter({logging.DEBUG: 0.0})
+
+    assert not sampler.filter(record(logging.DEBUG))
+    assert sampler.filter(record(logging.ERROR))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(1))
+
+    handler.emit(record())
+    handler.emit(record())
+
+    assert handler.queue.qsize() == 1
+
+
+def test_message_arguments_are_formatted_only_for_kept_records():
+    class Counted:
+        formatted = 0
+
+        def __str__(self):
+            Counted.formatted += 1
+            return "value"
+
+    handler = DroppingQueueHandler(queue.Queue())
+    handler.addFilter(SamplingFilter({logging.WARNING: 0.0}))
+    logger = logging.getLogger("test.deferred")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("Sampled out: %s", Counted())
+        logger.error("Queued: %s", Counted())
+    finally:
+        logger.removeHandler(handler)
+
+    assert Counted.formatted == 0
+    assert handler.queue.get_nowait().getMessage() == "Queued: value"
+    assert Counted.formatted == 1